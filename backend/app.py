@@ -1,15 +1,27 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 from config import Config
 from models.user import User
 from models.mrl import MRLModel
 from models.gemini import GeminiModel
+from models.pipeline import PipelineModel
+from services.db_pool import get_pool
+from services.api_cache import get_api_cache
+from services.fanout import run_ordered
+from services.jobs import JobQueue, QueueFullError
+from services.rate_limiter import get_gemini_bucket
+from services.pagination import InvalidCursorError, clamp_limit, decode_cursor
+from services.json_stream import iter_json_object
+from services.export import EXPORT_FORMATS, gzip_stream, iter_export, parquet_available
 import jwt
 from functools import wraps
-from datetime import datetime
+from datetime import datetime, timedelta
 import smtplib
 from email.mime.text import MIMEText
 import os
+import json
+import time
+import threading
 from werkzeug.utils import secure_filename
 from fpdf import FPDF
 import io
@@ -27,6 +39,42 @@ user_model = User()
 mrl_model = MRLModel()
 gemini_model = GeminiModel()
 
+# File d'extraction PDF (Gemini) traitée par des threads en arrière-plan
+extraction_queue = JobQueue(
+    gemini_model.process_upload,
+    workers=Config.EXTRACTION_WORKERS,
+    max_attempts=Config.EXTRACTION_MAX_ATTEMPTS,
+    backoff=Config.EXTRACTION_RETRY_BACKOFF,
+    max_pending=Config.EXTRACTION_QUEUE_MAX,
+    name='extraction',
+    on_failure=gemini_model.mark_upload_failed
+)
+
+# Pipeline bulletin -> verdict (extraction, LMR, conformité, sauvegarde)
+pipeline_model = PipelineModel(gemini_model, mrl_model)
+pipeline_queue = JobQueue(
+    pipeline_model.run,
+    workers=Config.PIPELINE_WORKERS,
+    max_attempts=Config.EXTRACTION_MAX_ATTEMPTS,
+    backoff=Config.EXTRACTION_RETRY_BACKOFF,
+    max_pending=Config.EXTRACTION_QUEUE_MAX,
+    name='pipeline',
+    on_failure=pipeline_model.mark_failed
+)
+
+# Jobs en mémoire : ceux d'un processus arrêté ne finiront jamais. Les uploads
+# et exécutions restés en cours au-delà de UPLOAD_STALE_AFTER passent en échec
+# (pas de relance : un autre processus peut encore traiter les plus récents)
+def fail_stale_jobs():
+    gemini_model.fail_stale_uploads(Config.UPLOAD_STALE_AFTER)
+    pipeline_model.fail_stale_runs(Config.UPLOAD_STALE_AFTER)
+
+threading.Thread(target=fail_stale_jobs, daemon=True).start()
+
+# Préchargement du catalogue des résidus sans bloquer le démarrage
+if Config.RESIDUE_PRELOAD:
+    threading.Thread(target=mrl_model.warm_residue_catalogue, daemon=True).start()
+
 # ========== MIDDLEWARE ==========
 def token_required(f):
     @wraps(f)
@@ -43,6 +91,8 @@ def token_required(f):
         
         try:
             data = jwt.decode(token, Config.SECRET_KEY, algorithms=['HS256'])
+            if data.get('scope'):
+                raise jwt.InvalidTokenError('Jeton limité (flux SSE)')
             current_user_id = data['user_id']
         except jwt.ExpiredSignatureError:
             return jsonify({'error': 'Token expiré'}), 401
@@ -53,8 +103,55 @@ def token_required(f):
     
     return decorated
 
+def admin_required(f):
+    """À placer sous @token_required : réserve la route aux emails de Config.ADMIN_EMAILS"""
+    @wraps(f)
+    def decorated(current_user_id, *args, **kwargs):
+        user = user_model.get_user_by_id(current_user_id)
+        if not user or user['email'].lower() not in Config.ADMIN_EMAILS:
+            return jsonify({'error': 'Accès réservé aux administrateurs'}), 403
+        return f(current_user_id, *args, **kwargs)
+    
+    return decorated
+
+def event_stream_token(current_user_id, upload_id):
+    """Jeton court, limité au flux SSE d'un upload (EventSource n'envoie pas d'en-tête Authorization)"""
+    return jwt.encode({
+        'user_id': current_user_id,
+        'upload_id': upload_id,
+        'scope': 'upload_events',
+        'exp': datetime.utcnow() + timedelta(seconds=Config.EVENT_STREAM_TOKEN_TTL)
+    }, Config.SECRET_KEY, algorithm='HS256')
+
+def event_stream_token_required(f):
+    """Comme token_required, mais accepte aussi ?token= émis par event_stream_token pour cet upload"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        token = request.args.get('token')
+        if not token:
+            return token_required(f)(*args, **kwargs)
+        try:
+            data = jwt.decode(token, Config.SECRET_KEY, algorithms=['HS256'])
+        except jwt.ExpiredSignatureError:
+            return jsonify({'error': 'Token expiré'}), 401
+        except jwt.InvalidTokenError:
+            return jsonify({'error': 'Token invalide'}), 401
+        if data.get('scope') != 'upload_events' or data.get('upload_id') != kwargs.get('upload_id'):
+            return jsonify({'error': 'Token invalide'}), 401
+        return f(data['user_id'], *args, **kwargs)
+    
+    return decorated
+
 # ========== FONCTIONS UTILITAIRES ==========
 
+def request_language(value):
+    """Code langue d'une requête (EN par défaut) ; None s'il n'est pas dans Config.CATALOGUE_LANGUAGES"""
+    language = str(value or 'EN').strip().upper()
+    return language if language in Config.CATALOGUE_LANGUAGES else None
+
+def language_error():
+    return jsonify({'error': f"Langue non prise en charge (langues : {', '.join(Config.CATALOGUE_LANGUAGES)})"}), 400
+
 def send_reset_email(to_email, reset_link):
     """Envoyer l'email de réinitialisation de mot de passe"""
     subject = "Réinitialisation de votre mot de passe"
@@ -206,13 +303,7 @@ def reset_password():
 def get_profile(current_user_id):
     """Récupérer le profil de l'utilisateur"""
     try:
-        # Récupérer l'utilisateur par ID (vous devez ajouter cette méthode)
-        conn = user_model.get_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT id, email, username, full_name, phone, farm_name, farm_location FROM users WHERE id = %s", (current_user_id,))
-        user = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        user = user_model.get_user_by_id(current_user_id)
         
         if not user:
             return jsonify({'error': 'Utilisateur non trouvé'}), 404
@@ -227,6 +318,31 @@ def health():
     """Vérifier l'état du serveur"""
     return jsonify({'status': 'ok'}), 200
 
+@app.route('/api/health/db', methods=['GET'])
+@token_required
+@admin_required
+def health_db(current_user_id):
+    """Métriques du pool de connexions MySQL (administrateurs)"""
+    return jsonify(get_pool().stats()), 200
+
+@app.route('/api/health/cache', methods=['GET'])
+@token_required
+@admin_required
+def health_cache(current_user_id):
+    """Statistiques du cache de l'API EU Pesticides (administrateurs)"""
+    return jsonify(get_api_cache().stats()), 200
+
+@app.route('/api/health/jobs', methods=['GET'])
+@token_required
+@admin_required
+def health_jobs(current_user_id):
+    """État de la file d'extraction PDF (administrateurs)"""
+    stats = extraction_queue.stats()
+    stats['parsing'] = gemini_model.parse_stats()
+    stats['rate_limit'] = get_gemini_bucket().stats()
+    stats['pipeline'] = pipeline_queue.stats()
+    return jsonify(stats), 200
+
 # ========== ROUTES MRL ==========
 
 @app.route('/api/mrl/residues/search', methods=['POST'])
@@ -236,11 +352,14 @@ def search_residue(current_user_id):
     try:
         data = request.get_json()
         substance_name = data.get('substance_name', '').strip()
+        language = request_language(data.get('language'))
+        if language is None:
+            return language_error()
         
         if not substance_name:
             return jsonify({'error': 'Substance name required'}), 400
         
-        residues, url, status, error = mrl_model.search_residue(substance_name)
+        residues, url, status, error = mrl_model.search_residue(substance_name, language)
         
         if error:
             return jsonify({'error': error, 'status': status}), 500 if status is None else status
@@ -254,6 +373,38 @@ def search_residue(current_user_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/mrl/residues/suggest', methods=['POST'])
+@token_required
+def suggest_residues(current_user_id):
+    """Suggestions classées de résidus (recherche approchée locale)"""
+    try:
+        data = request.get_json()
+        substance_name = data.get('substance_name', '').strip()
+        language = request_language(data.get('language'))
+        if language is None:
+            return language_error()
+        limit = data.get('limit')
+        if limit is None:
+            limit = 10
+        elif isinstance(limit, str) and limit.strip().isdecimal():
+            limit = int(limit)
+        if isinstance(limit, bool) or not isinstance(limit, int) or limit < 1:
+            return jsonify({'error': 'limit doit être un entier strictement positif'}), 400
+        limit = clamp_limit(limit, maximum=50)
+        
+        if not substance_name:
+            return jsonify({'error': 'Substance name required'}), 400
+        
+        candidates = mrl_model.find_residue_candidates(substance_name, language=language, limit=limit)
+        
+        return jsonify({
+            'candidates': candidates,
+            'count': len(candidates)
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/mrl/products/search', methods=['POST'])
 @token_required
 def search_product(current_user_id):
@@ -261,7 +412,9 @@ def search_product(current_user_id):
     try:
         data = request.get_json()
         product_code = data.get('product_code', '').strip()
-        language = data.get('language', 'EN')
+        language = request_language(data.get('language'))
+        if language is None:
+            return language_error()
         
         products, url, status, error = mrl_model.search_product(product_code, language)
         
@@ -295,18 +448,7 @@ def get_mrls(current_user_id):
             return jsonify({'error': error, 'status': status}), 500 if status is None else status
         
         # Parser les MRL pour trouver la valeur actuelle
-        current_mrls = [r for r in mrls if str(r.get('applicability', '')).strip() == '1']
-        mrl_numeric = None
-        mrl_source = "EU default 0.01 mg/kg"
-        
-        if current_mrls:
-            nums = [mrl_model.parse_mrl(r.get('mrl_value_only') or r.get('mrl_value')) for r in current_mrls]
-            nums = [n for n in nums if n is not None]
-            if nums:
-                mrl_numeric = min(nums)
-                mrl_source = "EU Pesticides Database (current)"
-        else:
-            mrl_numeric = 0.01
+        mrl_numeric, mrl_source = mrl_model.current_mrl(mrls)
         
         return jsonify({
             'mrls': mrls,
@@ -319,6 +461,35 @@ def get_mrls(current_user_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/mrl/mrls/batch', methods=['POST'])
+@token_required
+def get_mrls_batch(current_user_id):
+    """Récupérer les LMR courantes de plusieurs résidus pour un produit"""
+    try:
+        data = request.get_json()
+        product_id = data.get('product_id')
+        residue_ids = data.get('residue_ids') or []
+        
+        if not product_id:
+            return jsonify({'error': 'Product ID required'}), 400
+        if not isinstance(residue_ids, list) or not residue_ids:
+            return jsonify({'error': 'Residue IDs required'}), 400
+        if len(residue_ids) > Config.MRL_BATCH_MAX:
+            return jsonify({'error': f'Too many residue IDs (max {Config.MRL_BATCH_MAX})'}), 400
+        
+        results = mrl_model.get_mrls_batch(product_id, residue_ids)
+        if isinstance(results, dict) and not results.get('success', True):
+            return jsonify({'error': results['error']}), 400
+        
+        return jsonify({
+            'product_id': product_id,
+            'results': results,
+            'count': len(results)
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/mrl/residues/multi-search', methods=['POST'])
 @token_required
 def multi_search(current_user_id):
@@ -327,11 +498,25 @@ def multi_search(current_user_id):
         data = request.get_json()
         substances = data.get('substances', [])
         product_code = data.get('product_code', '').strip()
-        language = data.get('language', 'EN')
+        language = request_language(data.get('language'))
+        if language is None:
+            return language_error()
 
         if not substances:
             return jsonify({'error': 'No substances provided'}), 400
 
+        # Échéance globale (le client peut la raccourcir, pas la dépasser)
+        timeout = Config.MULTI_SEARCH_DEADLINE
+        if data.get('deadline') is not None:
+            try:
+                requested = float(data['deadline'])
+            except (TypeError, ValueError):
+                requested = None
+            if requested is None or isinstance(data['deadline'], bool) or not requested > 0:
+                return jsonify({'error': 'deadline doit être un nombre de secondes strictement positif'}), 400
+            timeout = min(requested, Config.MULTI_SEARCH_DEADLINE)
+        deadline = time.monotonic() + timeout
+
         # Identifier le produit
         product = None
         product_id = None
@@ -343,41 +528,27 @@ def multi_search(current_user_id):
                 product_id = product.get('product_id')
             product_error = p_error
 
-        results = []
-        for s_name in substances:
-            entry = {'input_name': s_name}
-            residues, r_url, r_status, r_error = mrl_model.search_residue(s_name)
-            
-            if r_error or not residues:
-                entry.update({'error': r_error or 'Not found', 'current_mrl': 0.01, 'mrl_source': 'Default'})
-                results.append(entry)
-                continue
-
-            residue = residues[0]
-            residue_id = residue.get('pesticide_residue_id')
-            entry.update({'residue': residue, 'residue_id': residue_id})
-
-            if residue_id and product_id:
-                mrls, m_url, m_status, m_error = mrl_model.get_mrls(residue_id, product_id)
-                current_mrl = 0.01
-                mrl_source = "EU default 0.01 mg/kg"
-                if not m_error:
-                    current_mrls = [r for r in mrls if str(r.get('applicability', '')).strip() == '1']
-                    if current_mrls:
-                        nums = [mrl_model.parse_mrl(r.get('mrl_value_only') or r.get('mrl_value')) for r in current_mrls]
-                        nums = [n for n in nums if n is not None]
-                        if nums:
-                            current_mrl = min(nums)
-                            mrl_source = "EU Pesticides Database (current)"
-                entry.update({'current_mrl': current_mrl, 'mrl_source': mrl_source})
-            else:
-                entry.update({'current_mrl': 0.01, 'mrl_source': 'Default (no product match)'})
-            
-            results.append(entry)
+        def pending_entry(s_name):
+            return {'input_name': s_name, 'error': 'Deadline exceeded', 'pending': True,
+                    'current_mrl': 0.01, 'mrl_source': 'Default'}
+
+        def failed_entry(s_name, exc):
+            return {'input_name': s_name, 'error': str(exc), 'current_mrl': 0.01, 'mrl_source': 'Default'}
+
+        # Résolution concurrente, résultats dans l'ordre des substances
+        results, pending = run_ordered(
+            lambda s_name: mrl_model.resolve_substance(s_name, product_id, language),
+            substances,
+            deadline=deadline,
+            on_timeout=pending_entry,
+            on_error=failed_entry
+        )
 
         return jsonify({
             'product': product,
-            'results': results
+            'results': results,
+            'partial': pending > 0,
+            'pending_count': pending
         }), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -469,22 +640,93 @@ def save_analysis(current_user_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/mrl/analyses/batch', methods=['POST'])
+@token_required
+def save_analyses_batch(current_user_id):
+    """Scorer et sauvegarder toutes les analyses d'un lot (atomique)"""
+    try:
+        data = request.get_json()
+        analyses = data.get('analyses') or []
+        
+        if not isinstance(analyses, list) or not analyses:
+            return jsonify({'error': 'No analyses provided'}), 400
+        if len(analyses) > Config.ANALYSES_BATCH_MAX:
+            return jsonify({'error': f'Too many analyses (max {Config.ANALYSES_BATCH_MAX})'}), 400
+        
+        result = mrl_model.save_analyses_batch(current_user_id, analyses, lot=data)
+        
+        if result['success']:
+            return jsonify(result), 201
+        else:
+            return jsonify(result), 400
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/mrl/analyses', methods=['GET'])
 @token_required
 def get_analyses(current_user_id):
-    """Récupérer les analyses de l'utilisateur"""
+    """Récupérer les analyses de l'utilisateur, page par page (?limit=&cursor=)"""
     try:
-        limit = request.args.get('limit', 50, type=int)
-        result = mrl_model.get_user_analyses(current_user_id, limit)
+        limit = clamp_limit(request.args.get('limit', type=int), 50)
+        cursor = request.args.get('cursor')
+        try:
+            after = decode_cursor(cursor) if cursor else None
+        except InvalidCursorError as e:
+            return jsonify({'error': str(e)}), 400
+        result = mrl_model.get_user_analyses(current_user_id, limit, after=after, stream=True)
         
         if result['success']:
-            return jsonify(result), 200
+            # JSON écrit au fil de la lecture des lignes
+            return Response(stream_with_context(iter_json_object(result)), mimetype='application/json'), 200
         else:
             return jsonify(result), 400
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/mrl/analyses/export', methods=['GET'])
+@token_required
+def export_analyses(current_user_id):
+    """
+    Exporter l'historique des analyses en flux :
+    ?format=csv|ndjson|parquet&from=AAAA-MM-JJ&to=AAAA-MM-JJ&product_code=...&gzip=1
+    """
+    try:
+        fmt = request.args.get('format', 'csv').lower()
+        if fmt not in EXPORT_FORMATS:
+            return jsonify({'error': f"Format inconnu (formats : {', '.join(EXPORT_FORMATS)})"}), 400
+        if fmt == 'parquet' and not parquet_available():
+            return jsonify({'error': "Export Parquet indisponible (pyarrow n'est pas installé)"}), 400
+        
+        try:
+            date_from = datetime.strptime(request.args['from'], '%Y-%m-%d') if request.args.get('from') else None
+            # `to` inclus : tout le jour demandé
+            date_to = datetime.strptime(request.args['to'], '%Y-%m-%d') + timedelta(days=1) if request.args.get('to') else None
+        except ValueError:
+            return jsonify({'error': 'Dates attendues au format AAAA-MM-JJ'}), 400
+        product_code = request.args.get('product_code')
+        compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+        
+        result = mrl_model.export_user_analyses(current_user_id, date_from, date_to, product_code)
+        if not result['success']:
+            # Tous les exports simultanés autorisés sont en cours
+            return jsonify(result), 503 if result.get('busy') else 400
+        
+        body = iter_export(fmt, result['columns'], result['types'], result['batches'])
+        mimetype, extension = EXPORT_FORMATS[fmt]
+        filename = f"analyses_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+        if compress:
+            body = gzip_stream(body)
+            mimetype = 'application/gzip'
+            filename += '.gz'
+        
+        return Response(stream_with_context(body), mimetype=mimetype,
+                        headers={'Content-Disposition': f'attachment; filename="{filename}"',
+                                 'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/mrl/products/list', methods=['GET'])
 @token_required
 def get_products_list(current_user_id):
@@ -502,6 +744,83 @@ def get_products_list(current_user_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# ========== ROUTES ADMIN ==========
+
+@app.route('/api/admin/catalogue', methods=['GET'])
+@token_required
+@admin_required
+def catalogue_status(current_user_id):
+    """État du catalogue des résidus en mémoire (langues, taille, âge)"""
+    try:
+        return jsonify(mrl_model.residue_catalogue().stats()), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/catalogue/refresh', methods=['POST'])
+@token_required
+@admin_required
+def refresh_catalogue(current_user_id):
+    """Forcer le rechargement du catalogue des résidus pour une langue"""
+    try:
+        data = request.get_json(silent=True) or {}
+        language = request_language(data.get('language'))
+        if language is None:
+            return language_error()
+        entry = mrl_model.residue_catalogue().refresh(language)
+        return jsonify({
+            'language': entry.language,
+            'count': len(entry.residues),
+            'approx_bytes': entry.approx_bytes
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/mirror', methods=['GET'])
+@token_required
+@admin_required
+def mirror_status(current_user_id):
+    """État de synchronisation du miroir local de la base EU"""
+    try:
+        result = mrl_model.mirror.get_sync_state()
+        return jsonify(result), 200 if result['success'] else 500
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/mirror/sync', methods=['POST'])
+@token_required
+@admin_required
+def mirror_sync(current_user_id):
+    """Lancer une synchronisation incrémentale du miroir en arrière-plan"""
+    try:
+        data = request.get_json(silent=True) or {}
+        entities = data.get('entities') or list(mrl_model.mirror.ENTITIES)
+        unknown = [e for e in entities if e not in mrl_model.mirror.ENTITIES]
+        if unknown:
+            return jsonify({'error': f"Entités inconnues: {', '.join(unknown)}"}), 400
+        language = request_language(data.get('language'))
+        if language is None:
+            return language_error()
+        threading.Thread(target=mrl_model.mirror.sync, args=(entities, language), daemon=True).start()
+        return jsonify({'message': 'Synchronisation lancée', 'entities': entities}), 202
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/extraction/usage', methods=['GET'])
+@token_required
+@admin_required
+def extraction_usage(current_user_id):
+    """Consommation du modèle d'extraction : tokens, coût, latence, débit (?days=7)"""
+    try:
+        days = max(1, min(int(request.args.get('days', 7)), 366))
+        summary = gemini_model.usage_summary(days)
+        if not summary['success']:
+            return jsonify(summary), 500
+        summary['queue'] = extraction_queue.stats()
+        summary['rate_limit'] = get_gemini_bucket().stats()
+        return jsonify(summary), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # ========== ROUTES OCR ==========
 
 @app.route('/api/ocr/upload', methods=['POST'])
@@ -519,63 +838,160 @@ def upload_pdf(current_user_id):
         if not file.filename.lower().endswith('.pdf'):
             return jsonify({'error': 'Seuls les fichiers PDF sont acceptés'}), 400
         
-        filename = secure_filename(file.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{current_user_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}")
-        file.save(file_path)
-        file_size = os.path.getsize(file_path)
-        
-        # Sauvegarder les infos de l'upload
-        result = gemini_model.save_upload(current_user_id, filename, file_path, file_size)
+        result = store_pdf_upload(file, current_user_id)
         
         if not result['success']:
             return jsonify(result), 400
         
         upload_id = result['upload_id']
+        file_path = result['file_path']
+        content_hash = result['content_hash']
         
-        # Traiter le PDF avec Gemini Vision API
+        # PDF déjà extrait avec le même prompt et le même modèle : réponse immédiate
+        cached = gemini_model.find_cached_extraction(content_hash)
+        if cached:
+            response = gemini_model.reuse_extraction(upload_id, cached)
+            if response:
+                return jsonify(response), 200
+        
+        # Extraction Gemini en arrière-plan : le worker WSGI est libéré tout de suite
         try:
-            gemini_model.update_upload_status(upload_id, 'processing')
-
-            # ── Extract PDF using Gemini Vision API ──────────────────────
-            extracted_data = gemini_model.extract_from_pdf(file_path)
-
-            # Check for errors in extraction
-            if extracted_data.get('error'):
-                raise Exception(f"Gemini extraction error: {extracted_data.get('error')}")
-
-            # Score de confiance global
-            confidence = extracted_data.get('confidence', 0.95)
-
-            # ── Sauvegarder toutes les lignes substance en base ───────────
-            save_result = gemini_model.save_extracted_data(upload_id, extracted_data)
-            if not save_result['success']:
-                raise Exception(save_result.get('error', 'DB save failed'))
+            extraction_queue.submit(upload_id, upload_id, file_path, content_hash=content_hash,
+                                    user_id=current_user_id, owner=current_user_id)
+        except QueueFullError as e:
+            gemini_model.update_upload_status(upload_id, 'failed')
+            return jsonify({'error': str(e)}), 503
+        
+        return jsonify({
+            'success': True,
+            'upload_id': upload_id,
+            'status': 'pending',
+            'status_url': f"/api/ocr/uploads/{upload_id}/status",
+            'events_url': f"/api/ocr/uploads/{upload_id}/events?token={event_stream_token(current_user_id, upload_id)}"
+        }), 202
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-            gemini_model.update_upload_status(upload_id, 'completed', confidence)
+def store_pdf_upload(file, current_user_id):
+    """Enregistre un PDF reçu (disque + ocr_uploads) ; ajoute file_path et content_hash au résultat"""
+    filename = secure_filename(file.filename)
+    tmp_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{current_user_id}_{datetime.now().strftime('%Y%m%d_%H%M%S%f')}_{filename}.part")
+    # Écriture disque + SHA-256 en un seul passage, par blocs
+    content_hash, file_size = gemini_model.save_stream(file.stream, tmp_path)
+    # Stockage par contenu : un PDF identique n'est gardé qu'une fois sur disque
+    file_path, content_hash, file_size = gemini_model.store_by_content(tmp_path, content_hash, file_size)
+    
+    # Sauvegarder les infos de l'upload
+    result = gemini_model.save_upload(current_user_id, filename, file_path, file_size)
+    result.update({'file_path': file_path, 'content_hash': content_hash})
+    return result
 
-            return jsonify({
-                'success': True,
-                'upload_id': upload_id,
-                'extracted_data': extracted_data,      # { metadata, results, confidence }
-                'confidence': confidence,
-                'substances_count': len(extracted_data.get('results', [])),
-                'requires_validation': confidence < 0.95
-            }), 200
-            
-        except Exception as e:
-            gemini_model.update_upload_status(upload_id, 'failed')
-            return jsonify({'error': f'Erreur lors du traitement: {str(e)}'}), 500
+def upload_status_payload(upload_id, current_user_id):
+    """État d'un upload (base + job en mémoire) ; None si l'upload n'existe pas"""
+    upload = gemini_model.get_upload(upload_id, current_user_id)
+    if not upload:
+        return None
+    
+    payload = {
+        'upload_id': upload_id,
+        'status': upload['processing_status'],
+        'confidence': float(upload['confidence_score']) if upload.get('confidence_score') is not None else None
+    }
     
+    job = extraction_queue.get(upload_id)
+    if job is None and payload['status'] in ('pending', 'processing') and upload.get('upload_date') \
+            and datetime.now() - upload['upload_date'] > timedelta(seconds=Config.UPLOAD_STALE_AFTER):
+        # Job perdu (redémarrage) : plus rien ne terminera cet upload
+        gemini_model.update_upload_status(upload_id, 'failed')
+        payload.update({'status': 'failed', 'error': 'Traitement interrompu (redémarrage du serveur)'})
+    if job:
+        payload['attempts'] = job.attempts
+        if job.error:
+            payload['error'] = job.error
+        if payload['status'] == 'processing' and job.progress:
+            # Lignes déjà reçues du modèle pendant l'extraction en flux
+            payload['rows_received'] = job.progress.get('rows_received', 0)
+            payload['partial_results'] = list(job.progress.get('partial_results', []))
+    
+    if payload['status'] == 'completed':
+        if job and job.result:
+            payload.update(job.result)
+        else:
+            # Job traité par un autre processus ou plus en mémoire : relire la base
+            rows = gemini_model.get_extracted_data(upload_id)
+            extracted_data = gemini_model.extraction_from_rows(rows.get('data', []), payload['confidence'])
+            payload.update(gemini_model.upload_response(upload_id, extracted_data))
+    elif payload['status'] == 'failed' and 'error' not in payload:
+        payload['error'] = 'Erreur lors du traitement'
+    return payload
+
+@app.route('/api/ocr/uploads/<int:upload_id>/status', methods=['GET'])
+@token_required
+def get_upload_status(current_user_id, upload_id):
+    """Suivre l'extraction d'un upload (pending, processing, completed, failed)"""
+    try:
+        payload = upload_status_payload(upload_id, current_user_id)
+        if payload is None:
+            return jsonify({'error': 'Upload non trouvé'}), 404
+        if payload['status'] in ('pending', 'processing'):
+            payload['events_url'] = f"/api/ocr/uploads/{upload_id}/events?token={event_stream_token(current_user_id, upload_id)}"
+        return jsonify(payload), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/ocr/uploads/<int:upload_id>/events', methods=['GET'])
+@event_stream_token_required
+def stream_upload_status(current_user_id, upload_id):
+    """
+    Flux server-sent events des changements d'état d'un upload. Fermé après
+    EVENT_STREAM_MAX_SECONDS (événement "timeout") : EventSource se reconnecte
+    seul, et un worker WSGI n'est jamais retenu indéfiniment.
+    """
+    payload = upload_status_payload(upload_id, current_user_id)
+    if payload is None:
+        return jsonify({'error': 'Upload non trouvé'}), 404
+    
+    def events():
+        current = payload
+        version = -1
+        sent_rows = 0
+        deadline = time.monotonic() + Config.EVENT_STREAM_MAX_SECONDS
+        while True:
+            # Chaque ligne reçue du modèle part une seule fois, en événement "row"
+            rows = current.pop('partial_results', [])
+            for row in rows[sent_rows:]:
+                yield f"event: row\ndata: {json.dumps(row, default=str)}\n\n"
+            sent_rows = max(sent_rows, len(rows))
+            yield f"event: status\ndata: {json.dumps(current, default=str)}\n\n"
+            if current['status'] in ('completed', 'failed'):
+                return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                yield f"event: timeout\ndata: {json.dumps({'upload_id': upload_id}, default=str)}\n\n"
+                return
+            job = extraction_queue.get(upload_id)
+            if job:
+                version = job.wait_for_change(version, timeout=min(15, remaining))
+            else:
+                time.sleep(min(2, remaining))
+            current = upload_status_payload(upload_id, current_user_id)
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/ocr/uploads', methods=['GET'])
 @token_required
 def get_uploads(current_user_id):
-    """Récupérer les uploads de l'utilisateur"""
+    """Récupérer les uploads de l'utilisateur, page par page (?limit=&cursor=)"""
     try:
-        limit = request.args.get('limit', 20, type=int)
-        result = gemini_model.get_user_uploads(current_user_id, limit)
+        limit = clamp_limit(request.args.get('limit', type=int), 20)
+        cursor = request.args.get('cursor')
+        try:
+            after = decode_cursor(cursor) if cursor else None
+        except InvalidCursorError as e:
+            return jsonify({'error': str(e)}), 400
+        result = gemini_model.get_user_uploads(current_user_id, limit, after=after)
         
         if result['success']:
             return jsonify(result), 200
@@ -598,5 +1014,83 @@ def get_extracted_data(current_user_id, upload_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# ========== ROUTES PIPELINE ==========
+
+@app.route('/api/pipeline/bulletins', methods=['POST'])
+@token_required
+def run_pipeline(current_user_id):
+    """Bulletin(s) PDF -> extraction, LMR, conformité et verdict, en arrière-plan"""
+    try:
+        files = [f for f in request.files.getlist('file') if f.filename]
+        if not files:
+            return jsonify({'error': 'Aucun fichier fourni'}), 400
+        if len(files) > Config.PIPELINE_MAX_FILES:
+            return jsonify({'error': f'{Config.PIPELINE_MAX_FILES} fichiers maximum par envoi'}), 400
+        if any(not f.filename.lower().endswith('.pdf') for f in files):
+            return jsonify({'error': 'Seuls les fichiers PDF sont acceptés'}), 400
+        
+        product_code = request.form.get('product_code')
+        lot_number = request.form.get('lot_number')
+        target_market = request.form.get('target_market')
+        language = request_language(request.form.get('language'))
+        if language is None:
+            return language_error()
+        
+        runs = []
+        for file in files:
+            stored = store_pdf_upload(file, current_user_id)
+            if not stored['success']:
+                return jsonify(stored), 400
+            upload_id = stored['upload_id']
+            
+            created = pipeline_model.create_run(current_user_id, upload_id, product_code, lot_number)
+            if not created['success']:
+                return jsonify(created), 400
+            run_id = created['run_id']
+            
+            try:
+                pipeline_queue.submit(
+                    run_id, run_id, upload_id, stored['file_path'],
+                    user_id=current_user_id, content_hash=stored['content_hash'],
+                    product_code=product_code, lot_number=lot_number,
+                    target_market=target_market, language=language,
+                    owner=current_user_id
+                )
+            except QueueFullError as e:
+                pipeline_model.mark_failed(run_id, upload_id, stored['file_path'], error=str(e))
+                return jsonify({'error': str(e), 'runs': runs}), 503
+            
+            runs.append({
+                'run_id': run_id,
+                'upload_id': upload_id,
+                'filename': file.filename,
+                'status': 'pending',
+                'status_url': f"/api/pipeline/runs/{run_id}"
+            })
+        
+        return jsonify({'success': True, 'runs': runs}), 202
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/pipeline/runs/<int:run_id>', methods=['GET'])
+@token_required
+def get_pipeline_run(current_user_id, run_id):
+    """État d'une exécution du pipeline : étape en cours, verdict et durées par étape"""
+    try:
+        run = pipeline_model.get_run(run_id, current_user_id)
+        if not run:
+            return jsonify({'error': 'Exécution non trouvée'}), 404
+        
+        job = pipeline_queue.get(run_id)
+        if job:
+            run['attempts'] = job.attempts
+            if job.progress:
+                run['progress'] = {k: v for k, v in job.progress.items() if k != 'partial_results'}
+            if run['status'] == 'completed' and job.result:
+                run.update(job.result)
+        return jsonify(run), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 if __name__ == '__main__':
     app.run(debug=True, host='localhost', port=5000)
\ No newline at end of file
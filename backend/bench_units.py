@@ -0,0 +1,90 @@
+"""
+Micro-benchmark de services.units : analyse des valeurs et conversion
+d'unités, comparées à l'ancienne implémentation (str.replace + exception
+par valeur, facteur 1.0 par défaut). Usage : python bench_units.py [N]
+
+Échoue (code de sortie 1) si parse_number, qui remplace l'ancien
+parse_mrl, est plus lent que lui sur des valeurs toutes distinctes.
+"""
+import random
+import sys
+import time
+
+from services.units import (
+    normalize_results, parse_number, parse_value, parse_values, to_mg_kg, UnknownUnitError
+)
+
+LEGACY_UNIT_TABLE = {
+    "mg/kg": 1.0, "ppm": 1.0,
+    "ppb": 0.001, "µg/kg": 0.001, "ug/kg": 0.001,
+    "µg/g": 1.0, "ng/g": 0.001,
+}
+
+CELLS = ['0.05', '0,12', '0.01*', '<0.005', '< 0.01', 'nd', 'n.d.', '< LOQ', '> 2',
+         '1.5', 'non détecté', '—', 'N/A', '0.3 mg/kg', 0.02, None]
+UNITS = ['mg/kg', 'µg/kg', 'ug/kg', 'μg/kg', 'mg kg-1', 'ppm', 'ppb', 'ng/g']
+
+
+def legacy_parse(val):
+    if val is None or str(val).strip() in ["—", "N/A", ""]:
+        return None
+    try:
+        return float(str(val).replace("*", "").replace("<", "").replace(">", "").strip())
+    except Exception:
+        return None
+
+
+def legacy_to_mg_kg(value, unit):
+    return value * LEGACY_UNIT_TABLE.get(unit.strip().lower(), 1.0)
+
+
+def bench(label, fn, n, repeat=5):
+    # Meilleur de `repeat` passages : écarte le bruit de la machine
+    elapsed = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = min(elapsed, time.perf_counter() - start)
+    print(f"  {label:<38} {elapsed * 1000:9.1f} ms   {n / elapsed / 1e6:6.2f} M/s")
+    return elapsed
+
+
+def main(n):
+    rng = random.Random(42)
+    cells = [rng.choice(CELLS) for _ in range(n)]
+    units = [rng.choice(UNITS) for _ in range(n)]
+    rows = [{'substance': f's{i}', 'detected_value': c, 'loq_value': '0.01', 'unit': u}
+            for i, (c, u) in enumerate(zip(cells, units))]
+
+    print(f"Valeurs ({n} cellules)")
+    bench("ancien parse_mrl", lambda: [legacy_parse(c) for c in cells], n)
+    bench("parse_value (cellule par cellule)", lambda: [parse_value(c) for c in cells], n)
+    bench("parse_values (colonne)", lambda: parse_values(cells), n)
+    unique = [f"{rng.choice(('', '<', '> '))}{rng.random():.5f}{rng.choice(('', '*', ' mg/kg'))}" for _ in range(n)]
+    legacy = bench("ancien parse_mrl, valeurs uniques", lambda: [legacy_parse(c) for c in unique], n)
+    fast = bench("parse_number, valeurs uniques", lambda: [parse_number(c) for c in unique], n)
+    bench("parse_values, valeurs uniques", lambda: parse_values(unique), n)
+
+    print(f"Unités ({n} conversions)")
+    bench("ancien to_mg_kg", lambda: [legacy_to_mg_kg(1.0, u) for u in units], n)
+    bench("units.to_mg_kg", lambda: [to_mg_kg(1.0, u) for u in units], n)
+
+    print(f"Tableau complet ({n} lignes)")
+    bench("normalize_results", lambda: normalize_results(rows), n)
+
+    # Ce que l'ancien code faisait en silence
+    wrong = sum(1 for u in units if u.strip().lower() not in LEGACY_UNIT_TABLE)
+    print(f"Unités converties x1.0 par défaut par l'ancien code : {wrong} / {n}")
+    try:
+        to_mg_kg(1.0, 'mg/l')
+    except UnknownUnitError as e:
+        print(f"units.to_mg_kg('mg/l') -> {e}")
+
+    if fast > legacy:
+        print(f"✗ parse_number plus lent que l'ancien parse_mrl ({fast / legacy:.2f}x)")
+        sys.exit(1)
+    print(f"✓ parse_number : {legacy / fast:.2f}x l'ancien parse_mrl sur valeurs uniques")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
@@ -7,17 +7,113 @@ class Config:
     MYSQL_USER = 'root'
     MYSQL_PASSWORD = ''  
     MYSQL_DATABASE = 'mrl_db'
+
+    # Pool de connexions MySQL (partagé par tous les modèles)
+    MYSQL_POOL_SIZE = int(os.environ.get('MYSQL_POOL_SIZE', '10'))
+    MYSQL_POOL_TIMEOUT = float(os.environ.get('MYSQL_POOL_TIMEOUT', '10'))  # attente max d'une connexion (s)
+    MYSQL_POOL_RECYCLE = int(os.environ.get('MYSQL_POOL_RECYCLE', '1800'))  # durée de vie max d'une connexion (s)
+    MYSQL_POOL_PING_AFTER = int(os.environ.get('MYSQL_POOL_PING_AFTER', '30'))  # ping si inactive depuis (s)
+    MYSQL_STREAM_POOL_SIZE = int(os.environ.get('MYSQL_STREAM_POOL_SIZE', '4'))  # connexions des pages d'historique lues en flux
+    MYSQL_EXPORT_POOL_SIZE = int(os.environ.get('MYSQL_EXPORT_POOL_SIZE', '2'))  # connexions des exports (= exports simultanés max)
+    MYSQL_STREAM_WRITE_TIMEOUT = int(os.environ.get('MYSQL_STREAM_WRITE_TIMEOUT', '600'))  # s, net_write_timeout des lectures en flux
+    STREAM_FETCH_SIZE = int(os.environ.get('STREAM_FETCH_SIZE', '500'))  # lignes par fetchmany
+    EXPORT_PARQUET_ROW_GROUP = int(os.environ.get('EXPORT_PARQUET_ROW_GROUP', '10000'))  # lignes par groupe Parquet (mémoire de l'export)
+    BULK_INSERT_CHUNK = int(os.environ.get('BULK_INSERT_CHUNK', '500'))  # lignes par INSERT multi-lignes
+    HISTORY_PAGE_DEFAULT = int(os.environ.get('HISTORY_PAGE_DEFAULT', '50'))  # lignes par page d'historique
+    HISTORY_PAGE_MAX = int(os.environ.get('HISTORY_PAGE_MAX', '200'))  # plafond du paramètre limit
+    
+    # Client HTTP de l'API EU Pesticides
+    EU_API_TIMEOUT = float(os.environ.get('EU_API_TIMEOUT', '30'))  # timeout par défaut (s)
+    EU_API_TIMEOUTS = {  # timeouts par endpoint (s)
+        'pesticide-residues': 15,
+        'pesticide-residues-products': 15,
+        'pesticide-residues-mrls': 20,
+    }
+    EU_API_RETRIES = int(os.environ.get('EU_API_RETRIES', '3'))  # nouvelles tentatives sur 429/5xx
+    EU_API_BACKOFF = float(os.environ.get('EU_API_BACKOFF', '0.5'))  # base du backoff exponentiel (s)
+    EU_API_BACKOFF_MAX = float(os.environ.get('EU_API_BACKOFF_MAX', '8'))
+    EU_API_BUDGET = float(os.environ.get('EU_API_BUDGET', '30'))  # durée totale max d'un appel, tentatives comprises (s)
+    EU_API_POOL_SIZE = int(os.environ.get('EU_API_POOL_SIZE', '20'))  # connexions keep-alive
+    
+    # Cache persistant des réponses de l'API EU Pesticides
+    API_CACHE_PATH = os.environ.get('API_CACHE_PATH', os.path.join(os.path.dirname(__file__), 'cache', 'eu_api_cache.sqlite3'))
+    API_CACHE_TTL = int(os.environ.get('API_CACHE_TTL', str(24 * 3600)))  # fraîcheur (s)
+    API_CACHE_STALE_TTL = int(os.environ.get('API_CACHE_STALE_TTL', str(7 * 24 * 3600)))  # servi périmé + rafraîchi (s)
+    API_CACHE_MAX_ENTRIES = int(os.environ.get('API_CACHE_MAX_ENTRIES', '50000'))
+    API_CACHE_MEMORY_ENTRIES = int(os.environ.get('API_CACHE_MEMORY_ENTRIES', '2000'))
+    
+    # Catalogue des résidus (chargement parallèle + snapshot local)
+    CATALOGUE_SNAPSHOT_DIR = os.environ.get('CATALOGUE_SNAPSHOT_DIR', os.path.join(os.path.dirname(__file__), 'cache'))
+    CATALOGUE_PAGE_SIZE = int(os.environ.get('CATALOGUE_PAGE_SIZE', '1000'))
+    CATALOGUE_WORKERS = int(os.environ.get('CATALOGUE_WORKERS', '4'))  # pages téléchargées en parallèle
+    CATALOGUE_TTL = int(os.environ.get('CATALOGUE_TTL', str(24 * 3600)))  # durée de validité d'un catalogue (s)
+    # Langues acceptées (langues officielles de l'UE) : une langue = un catalogue en mémoire et un téléchargement
+    CATALOGUE_LANGUAGES = [l.strip().upper() for l in os.environ.get(
+        'CATALOGUE_LANGUAGES',
+        'BG,CS,DA,DE,EL,EN,ES,ET,FI,FR,GA,HR,HU,IT,LT,LV,MT,NL,PL,PT,RO,SK,SL,SV'
+    ).split(',') if l.strip()]
+    CATALOGUE_RETRY_AFTER = int(os.environ.get('CATALOGUE_RETRY_AFTER', '60'))  # s, pas de nouveau téléchargement après un échec
+    RESIDUE_PRELOAD = os.environ.get('RESIDUE_PRELOAD', 'true').lower() == 'true'  # préchargement au démarrage
+    
+    # Miroir local de la base EU (tables eu_*, voir database/sync_eu_mirror.py)
+    EU_MIRROR_ENABLED = os.environ.get('EU_MIRROR_ENABLED', 'true').lower() == 'true'
+    
+    # Recherche groupée : exécution concurrente
+    FANOUT_WORKERS = int(os.environ.get('FANOUT_WORKERS', '16'))  # threads partagés par le processus
+    MAX_CONCURRENCY_PER_HOST = int(os.environ.get('MAX_CONCURRENCY_PER_HOST', '8'))  # appels simultanés par hôte
+    MULTI_SEARCH_DEADLINE = float(os.environ.get('MULTI_SEARCH_DEADLINE', '60'))  # échéance globale (s)
+    MRL_BATCH_MAX = int(os.environ.get('MRL_BATCH_MAX', '500'))  # résidus max par appel /api/mrl/mrls/batch
+    ANALYSES_BATCH_MAX = int(os.environ.get('ANALYSES_BATCH_MAX', '1000'))  # analyses max par lot
     
     # JWT
     SECRET_KEY = '1234567890'  
     JWT_EXPIRATION = timedelta(days=7)
     
+    # Administration (emails autorisés sur /api/admin/*, séparés par des virgules)
+    ADMIN_EMAILS = [e.strip().lower() for e in os.environ.get('ADMIN_EMAILS', '').split(',') if e.strip()]
+    
     # CORS
     CORS_ORIGINS = ['http://localhost:3000', 'http://localhost:5173']
 
     # Gemini API Configuration
     GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY', '')
     GEMINI_MODEL = 'gemini-1.5-flash'  # Can also use 'gemini-1.5-pro' for higher accuracy
+    # Backend d'extraction : 'gemini', 'text' (couche texte locale) ou 'replay' (réponses enregistrées)
+    EXTRACTION_BACKEND = os.environ.get('EXTRACTION_BACKEND', 'gemini')
+    EXTRACTION_RECORD_DIR = os.environ.get('EXTRACTION_RECORD_DIR', '')  # enregistre les réponses Gemini pour le replay
+    EXTRACTION_REPLAY_DIR = os.environ.get('EXTRACTION_REPLAY_DIR', os.path.join(os.path.dirname(__file__), 'cache', 'replay'))
+    EXTRACTION_STREAMING = os.environ.get('EXTRACTION_STREAMING', '1') == '1'  # réponse en flux, lignes émises à l'arrivée
+    EXTRACTION_REPLAY_LATENCY_MS = float(os.environ.get('EXTRACTION_REPLAY_LATENCY_MS', '0'))  # latence simulée par appel
+    GEMINI_MAX_CONCURRENCY = int(os.environ.get('GEMINI_MAX_CONCURRENCY', '4'))  # appels Gemini simultanés
+    # Quota Gemini partagé par tous les processus (seau à jetons SQLite) et coût
+    GEMINI_RATE_PER_MINUTE = float(os.environ.get('GEMINI_RATE_PER_MINUTE', '60'))
+    GEMINI_RATE_BURST = int(os.environ.get('GEMINI_RATE_BURST', '10'))
+    GEMINI_RATE_TIMEOUT = float(os.environ.get('GEMINI_RATE_TIMEOUT', '300'))  # attente max d'un jeton (s)
+    RATE_LIMIT_PATH = os.environ.get('RATE_LIMIT_PATH', os.path.join(os.path.dirname(__file__), 'cache', 'rate_limits.sqlite3'))
+    GEMINI_PRICE_INPUT_PER_M = float(os.environ.get('GEMINI_PRICE_INPUT_PER_M', '0.075'))  # USD / million de tokens
+    GEMINI_PRICE_OUTPUT_PER_M = float(os.environ.get('GEMINI_PRICE_OUTPUT_PER_M', '0.30'))
+    GEMINI_INLINE_MAX_BYTES = int(os.environ.get('GEMINI_INLINE_MAX_BYTES', str(4 * 1024 * 1024)))  # au-delà : File API Gemini
+    LOCAL_EXTRACTION_ENABLED = os.environ.get('LOCAL_EXTRACTION_ENABLED', '1') == '1'  # lecture de la couche texte avant Gemini
+    LOCAL_EXTRACTION_MIN_CONFIDENCE = float(os.environ.get('LOCAL_EXTRACTION_MIN_CONFIDENCE', '0.8'))  # en dessous : Gemini
+    EXTRACTION_CHUNKED_MIN_PAGES = int(os.environ.get('EXTRACTION_CHUNKED_MIN_PAGES', '3'))  # 0 = jamais découper
+    EXTRACTION_PAGES_PER_CHUNK = int(os.environ.get('EXTRACTION_PAGES_PER_CHUNK', '1'))
+    UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', str(256 * 1024)))  # écriture disque + hash en streaming
+
+    # File d'extraction PDF en arrière-plan
+    EXTRACTION_WORKERS = int(os.environ.get('EXTRACTION_WORKERS', '4'))
+    EXTRACTION_MAX_ATTEMPTS = int(os.environ.get('EXTRACTION_MAX_ATTEMPTS', '3'))
+    EXTRACTION_RETRY_BACKOFF = float(os.environ.get('EXTRACTION_RETRY_BACKOFF', '2'))  # s, doublé à chaque essai
+    EXTRACTION_QUEUE_MAX = int(os.environ.get('EXTRACTION_QUEUE_MAX', '1000'))  # jobs en attente max
+    EXTRACTION_CACHE_ENABLED = os.environ.get('EXTRACTION_CACHE_ENABLED', '1') == '1'  # réutiliser les extractions d'un PDF identique
+    # Jobs en mémoire uniquement : au-delà, un upload 'pending' / 'processing' est considéré perdu (redémarrage)
+    UPLOAD_STALE_AFTER = int(os.environ.get('UPLOAD_STALE_AFTER', '1800'))  # s
+    EVENT_STREAM_MAX_SECONDS = int(os.environ.get('EVENT_STREAM_MAX_SECONDS', '300'))  # durée max d'un flux SSE (le client se reconnecte)
+    EVENT_STREAM_TOKEN_TTL = int(os.environ.get('EVENT_STREAM_TOKEN_TTL', '900'))  # s, jeton ?token= d'un flux SSE
+
+    # Pipeline bulletin -> verdict (extraction + LMR + conformité en un job)
+    PIPELINE_WORKERS = int(os.environ.get('PIPELINE_WORKERS', '2'))
+    PIPELINE_MAX_FILES = int(os.environ.get('PIPELINE_MAX_FILES', '20'))  # PDF max par requête
+    PIPELINE_RESOLVE_TIMEOUT = float(os.environ.get('PIPELINE_RESOLVE_TIMEOUT', '120'))  # s, attente des résolutions de résidus
 
     # Email (à configurer selon ton fournisseur SMTP)
     EMAIL_HOST = os.environ.get('EMAIL_HOST', 'smtp.gmail.com')
@@ -0,0 +1,371 @@
+import mysql.connector
+from config import Config
+from services.db_pool import get_pool
+from services.residue_catalogue import ResidueCatalogueLoader
+from datetime import datetime
+import hashlib
+import json
+import threading
+import time
+
+# ---------------------------------------------------------------------------
+# EUMirrorModel
+# Miroir local (MySQL) des résidus, produits et LMR de l'API EU Pesticides.
+# sync() télécharge chaque entité et n'écrit que les enregistrements nouveaux
+# ou modifiés (comparaison d'empreinte SHA-1), puis supprime ceux qui ont
+# disparu de la source. Le téléchargement remplit une table de préparation
+# (<table>_staging) ; les nouveautés et les suppressions sont ensuite publiées
+# dans la table lue en une seule transaction, avec l'état 'success' : une
+# synchronisation interrompue ne laisse jamais un miroir à moitié à jour.
+# Les méthodes find_* retournent None tant que le miroir n'a jamais été
+# synchronisé, pour que l'appelant retombe sur l'API.
+# ---------------------------------------------------------------------------
+
+class EUMirrorModel:
+    ENTITIES = ('residues', 'products', 'mrls')
+    BATCH_SIZE = 500
+    READY_TTL = 60  # secondes entre deux vérifications de l'état du miroir
+
+    _ready_cache = {}
+    _ready_lock = threading.Lock()
+    _sync_lock = threading.Lock()
+
+    def __init__(self, base_url, version, headers):
+        self.base_url = base_url
+        self.version = version
+        self.loader = ResidueCatalogueLoader(
+            base_url, version, headers,
+            page_size=Config.CATALOGUE_PAGE_SIZE,
+            workers=Config.CATALOGUE_WORKERS
+        )
+
+    def get_connection(self):
+        return get_pool().get_connection()
+
+    @staticmethod
+    def record_hash(record):
+        return hashlib.sha1(json.dumps(record, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _field(record, name):
+        value = record.get(name)
+        if value is None:
+            value = record.get(name.upper())
+        return value
+
+    # -----------------------------------------------------------------------
+    # Lecture
+    # -----------------------------------------------------------------------
+
+    def is_ready(self, entity, language=''):
+        """Vrai si l'entité a été synchronisée au moins une fois avec succès."""
+        if not Config.EU_MIRROR_ENABLED:
+            return False
+        key = (entity, language)
+        now = time.monotonic()
+        with self._ready_lock:
+            cached = self._ready_cache.get(key)
+            if cached and now - cached[1] < self.READY_TTL:
+                return cached[0]
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT last_success_at FROM eu_mirror_sync_state WHERE entity=%s AND language=%s",
+                (entity, language)
+            )
+            row = cursor.fetchone()
+            cursor.close()
+            conn.close()
+            ready = bool(row and row[0])
+        except mysql.connector.Error:
+            ready = False
+        with self._ready_lock:
+            self._ready_cache[key] = (ready, now)
+        return ready
+
+    def _select_raw(self, query, params):
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            rows = [json.loads(r[0]) for r in cursor.fetchall()]
+            cursor.close()
+            conn.close()
+            return rows
+        except mysql.connector.Error:
+            return None
+
+    def find_residues(self, names, language="EN"):
+        """Résidus dont le nom correspond exactement (insensible à la casse) à l'un des noms."""
+        language = language.upper()
+        if not names or not self.is_ready('residues', language):
+            return None
+        placeholders = ', '.join(['%s'] * len(names))
+        return self._select_raw(
+            f"SELECT raw_json FROM eu_residues WHERE language=%s AND residue_name IN ({placeholders})",
+            (language, *names)
+        )
+
+    def find_products(self, product_code=None, language="EN"):
+        language = language.upper()
+        if not self.is_ready('products', language):
+            return None
+        if product_code:
+            return self._select_raw(
+                "SELECT raw_json FROM eu_products WHERE language=%s AND product_code=%s",
+                (language, product_code)
+            )
+        return self._select_raw("SELECT raw_json FROM eu_products WHERE language=%s", (language,))
+
+    def find_mrls(self, residue_id, product_id=None):
+        if not self.is_ready('mrls'):
+            return None
+        if product_id:
+            return self._select_raw(
+                "SELECT raw_json FROM eu_mrls WHERE residue_id=%s AND product_id=%s",
+                (residue_id, product_id)
+            )
+        return self._select_raw("SELECT raw_json FROM eu_mrls WHERE residue_id=%s", (residue_id,))
+
+    def find_mrls_batch(self, product_id, residue_ids):
+        """{ str(residue_id): [enregistrements] } pour un produit, en une requête."""
+        if not residue_ids or not self.is_ready('mrls'):
+            return None
+        placeholders = ', '.join(['%s'] * len(residue_ids))
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT residue_id, raw_json FROM eu_mrls WHERE product_id=%s AND residue_id IN ({placeholders})",
+                (product_id, *residue_ids)
+            )
+            grouped = {}
+            for residue_id, raw in cursor.fetchall():
+                grouped.setdefault(str(residue_id), []).append(json.loads(raw))
+            cursor.close()
+            conn.close()
+            return grouped
+        except mysql.connector.Error:
+            return None
+
+    # -----------------------------------------------------------------------
+    # Synchronisation
+    # -----------------------------------------------------------------------
+
+    def sync(self, entities=None, language="EN"):
+        """Synchronise les entités demandées ; retourne un rapport par entité."""
+        if not self._sync_lock.acquire(blocking=False):
+            return {'success': False, 'error': 'Synchronisation déjà en cours'}
+        try:
+            report = {}
+            for entity in entities or self.ENTITIES:
+                report[entity] = self._sync_entity(entity, language.upper())
+            return {'success': all(r.get('status') == 'success' for r in report.values()), 'entities': report}
+        finally:
+            self._sync_lock.release()
+
+    def get_sync_state(self):
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SELECT * FROM eu_mirror_sync_state ORDER BY entity, language")
+            rows = cursor.fetchall()
+            cursor.close()
+            conn.close()
+            return {'success': True, 'state': rows}
+        except mysql.connector.Error as err:
+            return {'success': False, 'error': str(err)}
+
+    def _sync_entity(self, entity, language):
+        state_language = '' if entity == 'mrls' else language
+        started_at = datetime.now()
+        counts = {'records': 0, 'inserted': 0, 'updated': 0, 'deleted': 0}
+        conn = None
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            self._save_state(cursor, entity, state_language, 'running', counts, None, started_at)
+            conn.commit()
+
+            if entity == 'mrls':
+                self._sync_mrls(cursor, conn, counts)
+            else:
+                self._sync_keyed(cursor, conn, entity, language, counts)
+
+            # Même transaction que la publication des données
+            self._save_state(cursor, entity, state_language, 'success', counts, None, started_at, finished=True)
+            conn.commit()
+            cursor.close()
+            with self._ready_lock:
+                self._ready_cache.pop((entity, state_language), None)
+            return dict(counts, status='success')
+        except Exception as err:  # jamais d'état bloqué à 'running'
+            if conn is not None:
+                try:
+                    conn.rollback()
+                    cursor = conn.cursor()
+                    self._save_state(cursor, entity, state_language, 'failed', counts, str(err), started_at)
+                    conn.commit()
+                    cursor.close()
+                except mysql.connector.Error:
+                    pass
+            return dict(counts, status='failed', error=str(err))
+        finally:
+            if conn is not None:
+                conn.close()
+
+    @staticmethod
+    def _staging(cursor, table):
+        """Table de préparation de `table` (même structure), créée au besoin."""
+        staging = f"{table}_staging"
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {staging} LIKE {table}")
+        return staging
+
+    def _sync_keyed(self, cursor, conn, entity, language, counts):
+        if entity == 'residues':
+            endpoint, table, key_col = 'pesticide-residues', 'eu_residues', 'residue_id'
+            columns = ('residue_id', 'language', 'residue_name', 'record_hash', 'raw_json')
+        else:
+            endpoint, table, key_col = 'pesticide-residues-products', 'eu_products', 'product_id'
+            columns = ('product_id', 'language', 'product_code', 'product_name', 'record_hash', 'raw_json')
+        column_list = ', '.join(columns)
+        updates = ', '.join(f"{c}=VALUES({c})" for c in columns[2:])
+
+        staging = self._staging(cursor, table)
+        cursor.execute(f"DELETE FROM {staging} WHERE language=%s", (language,))
+        conn.commit()
+
+        cursor.execute(f"SELECT {key_col}, record_hash FROM {table} WHERE language=%s", (language,))
+        existing = {row[0]: row[1] for row in cursor.fetchall()}
+        seen = set()
+        batch = []
+        upsert = (
+            f"INSERT INTO {staging} ({column_list}) VALUES ({', '.join(['%s'] * len(columns))}) "
+            f"ON DUPLICATE KEY UPDATE {updates}"
+        )
+
+        params = {"language": language, "format": "json", "api-version": self.version}
+        for page in self.loader.iter_pages(f"{self.base_url}/{endpoint}", params):
+            for record in page:
+                if entity == 'residues':
+                    key = self._field(record, 'pesticide_residue_id')
+                else:
+                    key = self._field(record, 'product_id')
+                try:
+                    key = int(key)
+                except (TypeError, ValueError):
+                    continue
+                counts['records'] += 1
+                seen.add(key)
+                digest = self.record_hash(record)
+                if existing.get(key) == digest:
+                    continue
+                counts['updated' if key in existing else 'inserted'] += 1
+                raw = json.dumps(record, separators=(',', ':'))
+                if entity == 'residues':
+                    name = self._field(record, 'pesticide_residue_name') or ''
+                    batch.append((key, language, name, digest, raw))
+                else:
+                    batch.append((key, language, self._field(record, 'product_code'),
+                                  self._field(record, 'product_name'), digest, raw))
+                if len(batch) >= self.BATCH_SIZE:
+                    cursor.executemany(upsert, batch)
+                    conn.commit()  # table de préparation : invisible des lecteurs
+                    batch = []
+        if batch:
+            cursor.executemany(upsert, batch)
+            conn.commit()
+
+        # Publication : nouveautés + suppressions, validées par _sync_entity
+        # dans la même transaction que l'état 'success'
+        cursor.execute(
+            f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {staging} WHERE language=%s "
+            f"ON DUPLICATE KEY UPDATE {updates}",
+            (language,)
+        )
+        stale = [k for k in existing if k not in seen]
+        for i in range(0, len(stale), self.BATCH_SIZE):
+            chunk = stale[i:i + self.BATCH_SIZE]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(
+                f"DELETE FROM {table} WHERE language=%s AND {key_col} IN ({placeholders})",
+                (language, *chunk)
+            )
+        counts['deleted'] = len(stale)
+        cursor.execute(f"DELETE FROM {staging} WHERE language=%s", (language,))
+
+    def _sync_mrls(self, cursor, conn, counts):
+        columns = 'record_hash, residue_id, product_id, applicability, mrl_value, raw_json'
+        staging = self._staging(cursor, 'eu_mrls')
+        cursor.execute(f"DELETE FROM {staging}")
+        conn.commit()
+
+        cursor.execute("SELECT record_hash FROM eu_mrls")
+        existing = {row[0] for row in cursor.fetchall()}
+        seen = set()
+        batch = []
+        insert = f"INSERT IGNORE INTO {staging} ({columns}) VALUES (%s, %s, %s, %s, %s, %s)"
+
+        params = {"format": "json", "api-version": self.version}
+        for page in self.loader.iter_pages(f"{self.base_url}/pesticide-residues-mrls", params):
+            for record in page:
+                residue_id = self._field(record, 'pesticide_residue_id')
+                product_id = self._field(record, 'product_id')
+                try:
+                    residue_id = int(residue_id)
+                    product_id = int(product_id) if product_id is not None else None
+                except (TypeError, ValueError):
+                    continue
+                counts['records'] += 1
+                digest = self.record_hash(record)
+                seen.add(digest)
+                if digest in existing:
+                    continue
+                counts['inserted'] += 1
+                batch.append((
+                    digest,
+                    residue_id,
+                    product_id,
+                    str(self._field(record, 'applicability') or '').strip() or None,
+                    str(self._field(record, 'mrl_value') or '').strip()[:50] or None,
+                    json.dumps(record, separators=(',', ':'))
+                ))
+                if len(batch) >= self.BATCH_SIZE:
+                    cursor.executemany(insert, batch)
+                    conn.commit()  # table de préparation : invisible des lecteurs
+                    batch = []
+        if batch:
+            cursor.executemany(insert, batch)
+            conn.commit()
+
+        # Publication atomique (validée avec l'état 'success') : jamais
+        # d'anciennes et de nouvelles LMR côte à côte pour current_mrl
+        cursor.execute(f"INSERT IGNORE INTO eu_mrls ({columns}) SELECT {columns} FROM {staging}")
+        stale = list(existing - seen)
+        for i in range(0, len(stale), self.BATCH_SIZE):
+            chunk = stale[i:i + self.BATCH_SIZE]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f"DELETE FROM eu_mrls WHERE record_hash IN ({placeholders})", tuple(chunk))
+        counts['deleted'] = len(stale)
+        cursor.execute(f"DELETE FROM {staging}")
+
+    @staticmethod
+    def _save_state(cursor, entity, language, status, counts, error, started_at, finished=False):
+        now = datetime.now()
+        cursor.execute(
+            """INSERT INTO eu_mirror_sync_state
+                   (entity, language, status, records, inserted, updated, deleted, error,
+                    started_at, finished_at, last_success_at)
+               VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+               ON DUPLICATE KEY UPDATE
+                   status=VALUES(status), records=VALUES(records), inserted=VALUES(inserted),
+                   updated=VALUES(updated), deleted=VALUES(deleted), error=VALUES(error),
+                   started_at=VALUES(started_at), finished_at=VALUES(finished_at),
+                   last_success_at=COALESCE(VALUES(last_success_at), last_success_at)""",
+            (
+                entity, language, status,
+                counts['records'], counts['inserted'], counts['updated'], counts['deleted'], error,
+                started_at, now if finished else None, now if status == 'success' else None
+            )
+        )
@@ -1,11 +1,30 @@
 import mysql.connector
 from config import Config
+from services.db_pool import get_pool, insert_many
 import os
 import json
-import base64
-import google.generativeai as genai
+import hashlib
+import threading
+import time
+from decimal import Decimal
+import io
+import re
+from services.extraction_backends import get_extraction_backend
+from services.fanout import get_gemini_executor, run_ordered
+from services.jobs import current_job
+from services.json_stream import IncrementalExtractionParser
+from services.rate_limiter import get_gemini_bucket
+from services.memstats import RssTracker
+from services.text_layer import extract_text_layer
+from services.units import cell_unit, parse_value
+from services.pagination import keyset_clause, keyset_page
 from werkzeug.exceptions import BadRequest
 
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:  # découpage par page optionnel
+    PdfReader = PdfWriter = None
+
 # ---------------------------------------------------------------------------
 # GeminiModel
 # Handles PDF data extraction using Google Gemini Vision API
@@ -13,19 +32,25 @@ from werkzeug.exceptions import BadRequest
 # ---------------------------------------------------------------------------
 
 class GeminiModel:
+    # Appels simultanés max vers l'API Gemini (partagé par toutes les instances)
+    _gemini_slots = threading.BoundedSemaphore(Config.GEMINI_MAX_CONCURRENCY)
+
+    # Statistiques d'analyse des réponses (voir parse_stats)
+    _parse_totals = {'calls': 0, 'complete': 0, 'recovered': 0, 'wasted': 0,
+                     'rows': 0, 'rows_rejected': 0, 'first_row_total': 0.0, 'first_row_count': 0}
+    _parse_lock = threading.Lock()
+
+    # Version de _normalize_extraction : la changer invalide le cache
+    # d'extraction (2 : unités propres à chaque cellule, unit_error)
+    NORMALIZER_VERSION = 2
+
     def __init__(self):
-        self.db_config = {
-            'host': Config.MYSQL_HOST,
-            'user': Config.MYSQL_USER,
-            'password': Config.MYSQL_PASSWORD,
-            'database': Config.MYSQL_DATABASE
-        }
         self.upload_dir = os.path.join(os.path.dirname(__file__), '..', 'uploads')
         os.makedirs(self.upload_dir, exist_ok=True)
 
-        # Configure Gemini API
-        genai.configure(api_key=Config.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel(Config.GEMINI_MODEL)
+        # Backend d'extraction (Gemini, texte local, replay) créé au premier appel :
+        # le démarrage ne dépend pas du SDK Gemini
+        self._backend = None
 
         # Optimized prompt for laboratory analysis extraction
         self.extraction_prompt = """
@@ -73,12 +98,25 @@ QUALITY CHECK:
 Return only the JSON object, nothing else.
 """
 
+        # Empreintes utilisées par le cache d'extraction (voir extraction_cache_key)
+        self.prompt_hash = hashlib.sha256(self.extraction_prompt.encode('utf-8')).hexdigest()
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = get_extraction_backend()
+        return self._backend
+
+    @property
+    def model_version(self):
+        return self.backend.version
+
     # -----------------------------------------------------------------------
     # DB helpers (kept from OCRModel for compatibility)
     # -----------------------------------------------------------------------
 
     def get_connection(self):
-        return mysql.connector.connect(**self.db_config)
+        return get_pool().get_connection()
 
     def save_upload(self, user_id, filename, file_path, file_size):
         """Enregistre les métadonnées du fichier uploadé."""
@@ -121,6 +159,29 @@ Return only the JSON object, nothing else.
         except mysql.connector.Error as err:
             return {'success': False, 'error': str(err)}
 
+    def fail_stale_uploads(self, older_than):
+        """
+        Uploads restés 'pending' / 'processing' depuis plus de `older_than`
+        secondes -> 'failed'. Les jobs ne vivent qu'en mémoire : après un
+        redémarrage, plus personne ne les termine. Retourne le nombre d'uploads.
+        """
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                """UPDATE ocr_uploads SET processing_status='failed'
+                   WHERE processing_status IN ('pending', 'processing')
+                     AND upload_date < NOW() - INTERVAL %s SECOND""",
+                (int(older_than),)
+            )
+            count = cursor.rowcount
+            conn.commit()
+            cursor.close()
+            conn.close()
+            return count
+        except mysql.connector.Error:
+            return 0
+
     def save_extracted_data(self, upload_id, extracted_data):
         """
         Sauvegarde toutes les lignes du tableau d'analyse.
@@ -141,35 +202,37 @@ Return only the JSON object, nothing else.
             confidence = extracted_data.get('confidence', 0.95)
             results = extracted_data.get('results', [])
 
-            inserted_ids = []
+            rows = []
             for row in results:
                 detected_value = row.get('detected_value')
                 loq_value = row.get('loq_value')
                 unit = row.get('unit', 'mg/kg')
-                below_loq = row.get('below_loq', False)
                 row_confidence = row.get('confidence', confidence)
                 requires_val = row_confidence < 0.95
 
-                cursor.execute(
-                    """INSERT INTO ocr_extracted_data (
-                           upload_id, substance_name, detected_value, detected_unit,
-                           loq_value, loq_unit, product_name, lot_number,
-                           extraction_confidence, requires_validation
-                       ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-                    (
-                        upload_id,
-                        row.get('substance'),
-                        detected_value,
-                        unit,
-                        loq_value,
-                        unit,
-                        product_name,
-                        lot_number,
-                        row_confidence,
-                        requires_val
-                    )
-                )
-                inserted_ids.append(cursor.lastrowid)
+                rows.append((
+                    upload_id,
+                    row.get('substance'),
+                    detected_value,
+                    unit,
+                    loq_value,
+                    row.get('loq_unit') or unit,
+                    product_name,
+                    lot_number,
+                    row_confidence,
+                    requires_val
+                ))
+
+            # Un seul INSERT multi-lignes par paquet au lieu d'un aller-retour par ligne
+            inserted_ids = insert_many(
+                cursor,
+                'ocr_extracted_data',
+                ('upload_id', 'substance_name', 'detected_value', 'detected_unit',
+                 'loq_value', 'loq_unit', 'product_name', 'lot_number',
+                 'extraction_confidence', 'requires_validation'),
+                rows,
+                chunk_size=Config.BULK_INSERT_CHUNK
+            )
 
             conn.commit()
             cursor.close()
@@ -178,22 +241,202 @@ Return only the JSON object, nothing else.
         except mysql.connector.Error as err:
             return {'success': False, 'error': str(err)}
 
-    def get_user_uploads(self, user_id, limit=20):
-        """Récupère l'historique des uploads d'un utilisateur."""
+    # -----------------------------------------------------------------------
+    # Stockage par contenu + cache d'extraction
+    # -----------------------------------------------------------------------
+
+    @staticmethod
+    def file_sha256(file_path, chunk_size=1024 * 1024):
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def save_stream(stream, tmp_path, chunk_size=None):
+        """
+        Écrit un flux (fichier multipart) sur disque par blocs en calculant
+        le SHA-256 au passage ; retourne (sha256, taille). Un seul bloc est
+        en mémoire à la fois.
+        """
+        chunk_size = chunk_size or Config.UPLOAD_CHUNK_SIZE
+        digest = hashlib.sha256()
+        size = 0
+        buf = bytearray(chunk_size)
+        view = memoryview(buf)
+        with open(tmp_path, 'wb') as out:
+            while True:
+                n = stream.readinto(buf) if hasattr(stream, 'readinto') else None
+                if n is None:
+                    chunk = stream.read(chunk_size)
+                    n = len(chunk)
+                    view[:n] = chunk
+                if not n:
+                    break
+                digest.update(view[:n])
+                out.write(view[:n])
+                size += n
+        return digest.hexdigest(), size
+
+    def store_by_content(self, tmp_path, content_hash=None, file_size=None):
+        """
+        Range un fichier reçu sous uploads/<sha256>.pdf et retourne
+        (chemin, sha256, taille). Un PDF déjà reçu n'est stocké qu'une fois :
+        le fichier temporaire est alors simplement supprimé.
+        """
+        if content_hash is None:
+            content_hash = self.file_sha256(tmp_path)
+        if file_size is None:
+            file_size = os.path.getsize(tmp_path)
+        file_path = os.path.join(self.upload_dir, f"{content_hash}.pdf")
+        if os.path.exists(file_path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, file_path)
+        return file_path, content_hash, file_size
+
+    def extraction_cache_key(self, content_hash):
+        """Clé de cache : contenu du PDF + version du prompt + modèle Gemini + normalisation."""
+        raw = f"{content_hash}:{self.prompt_hash}:{self.model_version}:n{self.NORMALIZER_VERSION}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def find_cached_extraction(self, content_hash):
+        """Extraction réussie précédente pour ce contenu, ou None."""
+        if not Config.EXTRACTION_CACHE_ENABLED or not content_hash:
+            return None
         try:
             conn = self.get_connection()
             cursor = conn.cursor(dictionary=True)
             cursor.execute(
-                """SELECT * FROM ocr_uploads
-                   WHERE user_id = %s
-                   ORDER BY upload_date DESC
-                   LIMIT %s""",
-                (user_id, limit)
+                "SELECT * FROM ocr_extraction_cache WHERE cache_key=%s",
+                (self.extraction_cache_key(content_hash),)
             )
-            uploads = cursor.fetchall()
+            cached = cursor.fetchone()
             cursor.close()
             conn.close()
-            return {'success': True, 'uploads': uploads}
+            return cached
+        except mysql.connector.Error:
+            return None
+
+    def remember_extraction(self, content_hash, upload_id, extracted_data):
+        """
+        Enregistre une extraction réussie dans le cache (jamais une extraction
+        partielle). Les lectures locales de la couche texte (source='text_layer')
+        ne sont pas mises en cache : la clé désigne le modèle, pas l'analyseur
+        local, et relire le PDF ne prend que quelques ms avec l'analyseur et le
+        seuil LOCAL_EXTRACTION_MIN_CONFIDENCE du moment.
+        """
+        if not Config.EXTRACTION_CACHE_ENABLED or not content_hash or extracted_data.get('failed_pages'):
+            return
+        if extracted_data.get('source') == 'text_layer':
+            return
+        if extracted_data.get('parse_stats', {}).get('truncated'):
+            return
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                """INSERT INTO ocr_extraction_cache
+                   (cache_key, content_hash, prompt_hash, model_version, source_upload_id,
+                    extracted_json, confidence, results_count)
+                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                   ON DUPLICATE KEY UPDATE source_upload_id=VALUES(source_upload_id),
+                       extracted_json=VALUES(extracted_json), confidence=VALUES(confidence),
+                       results_count=VALUES(results_count)""",
+                (self.extraction_cache_key(content_hash), content_hash, self.prompt_hash,
+                 self.model_version, upload_id, json.dumps(extracted_data),
+                 extracted_data.get('confidence'), len(extracted_data.get('results', [])))
+            )
+            conn.commit()
+            cursor.close()
+            conn.close()
+        except mysql.connector.Error:
+            pass  # le cache est une optimisation, jamais bloquant
+
+    def reuse_extraction(self, upload_id, cached):
+        """
+        Associe à upload_id les lignes ocr_extracted_data de l'upload source
+        (copie INSERT ... SELECT côté serveur) sans rappeler Gemini.
+        Retourne la réponse client, ou None si la réutilisation a échoué.
+        """
+        extracted_data = json.loads(cached['extracted_json'])
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                """INSERT INTO ocr_extracted_data
+                   (upload_id, substance_name, detected_value, detected_unit, loq_value, loq_unit,
+                    product_name, lot_number, extraction_confidence, requires_validation)
+                   SELECT %s, substance_name, detected_value, detected_unit, loq_value, loq_unit,
+                          product_name, lot_number, extraction_confidence, requires_validation
+                   FROM ocr_extracted_data WHERE upload_id=%s ORDER BY id""",
+                (upload_id, cached['source_upload_id'])
+            )
+            copied = cursor.rowcount
+            if copied != cached['results_count']:
+                # Upload source supprimé ou modifié : repartir du JSON en cache
+                conn.rollback()
+                cursor.close()
+                conn.close()
+                if not self.save_extracted_data(upload_id, extracted_data)['success']:
+                    return None
+                conn = self.get_connection()
+                cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE ocr_extraction_cache SET hit_count=hit_count+1, last_hit_at=NOW() WHERE cache_key=%s",
+                (cached['cache_key'],)
+            )
+            conn.commit()
+            cursor.close()
+            conn.close()
+        except mysql.connector.Error:
+            return None
+
+        self.update_upload_status(upload_id, 'completed', extracted_data.get('confidence'))
+        response = self.upload_response(upload_id, extracted_data)
+        response['cached'] = True
+        return response
+
+    def get_upload(self, upload_id, user_id):
+        """Récupère un upload s'il appartient à l'utilisateur."""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(
+                "SELECT * FROM ocr_uploads WHERE id=%s AND user_id=%s",
+                (upload_id, user_id)
+            )
+            upload = cursor.fetchone()
+            cursor.close()
+            conn.close()
+            return upload
+        except mysql.connector.Error:
+            return None
+
+    # Colonnes de l'historique des uploads (pas de file_path ni de hash)
+    UPLOAD_HISTORY_COLUMNS = ('id', 'filename', 'file_size', 'upload_date', 'processing_status', 'confidence_score')
+
+    @classmethod
+    def uploads_query(cls, user_id, after=None):
+        """Requête d'une page d'uploads -> (sql, paramètres sans LIMIT), index (user_id, upload_date)."""
+        condition, params = keyset_clause('upload_date', 'id', after)
+        query = f"""SELECT {', '.join(cls.UPLOAD_HISTORY_COLUMNS)} FROM ocr_uploads
+                   WHERE user_id = %s{condition}
+                   ORDER BY upload_date DESC, id DESC
+                   LIMIT %s"""
+        return query, (user_id,) + params
+
+    def get_user_uploads(self, user_id, limit=20, after=None):
+        """Récupère une page de l'historique des uploads (curseur `after` = (upload_date, id))."""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor(dictionary=True)
+            query, params = self.uploads_query(user_id, after)
+            uploads, next_cursor = keyset_page(cursor, query, params, limit, 'upload_date')
+            cursor.close()
+            conn.close()
+            return {'success': True, 'uploads': uploads, 'next_cursor': next_cursor}
         except mysql.connector.Error as err:
             return {'success': False, 'error': str(err)}
 
@@ -213,13 +456,121 @@ Return only the JSON object, nothing else.
         except mysql.connector.Error as err:
             return {'success': False, 'error': str(err)}
 
+    # -----------------------------------------------------------------------
+    # Traitement complet d'un upload (exécuté par la file de jobs)
+    # -----------------------------------------------------------------------
+
+    def process_upload(self, upload_id, file_path, content_hash=None, user_id=None, on_row=None):
+        """
+        Extraction + sauvegarde des lignes + statut 'completed'.
+        Lève une exception en cas d'échec (la file de jobs réessaie).
+        Retourne la réponse renvoyée au client une fois le job terminé.
+        on_row(row) reçoit en plus chaque ligne dès son arrivée (pipeline).
+        """
+        row_hook = on_row
+        self.update_upload_status(upload_id, 'processing')
+        memory = RssTracker()
+
+        # Même PDF extrait entre-temps (doublons envoyés en rafale)
+        cached = self.find_cached_extraction(content_hash)
+        if cached:
+            response = self.reuse_extraction(upload_id, cached)
+            if response:
+                return response
+
+        # Lignes publiées sur le job dès leur arrivée (statut / flux SSE)
+        job = current_job()
+        partial_rows = []
+
+        def on_row(row):
+            partial_rows.append(row)
+            if job is not None:
+                job.update_progress(rows_received=len(partial_rows), partial_results=partial_rows)
+            if row_hook is not None:
+                row_hook(row)
+
+        extracted_data = self.extract_from_pdf(
+            file_path, on_row=on_row, context={'upload_id': upload_id, 'user_id': user_id}
+        )
+        if extracted_data.get('error'):
+            raise Exception(f"Gemini extraction error: {extracted_data.get('error')}")
+
+        # Score de confiance global
+        confidence = extracted_data.get('confidence', 0.95)
+
+        # Sauvegarder toutes les lignes substance en base
+        save_result = self.save_extracted_data(upload_id, extracted_data)
+        if not save_result['success']:
+            raise Exception(save_result.get('error', 'DB save failed'))
+
+        self.update_upload_status(upload_id, 'completed', confidence)
+        self.remember_extraction(content_hash, upload_id, extracted_data)
+
+        response = self.upload_response(upload_id, extracted_data)
+        response['memory'] = memory.report()
+        return response
+
+    def mark_upload_failed(self, upload_id, file_path, content_hash=None, user_id=None, error=None):
+        """Appelé par la file de jobs quand toutes les tentatives ont échoué."""
+        self.update_upload_status(upload_id, 'failed')
+
+    @staticmethod
+    def upload_response(upload_id, extracted_data):
+        confidence = extracted_data.get('confidence', 0.95)
+        return {
+            'success': True,
+            'upload_id': upload_id,
+            'extracted_data': extracted_data,      # { metadata, results, confidence }
+            'confidence': confidence,
+            'substances_count': len(extracted_data.get('results', [])),
+            'requires_validation': confidence < 0.95
+        }
+
+    @staticmethod
+    def extraction_from_rows(rows, confidence):
+        """Reconstruit { metadata, results, confidence } depuis ocr_extracted_data."""
+        first = rows[0] if rows else {}
+        return {
+            'metadata': {
+                'product_name': first.get('product_name'),
+                'batch_id': first.get('lot_number'),
+                'sampling_date': None,
+                'country_of_origin': None,
+                'lab_name': None
+            },
+            'results': [GeminiModel._result_from_row(r) for r in rows],
+            'confidence': float(confidence) if confidence is not None else 0.0
+        }
+
+    @staticmethod
+    def _result_from_row(r):
+        result = {
+            'substance': r.get('substance_name'),
+            'detected_value': float(r['detected_value']) if r.get('detected_value') is not None else None,
+            'loq_value': float(r['loq_value']) if r.get('loq_value') is not None else None,
+            'unit': r.get('detected_unit') or 'mg/kg',
+            'loq_unit': r.get('loq_unit'),
+            'below_loq': r.get('detected_value') is None,
+            'confidence': float(r['extraction_confidence']) if r.get('extraction_confidence') is not None else None
+        }
+        if result['confidence'] == 0.0:
+            # Confiance 0 : unité en conflit à l'extraction (unit_error non stocké)
+            result['unit_error'] = "Unité à vérifier sur le bulletin"
+        return result
+
     # -----------------------------------------------------------------------
     # Core Gemini extraction
     # -----------------------------------------------------------------------
 
-    def extract_from_pdf(self, file_path):
+    def extract_from_pdf(self, file_path, on_row=None, context=None):
         """
         Extract data from PDF using Gemini Vision API.
+        PDFs with a readable text layer are parsed locally first; Gemini is
+        only called when the local confidence is below
+        LOCAL_EXTRACTION_MIN_CONFIDENCE. on_row(row) is called for each
+        results row as soon as it has been streamed back by the backend.
+        context ({upload_id, user_id}) is stored with each model call in
+        gemini_usage.
 
         Returns dict (same format as OCRModel):
         {
@@ -232,33 +583,36 @@ Return only the JSON object, nothing else.
             if not os.path.exists(file_path):
                 raise BadRequest(f"File not found: {file_path}")
 
-            # Read PDF file as base64
-            with open(file_path, 'rb') as f:
-                pdf_data = base64.standard_b64encode(f.read()).decode('utf-8')
-
-            # Send to Gemini with vision capabilities
-            pdf_part = {
-                "mime_type": "application/pdf",
-                "data": pdf_data
-            }
-
-            response = self.model.generate_content([self.extraction_prompt, pdf_part])
+            reader = self._open_pdf(file_path)
 
-            # Extract JSON from response
-            response_text = response.text.strip()
+            # PDF numérique avec couche texte : lecture locale, sans appel Gemini
+            if reader is not None and Config.LOCAL_EXTRACTION_ENABLED:
+                local = extract_text_layer(reader)
+                if local['confidence'] >= Config.LOCAL_EXTRACTION_MIN_CONFIDENCE:
+                    local['source'] = 'text_layer'
+                    return local
 
-            # Remove markdown code blocks if present
-            if response_text.startswith("```"):
-                response_text = response_text.split("```")[1]
-                if response_text.startswith("json"):
-                    response_text = response_text[4:]
-                response_text = response_text.strip()
+            # Long bulletin : une requête par page, en parallèle
+            if reader is not None and 0 < Config.EXTRACTION_CHUNKED_MIN_PAGES <= len(reader.pages):
+                return self.extract_chunked(reader, on_row=on_row, context=context)
 
-            # Parse JSON
-            extracted_json = json.loads(response_text)
+            context = dict(context or {}, pages=len(reader.pages) if reader is not None else 1)
+            uploaded = None
+            try:
+                pdf_part, uploaded = self._pdf_part(file_path)
+                extracted_json, stats = self._generate_json(pdf_part, on_row=on_row, context=context)
+            finally:
+                if uploaded is not None:
+                    self.backend.delete_file(uploaded)
 
             # Validate and normalize structure
-            extracted_data = self._normalize_extraction(extracted_json)
+            extracted_data = self._normalize_extraction(
+                extracted_json, keep_confidence=self.backend.reports_confidence
+            )
+            extracted_data['parse_stats'] = stats
+            if stats['truncated']:
+                # Réponse coupée : lignes complètes récupérées, la fin du tableau manque
+                extracted_data['confidence'] = min(extracted_data['confidence'], 0.5)
 
             return extracted_data
 
@@ -277,10 +631,338 @@ Return only the JSON object, nothing else.
                 'error': str(e)
             }
 
-    def _normalize_extraction(self, data):
+    def _generate_json(self, pdf_part, on_row=None, context=None):
+        """
+        Un appel au backend d'extraction -> (JSON décodé, statistiques d'analyse).
+        La réponse est lue en flux (EXTRACTION_STREAMING) par un analyseur
+        incrémental et tolérant : prose ou ``` autour du JSON ignorés, lignes
+        complètes récupérées d'une réponse tronquée. Lève json.JSONDecodeError
+        si rien n'est exploitable.
+        L'appel attend son jeton dans le quota partagé (GEMINI_RATE_PER_MINUTE)
+        et sa consommation est enregistrée dans gemini_usage, même en échec.
+        """
+        backend = self.backend
+        parser = IncrementalExtractionParser(on_row=on_row)
+        usage = {}
+        status = 'error'
+        wait = 0.0
+        started = time.monotonic()
+        try:
+            if backend.rate_limited:
+                wait = get_gemini_bucket().acquire(timeout=Config.GEMINI_RATE_TIMEOUT)
+            started = time.monotonic()
+            with self._gemini_slots:
+                if Config.EXTRACTION_STREAMING:
+                    for chunk in backend.generate_stream(self.extraction_prompt, pdf_part, usage=usage):
+                        parser.feed(chunk)
+                else:
+                    parser.feed(backend.generate(self.extraction_prompt, pdf_part, usage=usage))
+
+            try:
+                document = parser.close()
+            except json.JSONDecodeError:
+                status = 'unparsable'
+                self._record_parse(parser.stats, wasted=True)
+                raise
+            status = 'ok'
+            self._record_parse(parser.stats)
+        finally:
+            usage = self.record_usage(context, usage, parser.stats, time.monotonic() - started, wait, status)
+        return document, dict(parser.stats, streamed=Config.EXTRACTION_STREAMING, usage=usage)
+
+    def record_usage(self, context, usage, stats, latency, wait, status):
+        """
+        Enregistre un appel modèle dans gemini_usage (best effort).
+        Sans usage_metadata (SDK ancien) les tokens sont estimés :
+        ~4 caractères par token de texte, 258 tokens par page de PDF.
+        Les backends hors quota (texte local, replay) n'appellent pas le
+        modèle : l'usage est calculé mais pas enregistré.
+        """
+        context = context or {}
+        estimated = 'prompt_tokens' not in usage
+        if estimated:
+            usage = {
+                'prompt_tokens': len(self.extraction_prompt) // 4 + 258 * context.get('pages', 1),
+                'output_tokens': stats.get('chars', 0) // 4,
+            }
+        usage = dict(usage, model=self.model_version, estimated=estimated,
+                     latency_ms=int(latency * 1000), wait_ms=int(wait * 1000))
+        if not self.backend.rate_limited:
+            return usage
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                """INSERT INTO gemini_usage
+                   (upload_id, user_id, backend, model, prompt_tokens, output_tokens, tokens_estimated,
+                    latency_ms, wait_ms, rows_extracted, truncated, status)
+                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+                (context.get('upload_id'), context.get('user_id'), self.backend.name, usage['model'],
+                 usage['prompt_tokens'], usage['output_tokens'], estimated,
+                 usage['latency_ms'], usage['wait_ms'], stats.get('rows', 0),
+                 bool(stats.get('truncated')), status)
+            )
+            conn.commit()
+            cursor.close()
+            conn.close()
+        except Exception:
+            pass  # la comptabilité ne doit jamais faire échouer une extraction
+        return usage
+
+    def usage_summary(self, days=7):
+        """
+        Agrégats de gemini_usage sur `days` jours : appels, erreurs, tokens,
+        coût estimé (prix Config), latence, attente de quota, débit.
+        """
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(
+                """SELECT model,
+                          COUNT(*) AS calls,
+                          SUM(status <> 'ok') AS failed_calls,
+                          COUNT(DISTINCT upload_id) AS uploads,
+                          SUM(prompt_tokens) AS prompt_tokens,
+                          SUM(output_tokens) AS output_tokens,
+                          SUM(tokens_estimated) AS estimated_calls,
+                          SUM(rows_extracted) AS rows_extracted,
+                          SUM(truncated) AS truncated_calls,
+                          AVG(latency_ms) AS latency_ms_avg,
+                          MAX(latency_ms) AS latency_ms_max,
+                          SUM(latency_ms) AS latency_ms_total,
+                          AVG(wait_ms) AS wait_ms_avg,
+                          MIN(created_at) AS first_call,
+                          MAX(created_at) AS last_call
+                   FROM gemini_usage
+                   WHERE created_at >= NOW() - INTERVAL %s DAY
+                   GROUP BY model""",
+                (days,)
+            )
+            models = cursor.fetchall()
+            cursor.execute(
+                """SELECT DATE(created_at) AS day, COUNT(*) AS calls,
+                          SUM(prompt_tokens) AS prompt_tokens, SUM(output_tokens) AS output_tokens
+                   FROM gemini_usage
+                   WHERE created_at >= NOW() - INTERVAL %s DAY
+                   GROUP BY DATE(created_at) ORDER BY day""",
+                (days,)
+            )
+            per_day = cursor.fetchall()
+            cursor.close()
+            conn.close()
+        except mysql.connector.Error as err:
+            return {'success': False, 'error': str(err)}
+
+        def cost(prompt_tokens, output_tokens):
+            return round((prompt_tokens * Config.GEMINI_PRICE_INPUT_PER_M
+                          + output_tokens * Config.GEMINI_PRICE_OUTPUT_PER_M) / 1e6, 6)
+
+        summary = []
+        for m in models:
+            row = {k: (float(v) if isinstance(v, Decimal) else v) for k, v in m.items()}
+            prompt_tokens = int(row['prompt_tokens'] or 0)
+            output_tokens = int(row['output_tokens'] or 0)
+            span = (m['last_call'] - m['first_call']).total_seconds() if m['calls'] > 1 else 0
+            row.update({
+                'cost_usd': cost(prompt_tokens, output_tokens),
+                'cost_per_upload_usd': round(cost(prompt_tokens, output_tokens) / row['uploads'], 6) if row['uploads'] else None,
+                'calls_per_hour': round(m['calls'] * 3600 / span, 2) if span else None,
+                'output_tokens_per_second': round(output_tokens * 1000 / row['latency_ms_total'], 2) if row['latency_ms_total'] else None,
+                'first_call': m['first_call'].isoformat() if m['first_call'] else None,
+                'last_call': m['last_call'].isoformat() if m['last_call'] else None,
+            })
+            summary.append(row)
+
+        for d in per_day:
+            d['day'] = d['day'].isoformat()
+            d['prompt_tokens'] = int(d['prompt_tokens'] or 0)
+            d['output_tokens'] = int(d['output_tokens'] or 0)
+            d['cost_usd'] = cost(d['prompt_tokens'], d['output_tokens'])
+
+        return {
+            'success': True,
+            'days': days,
+            'models': summary,
+            'per_day': per_day,
+            'total_cost_usd': round(sum(r['cost_usd'] for r in summary), 6),
+            'prices_per_million': {'input': Config.GEMINI_PRICE_INPUT_PER_M, 'output': Config.GEMINI_PRICE_OUTPUT_PER_M}
+        }
+
+    @classmethod
+    def _record_parse(cls, stats, wasted=False):
+        with cls._parse_lock:
+            totals = cls._parse_totals
+            totals['calls'] += 1
+            totals['rows'] += stats['rows']
+            totals['rows_rejected'] += stats['rows_rejected']
+            if wasted:
+                totals['wasted'] += 1
+            elif stats['truncated']:
+                totals['recovered'] += 1
+            else:
+                totals['complete'] += 1
+            if stats['time_to_first_row'] is not None:
+                totals['first_row_total'] += stats['time_to_first_row']
+                totals['first_row_count'] += 1
+
+    @classmethod
+    def parse_stats(cls):
+        """Réponses complètes / tronquées mais récupérées / inexploitables (appels perdus)."""
+        with cls._parse_lock:
+            totals = dict(cls._parse_totals)
+        calls = totals['calls']
+        first_rows = totals.pop('first_row_count')
+        first_row_total = totals.pop('first_row_total')
+        totals['wasted_rate'] = round(totals['wasted'] / calls, 4) if calls else 0.0
+        totals['recovered_rate'] = round(totals['recovered'] / calls, 4) if calls else 0.0
+        totals['time_to_first_row_avg'] = round(first_row_total / first_rows, 4) if first_rows else None
+        return totals
+
+    # -----------------------------------------------------------------------
+    # Extraction page par page (bulletins longs)
+    # -----------------------------------------------------------------------
+
+    @staticmethod
+    def _open_pdf(file_path):
+        """PdfReader du fichier, ou None si pypdf est absent ou le PDF illisible."""
+        if PdfReader is None:
+            return None
+        try:
+            return PdfReader(file_path)
+        except Exception:
+            return None
+
+    @staticmethod
+    def split_pdf(reader, pages_per_chunk=1):
+        """Découpe localement un PDF en petits PDF de pages_per_chunk pages (octets)."""
+        chunks = []
+        for start in range(0, len(reader.pages), pages_per_chunk):
+            writer = PdfWriter()
+            for page in reader.pages[start:start + pages_per_chunk]:
+                writer.add_page(page)
+            buf = io.BytesIO()
+            writer.write(buf)
+            chunks.append(buf.getvalue())
+        return chunks
+
+    def extract_chunked(self, reader, on_row=None, context=None):
+        """
+        Extrait chaque groupe de pages dans une requête Gemini distincte
+        (pool dédié get_gemini_executor, concurrence bornée par
+        _gemini_slots : le pool fanout partagé reste libre pour les appels
+        courts), puis fusionne : métadonnées de la première page, lignes
+        dédoublonnées entre pages. Chaque
+        requête produit peu de sortie : plus de tableau tronqué par la
+        limite de tokens, et la latence est celle de la page la plus lente.
+        """
+        per_chunk = max(1, Config.EXTRACTION_PAGES_PER_CHUNK)
+        chunks = list(enumerate(self.split_pdf(reader, per_chunk)))
+        failed_pages = []
+
+        page_stats = []
+
+        def extract_chunk(item):
+            _, data = item
+            document, stats = self._generate_json(
+                {"mime_type": "application/pdf", "data": data}, on_row=on_row,
+                context=dict(context or {}, pages=per_chunk)
+            )
+            page_stats.append(stats)
+            return self._normalize_extraction(document, keep_confidence=self.backend.reports_confidence)
+
+        def on_error(item, exc):
+            failed_pages.append(item[0] * per_chunk + 1)
+            return None
+
+        pages, _ = run_ordered(extract_chunk, chunks, on_error=on_error, executor=get_gemini_executor())
+        if all(page is None or page.get('error') for page in pages):
+            raise Exception(f"Gemini extraction failed on all {len(chunks)} page chunks")
+
+        failed_pages.extend(
+            i * per_chunk + 1 for i, page in enumerate(pages) if page is not None and page.get('error')
+        )
+        merged = self.merge_page_extractions(pages)
+        merged['pages'] = len(reader.pages)
+        merged['parse_stats'] = {
+            'chunks': len(chunks),
+            'rows': sum(st['rows'] for st in page_stats),
+            'rows_rejected': sum(st['rows_rejected'] for st in page_stats),
+            'truncated': any(st['truncated'] for st in page_stats),
+            'time_to_first_row': min((st['time_to_first_row'] for st in page_stats
+                                      if st['time_to_first_row'] is not None), default=None),
+            'usage': {
+                'prompt_tokens': sum(st['usage']['prompt_tokens'] for st in page_stats),
+                'output_tokens': sum(st['usage']['output_tokens'] for st in page_stats),
+                'estimated': any(st['usage']['estimated'] for st in page_stats),
+            },
+        }
+        if merged['parse_stats']['truncated']:
+            merged['confidence'] = min(merged['confidence'], 0.5)
+        if failed_pages:
+            # Pages manquantes : validation manuelle obligatoire
+            merged['failed_pages'] = sorted(failed_pages)
+            merged['confidence'] = min(merged['confidence'], 0.5)
+        return merged
+
+    @staticmethod
+    def _substance_key(name):
+        return re.sub(r'\s+', ' ', str(name or '')).strip().strip('.:;*').lower()
+
+    def merge_page_extractions(self, pages):
+        """
+        Fusionne les extractions normalisées de chaque page (dans l'ordre).
+        Une substance répétée d'une page à l'autre (en-tête de tableau
+        répété, ligne à cheval sur deux pages) n'est gardée qu'une fois :
+        la ligne la plus complète l'emporte.
+        """
+        first = pages[0] if pages and pages[0] and not pages[0].get('error') else {}
+        rows = {}
+        for page in pages:
+            if not page or page.get('error'):
+                continue
+            for row in page.get('results', []):
+                key = self._substance_key(row['substance'])
+                known = rows.get(key)
+                filled = (row['detected_value'] is not None) + (row['loq_value'] is not None)
+                if known is None or filled > (known['detected_value'] is not None) + (known['loq_value'] is not None):
+                    rows[key] = row
+        # Lignes déjà normalisées : leur confiance et leur unit_error sont conservées
+        return self._normalize_extraction({
+            'metadata': first.get('metadata', {}),
+            'results': list(rows.values())
+        }, keep_confidence=True)
+
+    def _pdf_part(self, file_path):
+        """
+        Partie PDF de la requête -> (part, fichier distant ou None).
+        Petits fichiers : octets bruts inline (le SDK les sérialise en
+        protobuf, pas de copie base64 côté Python). Au-delà de
+        GEMINI_INLINE_MAX_BYTES : envoi hors requête (File API Gemini,
+        en streaming depuis le disque) quand le backend le permet.
+        """
+        if os.path.getsize(file_path) > Config.GEMINI_INLINE_MAX_BYTES:
+            remote = self.backend.upload_file(file_path)
+            if remote is not None:
+                return remote, remote
+
+        with open(file_path, 'rb') as f:
+            pdf_data = f.read()
+        return {"mime_type": "application/pdf", "data": pdf_data}, None
+
+    @staticmethod
+    def _confidence(value, default):
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and value == value:
+            return min(1.0, max(0.0, float(value)))
+        return default
+
+    def _normalize_extraction(self, data, keep_confidence=False):
         """
         Normalize and validate extracted data structure.
         Ensures all required fields are present with correct types.
+        Une unit_error déjà présente sur une ligne est conservée. Avec
+        keep_confidence (couche texte locale, lignes déjà normalisées), les
+        confiances fournies (document, lignes) sont gardées ; sinon celles
+        d'une réponse Gemini sont fixées ici, jamais reprises du modèle.
         """
         try:
             # Extract metadata
@@ -303,32 +985,43 @@ Return only the JSON object, nothing else.
                     if not substance:
                         continue
 
-                    # Parse numeric values safely
-                    detected_value = None
-                    if row.get('detected_value') is not None:
-                        try:
-                            detected_value = float(row.get('detected_value'))
-                        except (ValueError, TypeError):
-                            pass
-
-                    loq_value = None
-                    if row.get('loq_value') is not None:
-                        try:
-                            loq_value = float(row.get('loq_value'))
-                        except (ValueError, TypeError):
-                            pass
-
-                    below_loq = bool(row.get('below_loq', False))
-                    unit = str(row.get('unit', 'mg/kg')).strip() or 'mg/kg'
-
-                    results.append({
+                    # Valeurs typées : "0.01*", "<0.005", "nd", "0,05", "50 µg/kg"...
+                    detected = parse_value(row.get('detected_value'))
+                    loq = parse_value(row.get('loq_value'))
+                    below_loq = bool(row.get('below_loq', False)) or (detected is not None and detected.below)
+                    detected_value = None if detected is None or below_loq else detected.value
+
+                    # Chaque cellule garde sa propre unité ; une unité de cellule
+                    # qui contredit la colonne est signalée, jamais devinée
+                    declared = str(row.get('unit') or '').strip() or None
+                    unit, unit_error = cell_unit(detected, declared)
+                    unit = unit or (detected.unit if detected is not None and detected.unit else declared)
+                    unit_error = row.get('unit_error') or unit_error
+                    if loq is not None:
+                        loq_value = loq.value
+                        loq_declared = str(row.get('loq_unit') or '').strip() or declared
+                        loq_unit, loq_error = cell_unit(loq, loq_declared)
+                        loq_unit = loq_unit or loq.unit or loq_declared
+                        unit_error = unit_error or loq_error
+                    elif detected is not None and detected.below:
+                        loq_value, loq_unit = detected.value, unit
+                    else:
+                        loq_value, loq_unit = None, None
+
+                    result = {
                         'substance': substance,
                         'detected_value': detected_value,
                         'loq_value': loq_value,
                         'unit': unit,
+                        'loq_unit': loq_unit if loq_value is not None else None,
                         'below_loq': below_loq,
-                        'confidence': 0.95  # Gemini returns structured data = high confidence
-                    })
+                        # Gemini returns structured data = high confidence
+                        'confidence': self._confidence(row.get('confidence'), 0.95) if keep_confidence else 0.95
+                    }
+                    if unit_error:
+                        # Ligne conservée pour validation manuelle, non scorée
+                        result.update({'unit_error': unit_error, 'confidence': 0.0})
+                    results.append(result)
                 except Exception as e:
                     continue
 
@@ -338,6 +1031,8 @@ Return only the JSON object, nothing else.
             results_score = 0.95 if results else 0.5
             global_confidence = round((meta_score * 0.4 + results_score * 0.6), 3)
             global_confidence = min(1.0, max(0.0, global_confidence))
+            if keep_confidence:
+                global_confidence = self._confidence(data.get('confidence'), global_confidence)
 
             return {
                 'metadata': metadata,
@@ -1,18 +1,43 @@
 import mysql.connector
 from config import Config
+from models.eu_mirror import EUMirrorModel
+from services.db_pool import get_export_pool, get_pool, insert_many, stream_query
+from services.api_cache import get_api_cache
+from services.fanout import run_ordered
+from services.http_client import get_eu_client
+from services.compliance import score_compliance_batch, batch_to_records
+from services.units import UNIT_FACTORS, parse_number, to_mg_kg
+from services.pagination import KeysetStream, keyset_clause
+from mysql.connector.errors import PoolError
+from services.residue_catalogue import ResidueCatalogue, ResidueCatalogueLoader, CatalogueLoadError
 import requests
-from decimal import Decimal
+import threading
+
+def to_float_column(values):
+    """
+    Convertit une colonne de valeurs numériques en float (None si invalide).
+    Le connecteur envoie repr(float), que MySQL arrondit à l'échelle de la
+    colonne DECIMAL comme il le ferait d'un Decimal(str(v)).
+    """
+    try:
+        return [None if v is None else float(v) for v in values]
+    except (ValueError, TypeError):
+        # Colonne avec au moins une valeur invalide : repli valeur par valeur
+        out = []
+        for v in values:
+            try:
+                out.append(None if v is None else float(v))
+            except (ValueError, TypeError):
+                out.append(None)
+        return out
 
 class MRLModel:
     BASE_URL = "https://api.datalake.sante.service.ec.europa.eu/sante/pesticides"
     VERSION = "v3.0"
     HEADERS = {"Accept": "application/json"}
     
-    UNIT_TABLE = {
-        "mg/kg": 1.0, "ppm": 1.0,
-        "ppb": 0.001, "µg/kg": 0.001, "ug/kg": 0.001,
-        "µg/g": 1.0, "ng/g": 0.001,
-    }
+    # Facteurs vers mg/kg par unité canonique (alias : services.units.normalize_unit)
+    UNIT_TABLE = UNIT_FACTORS
     
     PRODUCTS = {
         "Apples": ("0130010", 230),
@@ -30,99 +55,121 @@ class MRLModel:
         "Cucumbers": ("0232010", 391),
     }
     
-    # Cache partagé pour les résidus afin d'éviter de requêter
-    # l'API complète à chaque recherche (inspiré du code Streamlit).
-    _RESIDUES_CACHE = None
+    # Catalogue des résidus partagé par toutes les instances (une entrée
+    # par langue) afin d'éviter de requêter l'API complète à chaque recherche.
+    _CATALOGUE = None
+    _CATALOGUE_LOCK = threading.Lock()
 
     def __init__(self):
-        self.db_config = {
-            'host': Config.MYSQL_HOST,
-            'user': Config.MYSQL_USER,
-            'password': Config.MYSQL_PASSWORD,
-            'database': Config.MYSQL_DATABASE
-        }
-    
+        self.mirror = EUMirrorModel(self.BASE_URL, self.VERSION, self.HEADERS)
+
     def get_connection(self):
-        return mysql.connector.connect(**self.db_config)
+        return get_pool().get_connection()
     
-    def call_api(self, endpoint, params):
-        """Appel à l'API EU Pesticides"""
+    def call_api(self, endpoint, params, use_cache=True):
+        """Appel à l'API EU Pesticides (via le cache persistant)"""
+        if not use_cache:
+            return self._call_api_live(endpoint, params)
+        return get_api_cache().fetch(endpoint, params, lambda: self._call_api_live(endpoint, params))
+
+    def _call_api_live(self, endpoint, params):
+        """Appel direct à l'API EU Pesticides"""
         url = f"{self.BASE_URL}/{endpoint}"
-        p = dict(params)
-        p["api-version"] = self.VERSION
-        p["format"] = "json"
+        client = get_eu_client()
         try:
-            resp = requests.get(url, params=p, headers=self.HEADERS, timeout=30)
+            resp = client.get(url, params=self._api_params(params), headers=self.HEADERS)
             if resp.status_code == 200:
-                data = resp.json()
-                if isinstance(data, list):
-                    return data, resp.url, 200, None
-                if isinstance(data, dict):
-                    for k in ["value", "data", "results", "items"]:
-                        if k in data and isinstance(data[k], list):
-                            return data[k], resp.url, 200, None
-                    return [data], resp.url, 200, None
-                return [], resp.url, 200, "Unexpected format"
-            return [], resp.url, resp.status_code, resp.text[:300]
+                return self._parse_api_response(resp.json(), str(resp.url))
+            return [], str(resp.url), resp.status_code, resp.text[:300]
         except requests.exceptions.Timeout:
-            return [], url, None, "Timeout (30s)"
+            return [], url, None, f"Timeout ({client.timeout_for(url)}s)"
         except requests.exceptions.ConnectionError:
             return [], url, None, "No internet connection"
         except Exception as ex:
             return [], url, None, str(ex)
 
+    def _api_params(self, params):
+        p = dict(params)
+        p["api-version"] = self.VERSION
+        p["format"] = "json"
+        return p
+
+    @staticmethod
+    def _parse_api_response(data, url):
+        if isinstance(data, list):
+            return data, url, 200, None
+        if isinstance(data, dict):
+            for k in ["value", "data", "results", "items"]:
+                if k in data and isinstance(data[k], list):
+                    return data[k], url, 200, None
+            return [data], url, 200, None
+        return [], url, 200, "Unexpected format"
+
+    @classmethod
+    def residue_catalogue(cls):
+        """Catalogue des résidus du processus (créé au premier appel)."""
+        if cls._CATALOGUE is None:
+            with cls._CATALOGUE_LOCK:
+                if cls._CATALOGUE is None:
+                    loader = ResidueCatalogueLoader(
+                        cls.BASE_URL, cls.VERSION, cls.HEADERS,
+                        page_size=Config.CATALOGUE_PAGE_SIZE,
+                        workers=Config.CATALOGUE_WORKERS
+                    )
+                    cls._CATALOGUE = ResidueCatalogue(
+                        loader, ttl=Config.CATALOGUE_TTL,
+                        languages=Config.CATALOGUE_LANGUAGES,
+                        retry_after=Config.CATALOGUE_RETRY_AFTER
+                    )
+        return cls._CATALOGUE
+
+    def _catalogue_entry(self, language="EN"):
+        try:
+            return self.residue_catalogue().get(language)
+        except CatalogueLoadError:
+            return None
+
     def _load_all_residues(self, language="EN"):
-        """Charger et mettre en cache toutes les substances depuis l'API EU."""
-        if self._RESIDUES_CACHE is not None:
-            return self._RESIDUES_CACHE
-
-        residues: list = []
-        api_configs = [
-            {"url": f"{self.BASE_URL}/pesticide-residues", "version": self.VERSION},
-            {"url": f"{self.BASE_URL}/pesticide_residues", "version": "v1.0"},
-        ]
+        """Charger (une seule fois par langue) toutes les substances depuis l'API EU."""
+        entry = self._catalogue_entry(language)
+        return entry.residues if entry else []
 
-        for cfg in api_configs:
-            url = cfg["url"]
-            params = {"language": language, "format": "json", "api-version": cfg["version"], "$top": 1000}
-            try:
-                while url:
-                    resp = requests.get(url, params=params, headers=self.HEADERS, timeout=30)
-                    if resp.status_code != 200: break
-                    data = resp.json()
-                    items = data.get("value") or data.get("items") or data.get("results") or []
-                    if isinstance(data, list): items = data
-                    residues.extend(items)
-                    url = data.get("@odata.nextLink") or data.get("nextLink") if isinstance(data, dict) else None
-                    if url: params = {}
-            except Exception: residues = []
-            if residues: break
-
-        self._RESIDUES_CACHE = residues
-        return residues
+    def warm_residue_catalogue(self, language="EN"):
+        """Précharger le catalogue (au démarrage, en arrière-plan)."""
+        return len(self._load_all_residues(language=language))
+
+    def _residue_index(self, language="EN"):
+        """Index des noms de résidus (construit avec le catalogue)."""
+        entry = self._catalogue_entry(language)
+        return entry.index if entry else None
 
     def _find_residue_fuzzy(self, substance_name, language="EN"):
-        """Fuzzy-match d'une substance dans le cache local."""
-        all_residues = self._load_all_residues(language=language)
-        query = substance_name.lower().strip()
-        if not query or not all_residues: return None
-
-        # Exact, starts with, contains
-        for item in all_residues:
-            name = (item.get("pesticide_residue_name") or item.get("PESTICIDE_RESIDUE_NAME") or "").lower().strip()
-            if name == query: return item
-        for item in all_residues:
-            name = (item.get("pesticide_residue_name") or item.get("PESTICIDE_RESIDUE_NAME") or "").lower().strip()
-            if name.startswith(query): return item
-        for item in all_residues:
-            name = (item.get("pesticide_residue_name") or item.get("PESTICIDE_RESIDUE_NAME") or "").lower().strip()
-            if query in name: return item
-        return None
+        """
+        Substance dans le cache local : exacte, préfixe ou sous-chaîne. Les
+        correspondances approchées restent des candidats (find_residue_candidates).
+        """
+        index = self._residue_index(language=language)
+        if not index:
+            return None
+        return index.best(substance_name)
+
+    def find_residue_candidates(self, substance_name, language="EN", limit=10):
+        """Candidats classés (avec score) pour une substance, depuis le cache local."""
+        index = self._residue_index(language=language)
+        if not index:
+            return []
+        return index.search(substance_name, limit=limit)
     
-    def search_residue(self, substance_name):
+    def search_residue(self, substance_name, language="EN"):
         """Rechercher un résidu pesticide avec stratégies de repli."""
         query = substance_name.strip()
-        residues, url, status, error = self.call_api("pesticide-residues", {"pesticide_residue_name": query})
+
+        # Miroir local d'abord (nom exact ou variante "(R)", insensible à la casse)
+        mirrored = self.mirror.find_residues([query, f"{query} (R)"], language) if query else None
+        if mirrored:
+            residues, url, status, error = mirrored, f"{self.BASE_URL}/pesticide-residues?mirror=1", 200, None
+        else:
+            residues, url, status, error = self.call_api("pesticide-residues", {"pesticide_residue_name": query})
 
         # Fallbacks (R) or Uppercase
         if not residues and not error and query:
@@ -134,7 +181,7 @@ class MRLModel:
         
         # Fuzzy match via cache
         if not residues and not error and query:
-            cached = self._find_residue_fuzzy(query)
+            cached = self._find_residue_fuzzy(query, language=language)
             if cached:
                 residues = [cached]
                 url = f"{self.BASE_URL}/pesticide-residues?cached=1"
@@ -154,27 +201,104 @@ class MRLModel:
         params = {"language": language}
         if product_code:
             params["product_code"] = product_code.strip()
+        mirrored = self.mirror.find_products(params.get("product_code"), language)
+        if mirrored:
+            return mirrored, f"{self.BASE_URL}/pesticide-residues-products?mirror=1", 200, None
         return self.call_api("pesticide-residues-products", params)
     
     def get_mrls(self, residue_id, product_id=None):
         """Récupérer les MRL pour un résidu et produit"""
+        # Une fois le miroir synchronisé, une liste vide est une réponse valide
+        mirrored = self.mirror.find_mrls(residue_id, product_id)
+        if mirrored is not None:
+            return mirrored, f"{self.BASE_URL}/pesticide-residues-mrls?mirror=1", 200, None
         params = {"pesticide_residue_id": residue_id}
         if product_id:
             params["product_id"] = product_id
         return self.call_api("pesticide-residues-mrls", params)
     
+    def resolve_substance(self, substance_name, product_id=None, language="EN"):
+        """Résoudre une substance (résidu + LMR courante) pour la recherche groupée"""
+        entry = {'input_name': substance_name}
+        residues, r_url, r_status, r_error = self.search_residue(substance_name, language)
+        
+        if r_error or not residues:
+            entry.update({'error': r_error or 'Not found', 'current_mrl': 0.01, 'mrl_source': 'Default'})
+            return entry
+
+        residue = residues[0]
+        residue_id = residue.get('pesticide_residue_id')
+        entry.update({'residue': residue, 'residue_id': residue_id})
+
+        if residue_id and product_id:
+            mrls, m_url, m_status, m_error = self.get_mrls(residue_id, product_id)
+            current_mrl, mrl_source = self.current_mrl([] if m_error else mrls)
+            if current_mrl is None:
+                current_mrl = 0.01
+            entry.update({'current_mrl': current_mrl, 'mrl_source': mrl_source})
+        else:
+            entry.update({'current_mrl': 0.01, 'mrl_source': 'Default (no product match)'})
+        return entry
+    
+    def current_mrl(self, mrls):
+        """
+        LMR courante : minimum des enregistrements applicables (applicability == '1').
+        Retourne (valeur, source) ; 0.01 par défaut s'il n'y a aucun enregistrement
+        applicable, None si les enregistrements applicables sont illisibles.
+        """
+        current_mrls = [r for r in mrls if str(r.get('applicability', '')).strip() == '1']
+        if not current_mrls:
+            return 0.01, "EU default 0.01 mg/kg"
+        nums = [self.parse_mrl(r.get('mrl_value_only') or r.get('mrl_value')) for r in current_mrls]
+        nums = [n for n in nums if n is not None]
+        if nums:
+            return min(nums), "EU Pesticides Database (current)"
+        return None, "EU default 0.01 mg/kg"
+
+    def get_mrls_batch(self, product_id, residue_ids):
+        """
+        LMR courantes de plusieurs résidus pour un produit, en un appel.
+        Les identifiants sont dédupliqués ; le miroir est interrogé en une
+        seule requête, sinon les appels API (cachés) partent en parallèle.
+        Retourne une entrée par identifiant demandé, dans l'ordre, ou
+        {'success': False, 'error': ...} si un identifiant n'est pas un
+        entier ou une chaîne (liste, objet JSON...).
+        """
+        invalid = [rid for rid in residue_ids if isinstance(rid, bool) or not isinstance(rid, (int, str))]
+        if invalid:
+            return {'success': False, 'error': f'Identifiant de résidu invalide : {invalid[0]!r}'}
+        unique_ids = list(dict.fromkeys(residue_ids))
+        by_residue = self.mirror.find_mrls_batch(product_id, unique_ids)
+
+        if by_residue is not None:
+            url = f"{self.BASE_URL}/pesticide-residues-mrls?mirror=1"
+            fetched = {rid: (by_residue.get(str(rid), []), url, None) for rid in unique_ids}
+        else:
+            responses, _ = run_ordered(
+                lambda rid: self.get_mrls(rid, product_id),
+                unique_ids,
+                on_error=lambda rid, exc: ([], None, None, str(exc))
+            )
+            fetched = {rid: (mrls, url, error) for rid, (mrls, url, status, error) in zip(unique_ids, responses)}
+
+        resolved = {}
+        for rid, (mrls, url, error) in fetched.items():
+            if error:
+                resolved[rid] = {'residue_id': rid, 'error': error, 'current_mrl': 0.01,
+                                 'mrl_source': 'Default', 'mrls': [], 'api_url': url}
+                continue
+            current_mrl, mrl_source = self.current_mrl(mrls)
+            resolved[rid] = {'residue_id': rid, 'current_mrl': current_mrl, 'mrl_source': mrl_source,
+                             'mrls': mrls, 'api_url': url}
+        return [resolved[rid] for rid in residue_ids]
+    
     def parse_mrl(self, val):
-        """Parser une valeur MRL"""
-        if val is None or str(val).strip() in ["—", "N/A", ""]:
-            return None
-        try:
-            return float(str(val).replace("*", "").replace("<", "").replace(">", "").strip())
-        except Exception:
-            return None
+        """Parser une valeur MRL ("0.01*", "<0.005", "—"...) ; None si illisible"""
+        return parse_number(val)
     
     def to_mg_kg(self, value, unit):
-        """Convertir une valeur en mg/kg"""
-        return value * self.UNIT_TABLE.get(unit.strip().lower(), 1.0)
+        """Convertir une valeur en mg/kg ; UnknownUnitError si l'unité est inconnue"""
+        return to_mg_kg(value, unit)
     
     def calculate_compliance(self, detected_mg_kg, mrl_mg_kg, loq_mg_kg=None):
         """Calculer le score de conformité"""
@@ -218,59 +342,61 @@ class MRLModel:
             "ratio": round(ratio, 4)
         }
     
+    def calculate_compliance_batch(self, detected_mg_kg, mrl_mg_kg, loq_mg_kg=None, as_records=False):
+        """
+        Score de conformité vectorisé sur des colonnes entières.
+        Retourne les tableaux NumPy (ratio, score, label, hard_fail, reason_code),
+        ou avec as_records=True une liste de dicts identiques à calculate_compliance().
+        """
+        batch = score_compliance_batch(detected_mg_kg, mrl_mg_kg, loq_mg_kg)
+        if as_records:
+            return batch_to_records(batch, detected_mg_kg, mrl_mg_kg, loq_mg_kg)
+        return batch
+    
+    ANALYSIS_COLUMNS = (
+        'user_id', 'lot_number', 'product_code', 'product_id_eu', 'product_name',
+        'residue_id_eu', 'residue_name', 'detected_value', 'detected_unit',
+        'detected_value_mg_kg', 'loq_value', 'loq_unit', 'loq_value_mg_kg',
+        'mrl_value', 'mrl_source', 'mrl_regulation', 'target_market',
+        'compliance_score', 'compliance_label', 'compliance_status', 'hard_fail',
+        'ratio_to_mrl', 'notes'
+    )
+    DECIMAL_COLUMNS = (
+        'detected_value', 'detected_value_mg_kg', 'loq_value', 'loq_value_mg_kg',
+        'mrl_value', 'compliance_score', 'ratio_to_mrl'
+    )
+    # Champs communs à toutes les lignes d'un lot
+    LOT_FIELDS = ('lot_number', 'product_code', 'product_id_eu', 'product_name', 'mrl_regulation', 'target_market')
+
+    def _analysis_rows(self, user_id, analyses):
+        """Lignes prêtes pour l'INSERT ; conversion numérique colonne par colonne."""
+        columns = {col: [a.get(col) for a in analyses] for col in self.DECIMAL_COLUMNS}
+        for col, values in columns.items():
+            columns[col] = to_float_column(values)
+
+        rows = []
+        for i, data in enumerate(analyses):
+            rows.append(tuple(
+                user_id if col == 'user_id'
+                else columns[col][i] if col in columns
+                else bool(data.get('hard_fail', False)) if col == 'hard_fail'
+                else data.get(col) or None
+                for col in self.ANALYSIS_COLUMNS
+            ))
+        return rows
+    
     def save_analysis(self, user_id, data):
         """Sauvegarder une analyse MRL"""
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
             
-            query = """
-            INSERT INTO mrl_analyses (
-                user_id, lot_number, product_code, product_id_eu, product_name,
-                residue_id_eu, residue_name, detected_value, detected_unit,
-                detected_value_mg_kg, loq_value, loq_unit, loq_value_mg_kg,
-                mrl_value, mrl_source, mrl_regulation, target_market,
-                compliance_score, compliance_label, compliance_status, hard_fail,
-                ratio_to_mrl, notes
-            ) VALUES (
-                %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
-            )
+            query = f"""
+            INSERT INTO mrl_analyses ({', '.join(self.ANALYSIS_COLUMNS)})
+            VALUES ({', '.join(['%s'] * len(self.ANALYSIS_COLUMNS))})
             """
             
-            # Convertir les valeurs numériques en Decimal pour MySQL
-            def to_decimal(val):
-                if val is None:
-                    return None
-                try:
-                    return Decimal(str(val))
-                except:
-                    return None
-            
-            values = (
-                user_id,
-                data.get('lot_number') or None,
-                data.get('product_code') or None,
-                data.get('product_id_eu') or None,
-                data.get('product_name') or None,
-                data.get('residue_id_eu') or None,
-                data.get('residue_name') or None,
-                to_decimal(data.get('detected_value')),
-                data.get('detected_unit') or None,
-                to_decimal(data.get('detected_value_mg_kg')),
-                to_decimal(data.get('loq_value')),
-                data.get('loq_unit') or None,
-                to_decimal(data.get('loq_value_mg_kg')),
-                to_decimal(data.get('mrl_value')),
-                data.get('mrl_source') or None,
-                data.get('mrl_regulation') or None,
-                data.get('target_market') or None,
-                to_decimal(data.get('compliance_score')),
-                data.get('compliance_label') or None,
-                data.get('compliance_status') or None,
-                bool(data.get('hard_fail', False)),
-                to_decimal(data.get('ratio_to_mrl')),
-                data.get('notes') or None
-            )
+            values = self._analysis_rows(user_id, [data])[0]
             
             cursor.execute(query, values)
             analysis_id = cursor.lastrowid
@@ -281,32 +407,173 @@ class MRLModel:
             return {'success': True, 'analysis_id': analysis_id}
         except mysql.connector.Error as err:
             return {'success': False, 'error': str(err)}
-    
-    def get_user_analyses(self, user_id, limit=50):
-        """Récupérer les analyses d'un utilisateur"""
+
+    def save_analyses_batch(self, user_id, analyses, lot=None):
+        """
+        Scorer et sauvegarder toutes les analyses d'un lot en une transaction :
+        tout est enregistré, ou rien. `lot` fournit les champs communs
+        (lot_number, product_code, ...) que chaque ligne peut surcharger.
+        """
+        lot = lot or {}
+        analyses = [
+            dict({k: lot[k] for k in self.LOT_FIELDS if lot.get(k) is not None}, **a)
+            for a in analyses
+        ]
+
+        # Score vectorisé pour les lignes qui ont une valeur détectée et une LMR
+        scorable = [
+            i for i, a in enumerate(analyses)
+            if a.get('detected_value_mg_kg') is not None and a.get('mrl_value')
+        ]
+        if scorable:
+            try:
+                records = self.calculate_compliance_batch(
+                    [float(analyses[i]['detected_value_mg_kg']) for i in scorable],
+                    [float(analyses[i]['mrl_value']) for i in scorable],
+                    [None if analyses[i].get('loq_value_mg_kg') is None else float(analyses[i]['loq_value_mg_kg'])
+                     for i in scorable],
+                    as_records=True
+                )
+            except (TypeError, ValueError) as err:
+                return {'success': False, 'error': f'Valeur numérique invalide: {err}'}
+            for i, compliance in zip(scorable, records):
+                analyses[i].update({
+                    'compliance_score': compliance['score'],
+                    'compliance_label': compliance['label'],
+                    'compliance_status': compliance['status'],
+                    'hard_fail': compliance['hard_fail'],
+                    'ratio_to_mrl': compliance['ratio']
+                })
+
+        conn = None
         try:
             conn = self.get_connection()
-            cursor = conn.cursor(dictionary=True)
-            
-            query = """
-            SELECT * FROM mrl_analyses
-            WHERE user_id = %s
-            ORDER BY created_at DESC
-            LIMIT %s
-            """
-            
-            cursor.execute(query, (user_id, limit))
-            analyses = cursor.fetchall()
-            
-            # Convertir les Decimal en float pour JSON
-            for analysis in analyses:
-                for key, value in analysis.items():
-                    if isinstance(value, Decimal):
-                        analysis[key] = float(value)
-            
+            cursor = conn.cursor()
+            ids = insert_many(
+                cursor, 'mrl_analyses', self.ANALYSIS_COLUMNS,
+                self._analysis_rows(user_id, analyses),
+                chunk_size=Config.BULK_INSERT_CHUNK
+            )
+            conn.commit()
             cursor.close()
             conn.close()
-            
-            return {'success': True, 'analyses': analyses}
+        except mysql.connector.Error as err:
+            if conn is not None:
+                try:
+                    conn.rollback()
+                    conn.close()
+                except mysql.connector.Error:
+                    pass
+            return {'success': False, 'error': str(err)}
+
+        return {
+            'success': True,
+            'analysis_ids': ids,
+            'count': len(ids),
+            'compliance': [
+                {k: a.get(k) for k in ('residue_name', 'compliance_score', 'compliance_label', 'hard_fail', 'ratio_to_mrl')}
+                for a in analyses
+            ]
+        }
+    
+    # Colonnes de l'historique (liste + détail de traçabilité) : pas de SELECT *
+    HISTORY_COLUMNS = (
+        'id', 'created_at', 'lot_number', 'product_code', 'product_name',
+        'residue_id_eu', 'residue_name', 'detected_value', 'detected_unit',
+        'detected_value_mg_kg', 'loq_value_mg_kg', 'mrl_value', 'mrl_source',
+        'mrl_regulation', 'target_market', 'compliance_score', 'compliance_label',
+        'compliance_status', 'hard_fail', 'ratio_to_mrl', 'notes'
+    )
+
+    @classmethod
+    def history_query(cls, user_id, after=None):
+        """
+        Requête d'une page d'historique -> (sql, paramètres sans LIMIT).
+        Parcourt l'index (user_id, created_at) ; voir database/check_indexes.py.
+        """
+        condition, params = keyset_clause('created_at', 'id', after)
+        query = f"""
+            SELECT {', '.join(cls.HISTORY_COLUMNS)} FROM mrl_analyses
+            WHERE user_id = %s{condition}
+            ORDER BY created_at DESC, id DESC
+            LIMIT %s
+            """
+        return query, (user_id,) + params
+
+    # Colonnes exportées et leur type (Parquet) ; DECIMAL lus en float
+    EXPORT_COLUMNS = (
+        ('id', 'int'), ('created_at', 'datetime'), ('lot_number', 'str'),
+        ('product_code', 'str'), ('product_id_eu', 'int'), ('product_name', 'str'),
+        ('residue_id_eu', 'int'), ('residue_name', 'str'),
+        ('detected_value', 'float'), ('detected_unit', 'str'), ('detected_value_mg_kg', 'float'),
+        ('loq_value', 'float'), ('loq_unit', 'str'), ('loq_value_mg_kg', 'float'),
+        ('mrl_value', 'float'), ('mrl_source', 'str'), ('mrl_regulation', 'str'),
+        ('target_market', 'str'), ('compliance_score', 'float'), ('compliance_label', 'str'),
+        ('compliance_status', 'str'), ('hard_fail', 'bool'), ('ratio_to_mrl', 'float'),
+        ('notes', 'str'),
+    )
+
+    @classmethod
+    def export_query(cls, user_id, date_from=None, date_to=None, product_code=None):
+        """
+        Requête d'export -> (sql, paramètres), du plus ancien au plus récent.
+        date_to est exclusive ; même index (user_id, created_at) que l'historique.
+        """
+        conditions = ["user_id = %s"]
+        params = [user_id]
+        if date_from is not None:
+            conditions.append("created_at >= %s")
+            params.append(date_from)
+        if date_to is not None:
+            conditions.append("created_at < %s")
+            params.append(date_to)
+        if product_code:
+            conditions.append("product_code = %s")
+            params.append(product_code)
+        query = f"""
+            SELECT {', '.join(name for name, _ in cls.EXPORT_COLUMNS)} FROM mrl_analyses
+            WHERE {' AND '.join(conditions)}
+            ORDER BY created_at, id
+            """
+        return query, tuple(params)
+
+    def export_user_analyses(self, user_id, date_from=None, date_to=None, product_code=None):
+        """
+        Ouvre la lecture en flux de l'export : 'batches' produit des paquets
+        de tuples (fetchmany sur curseur non bufferisé), à consommer une fois.
+        La requête part tout de suite pour que les erreurs SQL remontent ici.
+        """
+        try:
+            query, params = self.export_query(user_id, date_from, date_to, product_code)
+            # Pool dédié : un export garde sa connexion tout le téléchargement
+            batches = stream_query(query, params, pool=get_export_pool())
+            columns = next(batches)
+            return {
+                'success': True,
+                'columns': columns,
+                'types': dict(self.EXPORT_COLUMNS),
+                'batches': batches,
+            }
+        except PoolError as err:
+            return {'success': False, 'busy': True, 'error': str(err)}
+        except mysql.connector.Error as err:
+            return {'success': False, 'error': str(err)}
+
+    def get_user_analyses(self, user_id, limit=50, after=None, stream=False):
+        """
+        Récupérer une page d'analyses d'un utilisateur, des plus récentes aux
+        plus anciennes ; `after` = (created_at, id) décodé du curseur précédent.
+        Lecture en flux (curseur non bufferisé, fetchmany), DECIMAL décodés
+        directement en float. Avec stream=True, 'analyses' est un itérable à
+        consommer (voir iter_json_object) et 'next_cursor' une fonction à
+        appeler après lui.
+        """
+        try:
+            query, params = self.history_query(user_id, after)
+            page = KeysetStream(query, params, limit, 'created_at')
+            if stream:
+                return {'success': True, 'analyses': page, 'next_cursor': lambda: page.next_cursor}
+            analyses = list(page)
+            return {'success': True, 'analyses': analyses, 'next_cursor': page.next_cursor}
         except mysql.connector.Error as err:
             return {'success': False, 'error': str(err)}
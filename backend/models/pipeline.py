@@ -0,0 +1,380 @@
+import mysql.connector
+from config import Config
+from services.db_pool import get_pool
+from services.fanout import get_executor
+from services.jobs import current_job
+from services.units import normalize_results
+from concurrent.futures import wait
+from contextlib import contextmanager
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------
+# PipelineModel
+# Bulletin -> verdict côté serveur, en un seul job :
+#   extraction (GeminiModel) -> résolution des résidus -> LMR courante ->
+#   conformité vectorisée + sauvegarde atomique (MRLModel.save_analyses_batch)
+# Les étapes se recouvrent : chaque ligne reçue en flux du modèle part tout
+# de suite en résolution puis en recherche de LMR sur le pool fanout, pendant
+# que l'extraction continue. La durée de chaque étape est enregistrée dans
+# pipeline_runs.
+# ---------------------------------------------------------------------------
+
+
+class StageClock:
+    """Intervalles (début, fin) par étape ; les étapes parallèles se chevauchent."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self._spans = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            end = time.monotonic()
+            with self._lock:
+                self._spans.setdefault(name, []).append((start, end))
+
+    def report(self):
+        """Par étape : durée murale (premier début -> dernière fin), temps cumulé, nombre."""
+        total = time.monotonic() - self.started
+        with self._lock:
+            spans = {name: list(v) for name, v in self._spans.items()}
+        stages = {}
+        for name, items in spans.items():
+            stages[name] = {
+                'ms': int((max(e for _, e in items) - min(s for s, _ in items)) * 1000),
+                'busy_ms': int(sum(e - s for s, e in items) * 1000),
+                'count': len(items),
+                'offset_ms': int((min(s for s, _ in items) - self.started) * 1000),
+            }
+        wall = sum(st['ms'] for st in stages.values())
+        return {
+            'stages': stages,
+            'total_ms': int(total * 1000),
+            # temps gagné par le recouvrement des étapes
+            'overlap_ms': max(0, wall - int(total * 1000)),
+        }
+
+
+class PipelineModel:
+    VERDICTS = ('REJET', 'VIGILANCE', 'CONFORME')
+
+    def __init__(self, gemini_model, mrl_model):
+        self.gemini_model = gemini_model
+        self.mrl_model = mrl_model
+
+    def get_connection(self):
+        return get_pool().get_connection()
+
+    # -----------------------------------------------------------------------
+    # pipeline_runs
+    # -----------------------------------------------------------------------
+
+    def create_run(self, user_id, upload_id, product_code=None, lot_number=None):
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                """INSERT INTO pipeline_runs (user_id, upload_id, product_code, lot_number, status)
+                   VALUES (%s, %s, %s, %s, 'pending')""",
+                (user_id, upload_id, product_code, lot_number)
+            )
+            run_id = cursor.lastrowid
+            conn.commit()
+            cursor.close()
+            conn.close()
+            return {'success': True, 'run_id': run_id}
+        except mysql.connector.Error as err:
+            return {'success': False, 'error': str(err)}
+
+    def update_run(self, run_id, **fields):
+        if not fields:
+            return
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            assignments = ', '.join(f"{name}=%s" for name in fields)
+            cursor.execute(
+                f"UPDATE pipeline_runs SET {assignments} WHERE id=%s",
+                list(fields.values()) + [run_id]
+            )
+            conn.commit()
+            cursor.close()
+            conn.close()
+        except mysql.connector.Error as err:
+            # Le suivi de la run est perdu mais le traitement continue
+            logger.warning("pipeline_runs : mise à jour de la run %s impossible (%s) : %s",
+                           run_id, ', '.join(fields), err)
+
+    def get_run(self, run_id, user_id):
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SELECT * FROM pipeline_runs WHERE id=%s AND user_id=%s", (run_id, user_id))
+            run = cursor.fetchone()
+            cursor.close()
+            conn.close()
+        except mysql.connector.Error:
+            return None
+        if run and run.get('timings_json'):
+            run['timings'] = json.loads(run.pop('timings_json'))
+        return run
+
+    def mark_failed(self, run_id, upload_id, file_path, error=None, **kwargs):
+        """Appelé par la file de jobs quand toutes les tentatives ont échoué."""
+        self.update_run(run_id, status='failed', error=error, finished_at=time.strftime('%Y-%m-%d %H:%M:%S'))
+        self.gemini_model.update_upload_status(upload_id, 'failed')
+
+    def fail_stale_runs(self, older_than):
+        """Exécutions non terminées depuis plus de `older_than` secondes -> 'failed' (jobs perdus au redémarrage)."""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                """UPDATE pipeline_runs SET status='failed', error='Interrompu (redémarrage du serveur)',
+                          finished_at=NOW()
+                   WHERE status IN ('pending', 'processing')
+                     AND created_at < NOW() - INTERVAL %s SECOND""",
+                (int(older_than),)
+            )
+            count = cursor.rowcount
+            conn.commit()
+            cursor.close()
+            conn.close()
+            return count
+        except mysql.connector.Error:
+            return 0
+
+    # -----------------------------------------------------------------------
+    # Exécution
+    # -----------------------------------------------------------------------
+
+    def run(self, run_id, upload_id, file_path, user_id, content_hash=None,
+            product_code=None, lot_number=None, target_market=None, language='EN'):
+        clock = StageClock()
+        self.update_run(run_id, status='processing')
+        job = current_job()
+
+        # Produit : thread dédié, jamais dans le pool fanout où les
+        # résolutions de lignes l'attendent (pas d'interblocage possible)
+        product = {}
+        product_error = []  # panne de la recherche produit (distincte de "aucun produit")
+        product_ready = threading.Event()
+
+        def find_product():
+            try:
+                with clock.stage('product'):
+                    products, _, _, error = self.mrl_model.search_product(product_code, language)
+                if error:
+                    product_error.append(error)
+                elif products:
+                    product.update(products[0])
+            except Exception as e:
+                product_error.append(str(e))
+            finally:
+                product_ready.set()
+
+        if product_code:
+            threading.Thread(target=find_product, daemon=True).start()
+        else:
+            product_ready.set()
+
+        # Résolution + LMR lancées dès qu'une ligne arrive du modèle
+        executor = get_executor()
+        futures = {}
+        futures_lock = threading.Lock()
+
+        def submit(name):
+            key = self.gemini_model._substance_key(name)
+            if not key:
+                return
+            with futures_lock:
+                if key not in futures:
+                    futures[key] = executor.submit(
+                        self._resolve_row, str(name).strip(), product, product_ready, language, clock,
+                        product_error
+                    )
+                    if job is not None:
+                        job.update_progress(stage='extract', substances_submitted=len(futures))
+
+        with clock.stage('extract'):
+            # Nouvelle tentative après une extraction réussie : relire les
+            # lignes déjà enregistrées plutôt que rappeler le modèle (et les
+            # enregistrer une seconde fois)
+            response = self.saved_extraction(upload_id, user_id)
+            if response is None:
+                response = self.gemini_model.process_upload(
+                    upload_id, file_path, content_hash=content_hash, user_id=user_id,
+                    on_row=lambda row: submit(row.get('substance'))
+                )
+        extracted = response['extracted_data']
+        rows = extracted.get('results', [])
+
+        # Fast path texte / cache : les lignes n'ont pas été streamées
+        for row in rows:
+            submit(row['substance'])
+        if job is not None:
+            job.update_progress(stage='resolve')
+        with futures_lock:
+            pending = list(futures.values())
+        wait(pending, timeout=Config.PIPELINE_RESOLVE_TIMEOUT)
+
+        metadata = extracted.get('metadata', {})
+        lot = {
+            'lot_number': lot_number or metadata.get('batch_id'),
+            'product_code': product.get('product_code') or product_code,
+            'product_id_eu': product.get('product_id'),
+            'product_name': product.get('product_name') or metadata.get('product_name'),
+            'target_market': target_market,
+        }
+        # Valeurs typées et converties en mg/kg en un passage sur tout le tableau
+        analyses = [self._analysis(row, futures.get(self.gemini_model._substance_key(row['substance'])), upload_id)
+                    for row in normalize_results(rows)]
+
+        if job is not None:
+            job.update_progress(stage='persist')
+        with clock.stage('persist'):
+            saved = self.mrl_model.save_analyses_batch(user_id, analyses, lot=lot) if analyses else \
+                {'success': True, 'analysis_ids': [], 'count': 0, 'compliance': []}
+        if not saved['success']:
+            raise Exception(saved.get('error', 'DB save failed'))
+
+        verdict = self.verdict(saved['compliance'])
+        timings = clock.report()
+        stages = timings['stages']
+        self.update_run(
+            run_id,
+            status='completed',
+            verdict=verdict,
+            product_id_eu=lot['product_id_eu'],
+            lot_number=lot['lot_number'],
+            substances_count=len(rows),
+            analyses_count=saved['count'],
+            extract_ms=stages.get('extract', {}).get('ms'),
+            resolve_ms=stages.get('resolve', {}).get('ms'),
+            mrl_ms=stages.get('mrl', {}).get('ms'),
+            persist_ms=stages.get('persist', {}).get('ms'),
+            total_ms=timings['total_ms'],
+            overlap_ms=timings['overlap_ms'],
+            timings_json=json.dumps(timings),
+            finished_at=time.strftime('%Y-%m-%d %H:%M:%S'),
+        )
+
+        return {
+            'success': True,
+            'run_id': run_id,
+            'upload_id': upload_id,
+            'verdict': verdict,
+            'product': lot,
+            'analysis_ids': saved['analysis_ids'],
+            'compliance': saved['compliance'],
+            'extraction_confidence': extracted.get('confidence'),
+            'requires_validation': response.get('requires_validation', False),
+            'timings': timings,
+        }
+
+    def saved_extraction(self, upload_id, user_id):
+        """Réponse d'extraction si l'upload est déjà 'completed' (lignes en base), sinon None."""
+        upload = self.gemini_model.get_upload(upload_id, user_id)
+        if not upload or upload.get('processing_status') != 'completed':
+            return None
+        rows = self.gemini_model.get_extracted_data(upload_id)
+        if not rows.get('success'):
+            return None
+        extracted = self.gemini_model.extraction_from_rows(rows.get('data', []), upload.get('confidence_score'))
+        return dict(self.gemini_model.upload_response(upload_id, extracted), cached=True)
+
+    def _resolve_row(self, name, product, product_ready, language, clock, product_error=()):
+        """Résidu (miroir/API/fuzzy) puis LMR courante pour le produit du lot."""
+        with clock.stage('resolve'):
+            residues, _, _, error = self.mrl_model.search_residue(name, language)
+        entry = {'input_name': name, 'current_mrl': 0.01, 'mrl_source': 'Default'}
+        if error:
+            return self._unresolved(name, error)
+        if not residues:
+            entry['error'] = 'Not found'  # LMR par défaut du règlement : ligne scorée
+            return entry
+
+        residue = residues[0]
+        entry.update({'residue_id': residue.get('pesticide_residue_id'),
+                      'residue_name': residue.get('pesticide_residue_name') or name})
+
+        if not product_ready.wait(Config.PIPELINE_RESOLVE_TIMEOUT):
+            return dict(entry, **self._unresolved(name, 'Product lookup timeout'))
+        if product_error:
+            return dict(entry, **self._unresolved(name, f"Product lookup failed: {product_error[0]}"))
+        product_id = product.get('product_id')
+        if not entry['residue_id'] or not product_id:
+            entry['mrl_source'] = 'Default (no product match)'
+            return entry
+
+        with clock.stage('mrl'):
+            mrls, _, _, m_error = self.mrl_model.get_mrls(entry['residue_id'], product_id)
+        if m_error:
+            return dict(entry, **self._unresolved(name, m_error))
+        current_mrl, mrl_source = self.mrl_model.current_mrl(mrls)
+        entry.update({
+            'current_mrl': 0.01 if current_mrl is None else current_mrl,
+            'mrl_source': mrl_source,
+        })
+        return entry
+
+    @staticmethod
+    def _unresolved(name, error):
+        """
+        Résolution impossible (délai, erreur API ou base) : pas de LMR, donc
+        ligne non scorée (verdict VIGILANCE au mieux), comme une unit_error.
+        Une panne ne doit jamais rendre un lot CONFORME ou REJET.
+        """
+        return {'input_name': name, 'current_mrl': None, 'mrl_source': 'Non résolu',
+                'error': error, 'unresolved': True}
+
+    def _analysis(self, row, future, upload_id):
+        """Ligne extraite + résolution -> analyse prête pour save_analyses_batch."""
+        resolved = self._unresolved(row['substance'], 'Resolution timeout')
+        if future is not None and future.done():
+            try:
+                resolved = future.result()
+            except Exception as e:
+                resolved = self._unresolved(row['substance'], str(e))
+
+        notes = [f"Pipeline upload #{upload_id}"]
+        if resolved.get('error'):
+            notes.append(resolved['error'])
+        if row.get('unit_error'):
+            notes.append(row['unit_error'])  # non scorée : pas de conversion avec un facteur supposé
+        return {
+            'residue_id_eu': resolved.get('residue_id'),
+            'residue_name': resolved.get('residue_name') or row['substance'],
+            'detected_value': row['detected_value'],
+            'detected_unit': row['unit'],
+            'detected_value_mg_kg': row['detected_value_mg_kg'],
+            'loq_value': row['loq_value'],
+            'loq_unit': row['loq_unit'],
+            'loq_value_mg_kg': row['loq_value_mg_kg'],
+            'mrl_value': resolved['current_mrl'],
+            'mrl_source': resolved['mrl_source'],
+            'notes': ' - '.join(notes),
+        }
+
+    @staticmethod
+    def verdict(compliance):
+        """
+        Même règle que le tableau de bord : un CRITICAL rejette le lot. Une
+        ligne non scorée (unité inconnue, valeur illisible, résidu ou LMR non
+        résolu) ne peut pas rendre le lot conforme : VIGILANCE au mieux.
+        """
+        if any(c.get('compliance_label') == 'CRITICAL' or c.get('hard_fail') for c in compliance):
+            return 'REJET'
+        if any(c.get('compliance_label') in ('VIGILANCE', None) for c in compliance):
+            return 'VIGILANCE'
+        return 'CONFORME'
@@ -1,21 +1,13 @@
 import mysql.connector
-from config import Config
+from services.db_pool import get_pool
 import bcrypt
 from datetime import datetime, timedelta
 import jwt
 import secrets
 
 class User:
-    def __init__(self):
-        self.db_config = {
-            'host': Config.MYSQL_HOST,
-            'user': Config.MYSQL_USER,
-            'password': Config.MYSQL_PASSWORD,
-            'database': Config.MYSQL_DATABASE
-        }
-    
     def get_connection(self):
-        return mysql.connector.connect(**self.db_config)
+        return get_pool().get_connection()
     
     @staticmethod
     def hash_password(password):
@@ -68,6 +60,23 @@ class User:
         except mysql.connector.Error as err:
             return None
     
+    def get_user_by_id(self, user_id):
+        """Récupérer le profil public d'un utilisateur par ID"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor(dictionary=True)
+            
+            query = "SELECT id, email, username, full_name, phone, farm_name, farm_location FROM users WHERE id = %s"
+            cursor.execute(query, (user_id,))
+            user = cursor.fetchone()
+            
+            cursor.close()
+            conn.close()
+            
+            return user
+        except mysql.connector.Error as err:
+            return None
+    
     def generate_reset_token(self, user_id):
         """Générer un token de reset password"""
         try:
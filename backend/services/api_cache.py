@@ -0,0 +1,244 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from config import Config
+
+# ---------------------------------------------------------------------------
+# Cache persistant (SQLite) des réponses de l'API EU Pesticides
+# - clé = endpoint + paramètres normalisés
+# - TTL + stale-while-revalidate : une entrée expirée est servie tout de
+#   suite pendant qu'un thread la rafraîchit en arrière-plan
+# - si l'API est lente ou indisponible, la dernière réponse connue est servie
+# - éviction LRU sur disque, petit LRU mémoire devant SQLite
+# - les requêtes identiques simultanées sont fusionnées en un seul appel
+# ---------------------------------------------------------------------------
+
+
+class _Flight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+
+
+class ApiCache:
+    def __init__(self, path, ttl=86400, stale_ttl=604800, max_entries=50000, memory_entries=2000):
+        self.path = path
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (payload_json, url, stored_at)
+        self._revalidating = set()
+        self._inflight = {}
+        self._writes_since_evict = 0
+
+        self._stats = {
+            'hits': 0,
+            'memory_hits': 0,
+            'misses': 0,
+            'stale_hits': 0,
+            'coalesced': 0,
+            'revalidations': 0,
+            'served_stale_on_error': 0,
+            'evictions': 0,
+        }
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS api_cache (
+                   cache_key   TEXT PRIMARY KEY,
+                   endpoint    TEXT NOT NULL,
+                   payload     TEXT NOT NULL,
+                   url         TEXT,
+                   stored_at   REAL NOT NULL,
+                   last_access REAL NOT NULL
+               )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_api_cache_last_access ON api_cache (last_access)")
+
+    @staticmethod
+    def make_key(endpoint, params):
+        """Clé stable : endpoint + paramètres triés, valeurs normalisées."""
+        norm = {str(k).strip(): str(v).strip() for k, v in (params or {}).items() if v is not None}
+        return endpoint.strip('/') + '?' + json.dumps(norm, sort_keys=True, separators=(',', ':'))
+
+    # -----------------------------------------------------------------------
+    # API principale
+    # -----------------------------------------------------------------------
+
+    def fetch(self, endpoint, params, loader):
+        """
+        Retourne (data, url, status, error) comme MRLModel.call_api.
+        `loader` est appelé sans argument pour interroger l'API en direct.
+        """
+        key = self.make_key(endpoint, params)
+        entry = self._get(key)
+        now = time.time()
+
+        if entry is not None:
+            payload, url, stored_at = entry
+            age = now - stored_at
+            if age <= self.ttl:
+                self._count('hits')
+                return json.loads(payload), url, 200, None
+            if age <= self.ttl + self.stale_ttl:
+                self._count('stale_hits')
+                self._revalidate(key, endpoint, loader)
+                return json.loads(payload), url, 200, None
+
+        self._count('misses')
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+
+        if not leader:
+            # Même requête déjà en vol : on attend sa réponse au lieu d'en envoyer une autre
+            self._count('coalesced')
+            flight.event.wait()
+            data, url, status, error = flight.result
+            return (json.loads(data) if status == 200 and error is None else data), url, status, error
+
+        try:
+            data, url, status, error = loader()
+            if status == 200 and error is None:
+                payload = self.put(key, endpoint, data, url)
+                flight.result = (payload, url, status, error)
+            elif entry is not None:
+                # API en erreur : on continue de répondre avec la dernière valeur connue
+                self._count('served_stale_on_error')
+                payload, url, _ = entry
+                flight.result = (payload, url, 200, None)
+                return json.loads(payload), url, 200, None
+            else:
+                flight.result = (data, url, status, error)
+            return data, url, status, error
+        except Exception as ex:
+            flight.result = ([], None, None, str(ex))
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def put(self, key, endpoint, data, url):
+        payload = json.dumps(data, separators=(',', ':'))
+        now = time.time()
+        with self._lock:
+            self._remember(key, (payload, url, now))
+            self._db.execute(
+                "INSERT OR REPLACE INTO api_cache (cache_key, endpoint, payload, url, stored_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, endpoint, payload, url, now, now)
+            )
+            self._writes_since_evict += 1
+            if self._writes_since_evict >= 100:
+                self._writes_since_evict = 0
+                self._evict_locked()
+        return payload
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._memory)
+            stats['disk_entries'] = self._db.execute("SELECT COUNT(*) FROM api_cache").fetchone()[0]
+        lookups = stats['hits'] + stats['stale_hits'] + stats['misses']
+        stats['hit_ratio'] = round((stats['hits'] + stats['stale_hits']) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._db.execute("DELETE FROM api_cache")
+
+    # -----------------------------------------------------------------------
+    # Helpers
+    # -----------------------------------------------------------------------
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                return entry
+            row = self._db.execute(
+                "SELECT payload, url, stored_at FROM api_cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE api_cache SET last_access = ? WHERE cache_key = ?", (time.time(), key))
+            entry = (row[0], row[1], row[2])
+            self._remember(key, entry)
+            return entry
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_locked(self):
+        count = self._db.execute("SELECT COUNT(*) FROM api_cache").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM api_cache WHERE cache_key IN "
+                "(SELECT cache_key FROM api_cache ORDER BY last_access LIMIT ?)",
+                (excess,)
+            )
+            self._stats['evictions'] += excess
+
+    def _revalidate(self, key, endpoint, loader):
+        with self._lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+
+        def run():
+            try:
+                data, url, status, error = loader()
+                if status == 200 and error is None:
+                    self.put(key, endpoint, data, url)
+                    self._count('revalidations')
+            except Exception:
+                pass
+            finally:
+                with self._lock:
+                    self._revalidating.discard(key)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_api_cache():
+    """Retourne le cache unique du processus (créé au premier appel)."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ApiCache(
+                    Config.API_CACHE_PATH,
+                    ttl=Config.API_CACHE_TTL,
+                    stale_ttl=Config.API_CACHE_STALE_TTL,
+                    max_entries=Config.API_CACHE_MAX_ENTRIES,
+                    memory_entries=Config.API_CACHE_MEMORY_ENTRIES,
+                )
+    return _cache
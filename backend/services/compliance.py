@@ -0,0 +1,98 @@
+import numpy as np
+
+# ---------------------------------------------------------------------------
+# Score de conformité vectorisé
+# Même règle que MRLModel.calculate_compliance, appliquée en une passe NumPy
+# à des colonnes entières (détecté, LMR, LOQ), pour re-scorer un historique
+# complet quand les seuils changent.
+# ---------------------------------------------------------------------------
+
+EXCEEDS_MRL = 1
+LOQ_ABOVE_MRL = 2
+WITHIN_LIMIT = 0
+
+
+def _round_like_python(values, ndigits):
+    """
+    np.round(x, n) = rint(x * 10^n) / 10^n, identique à round() de Python sauf
+    quand x * 10^n tombe (presque) sur un demi-entier : ces rares cas sont
+    recalculés avec round() pour garantir le même résultat que le scalaire.
+    """
+    rounded = np.round(values, ndigits)
+    scaled = values * (10.0 ** ndigits)
+    frac = np.abs(scaled - np.floor(scaled) - 0.5)
+    ambiguous = np.flatnonzero(np.isfinite(values) & (frac < 1e-6))
+    for i in ambiguous:
+        rounded[i] = round(float(values[i]), ndigits)
+    return rounded
+
+
+def score_compliance_batch(detected, mrl, loq=None):
+    """
+    Colonnes détecté / LMR / LOQ (mg/kg) -> dict de tableaux :
+      ratio (NaN quand le scalaire renvoie None), score, label, hard_fail,
+      reason_code (EXCEEDS_MRL, LOQ_ABOVE_MRL ou WITHIN_LIMIT)
+    loq peut être None ou contenir des NaN / None (pas de LOQ).
+    """
+    detected = np.asarray(detected, dtype=float)
+    mrl = np.asarray(mrl, dtype=float)
+    if loq is None:
+        loq = np.full(detected.shape, np.nan)
+    else:
+        loq = np.asarray(loq, dtype=float)  # None -> NaN
+
+    exceeds = detected > mrl
+    loq_fail = ~exceeds & (loq != 0) & (loq > mrl)
+    within = ~(exceeds | loq_fail)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        raw_ratio = np.where(mrl > 0, detected / np.where(mrl > 0, mrl, 1.0), 1.0)
+        exceed_ratio = detected / mrl
+    raw_ratio = np.where(exceeds, exceed_ratio, raw_ratio)
+
+    score = _round_like_python(np.clip(100.0 * (1.0 - raw_ratio), 0.0, 100.0), 1)
+    score = np.where(within, score, 0.0)
+
+    ratio = _round_like_python(raw_ratio, 4)
+    ratio = np.where(loq_fail, np.nan, ratio)
+
+    label = np.select(
+        [~within, (score > 80) & (raw_ratio < 0.5), score >= 40],
+        ['CRITICAL', 'SAFE', 'VIGILANCE'],
+        default='CRITICAL'
+    ).astype(object)
+
+    reason_code = np.select([exceeds, loq_fail], [EXCEEDS_MRL, LOQ_ABOVE_MRL], default=WITHIN_LIMIT)
+
+    return {
+        'ratio': ratio,
+        'score': score,
+        'label': label,
+        'hard_fail': ~within,
+        'reason_code': reason_code,
+    }
+
+
+def batch_to_records(batch, detected, mrl, loq=None):
+    """Convertit le résultat vectorisé en dicts identiques à calculate_compliance()."""
+    records = []
+    for i in range(len(batch['score'])):
+        code = batch['reason_code'][i]
+        if code == EXCEEDS_MRL:
+            reason = f"Detected ({detected[i]:.4f} mg/kg) exceeds MRL ({mrl[i]} mg/kg)"
+        elif code == LOQ_ABOVE_MRL:
+            reason = f"LOQ ({loq[i]:.4f} mg/kg) is above MRL — analytical method not sensitive enough"
+        else:
+            reason = "Within limit"
+        ratio = batch['ratio'][i]
+        score = float(batch['score'][i])
+        label = batch['label'][i]
+        records.append({
+            "score": 0 if code != WITHIN_LIMIT else score,
+            "label": label,
+            "status": label,
+            "hard_fail": bool(batch['hard_fail'][i]),
+            "reason": reason,
+            "ratio": None if np.isnan(ratio) else float(ratio)
+        })
+    return records
@@ -0,0 +1,343 @@
+import threading
+import time
+from collections import deque
+
+import mysql.connector
+from mysql.connector.conversion import MySQLConverter
+from mysql.connector.errors import PoolError
+from config import Config
+
+# ---------------------------------------------------------------------------
+# Pool de connexions MySQL partagé par tout le processus
+# User, MRLModel et GeminiModel empruntent leurs connexions ici au lieu
+# d'ouvrir une connexion TCP + authentification à chaque requête.
+# ---------------------------------------------------------------------------
+
+
+class PooledConnection:
+    """Connexion empruntée au pool : close() la rend au pool au lieu de la fermer."""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            self._pool._release(self._raw)
+
+    def discard(self):
+        """Ferme la connexion au lieu de la rendre (résultat non lu, état incertain)."""
+        if not self._released:
+            self._released = True
+            self._pool._drop(self._raw)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def __del__(self):
+        # Filet de sécurité : certaines méthodes quittent sur exception
+        # sans appeler close(), la connexion ne doit pas fuir du pool.
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    def __init__(self, db_config, size=10, timeout=10.0, recycle=1800, ping_after=30):
+        self.db_config = db_config
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = deque()  # (raw, created_at, last_used)
+        self._created_at = {}
+
+        self._stats = {
+            'checkouts': 0,
+            'releases': 0,
+            'connections_created': 0,
+            'connections_recycled': 0,
+            'health_check_failures': 0,
+            'exhausted': 0,
+            'timeouts': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+        }
+
+    # -----------------------------------------------------------------------
+    # Checkout / release
+    # -----------------------------------------------------------------------
+
+    def get_connection(self):
+        """Emprunte une connexion (attend au plus `timeout` secondes)."""
+        start = time.monotonic()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats['exhausted'] += 1
+            if not self._slots.acquire(timeout=self.timeout):
+                with self._lock:
+                    self._stats['timeouts'] += 1
+                raise PoolError(f"Pool MySQL épuisé ({self.size} connexions, attente {self.timeout}s)")
+        waited = time.monotonic() - start
+
+        try:
+            raw = self._checkout_raw()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._stats['checkouts'] += 1
+            self._stats['wait_time_total'] += waited
+            self._stats['wait_time_max'] = max(self._stats['wait_time_max'], waited)
+        return PooledConnection(self, raw)
+
+    def _checkout_raw(self):
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                item = self._idle.pop() if self._idle else None
+            if item is None:
+                return self._open()
+
+            raw, created_at, last_used = item
+            if self.recycle and now - created_at > self.recycle:
+                self._discard(raw)
+                with self._lock:
+                    self._stats['connections_recycled'] += 1
+                continue
+            if now - last_used > self.ping_after and not self._is_healthy(raw):
+                self._discard(raw)
+                with self._lock:
+                    self._stats['health_check_failures'] += 1
+                continue
+            return raw
+
+    def _release(self, raw):
+        try:
+            # Ne jamais rendre une transaction entamée au pool
+            if raw.in_transaction:
+                raw.rollback()
+            healthy = raw.is_connected()
+        except Exception:
+            healthy = False
+
+        with self._lock:
+            self._stats['releases'] += 1
+            if healthy:
+                self._idle.append((raw, self._created_at.get(id(raw), time.monotonic()), time.monotonic()))
+        if not healthy:
+            self._discard(raw)
+        self._slots.release()
+
+    def _drop(self, raw):
+        with self._lock:
+            self._stats['releases'] += 1
+        self._discard(raw)
+        self._slots.release()
+
+    # -----------------------------------------------------------------------
+    # Helpers
+    # -----------------------------------------------------------------------
+
+    def _open(self):
+        raw = mysql.connector.connect(**self.db_config)
+        with self._lock:
+            self._created_at[id(raw)] = time.monotonic()
+            self._stats['connections_created'] += 1
+        return raw
+
+    def _discard(self, raw):
+        with self._lock:
+            self._created_at.pop(id(raw), None)
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _is_healthy(raw):
+        try:
+            raw.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def stats(self):
+        """Métriques du pool (exposées par /api/health/db)."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle'] = len(self._idle)
+            stats['open'] = len(self._created_at)
+        stats['size'] = self.size
+        stats['in_use'] = stats['checkouts'] - stats['releases']
+        stats['wait_time_avg'] = (
+            round(stats['wait_time_total'] / stats['checkouts'], 6) if stats['checkouts'] else 0.0
+        )
+        return stats
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for raw, _, _ in idle:
+            self._discard(raw)
+
+
+def insert_many(cursor, table, columns, rows, chunk_size=500):
+    """
+    INSERT multi-lignes par paquets de `chunk_size` ; retourne les IDs insérés.
+    Un INSERT multi-lignes reçoit des IDs auto-incrémentés consécutifs
+    (pas = @@auto_increment_increment) à partir de lastrowid.
+    """
+    if not rows:
+        return []
+    cursor.execute("SELECT @@auto_increment_increment")
+    step = int(cursor.fetchone()[0] or 1)
+
+    row_sql = '(' + ', '.join(['%s'] * len(columns)) + ')'
+    ids = []
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        cursor.execute(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES " + ', '.join([row_sql] * len(chunk)),
+            [value for row in chunk for value in row]
+        )
+        first_id = cursor.lastrowid
+        ids.extend(first_id + i * step for i in range(len(chunk)))
+    return ids
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Retourne le pool unique du processus (créé au premier appel)."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    {
+                        'host': Config.MYSQL_HOST,
+                        'user': Config.MYSQL_USER,
+                        'password': Config.MYSQL_PASSWORD,
+                        'database': Config.MYSQL_DATABASE
+                    },
+                    size=Config.MYSQL_POOL_SIZE,
+                    timeout=Config.MYSQL_POOL_TIMEOUT,
+                    recycle=Config.MYSQL_POOL_RECYCLE,
+                    ping_after=Config.MYSQL_POOL_PING_AFTER,
+                )
+    return _pool
+
+
+def get_connection():
+    return get_pool().get_connection()
+
+
+# ---------------------------------------------------------------------------
+# Lecture en flux (historiques, exports)
+# Pools séparés et plus petits : une lecture longue ne prive pas les requêtes
+# courantes de connexions. Les pages d'historique (courtes) et les exports
+# (connexion gardée pendant tout le téléchargement) ont chacun le leur : des
+# exports simultanés ne bloquent jamais le chargement de l'historique.
+# Leurs connexions décodent DECIMAL directement en float (FloatConverter) :
+# pas de Decimal intermédiaire ni de seconde passe sur les lignes pour les
+# rendre sérialisables en JSON.
+# ---------------------------------------------------------------------------
+
+
+class FloatConverter(MySQLConverter):
+    """DECIMAL -> float au décodage des lignes."""
+
+    def _decimal_to_python(self, value, desc=None):
+        return float(value)
+
+    _newdecimal_to_python = _decimal_to_python
+
+
+_stream_pool = None
+_export_pool = None
+
+
+def _float_pool(size):
+    return ConnectionPool(
+        {
+            'host': Config.MYSQL_HOST,
+            'user': Config.MYSQL_USER,
+            'password': Config.MYSQL_PASSWORD,
+            'database': Config.MYSQL_DATABASE,
+            'converter_class': FloatConverter,
+        },
+        size=size,
+        timeout=Config.MYSQL_POOL_TIMEOUT,
+        recycle=Config.MYSQL_POOL_RECYCLE,
+        ping_after=Config.MYSQL_POOL_PING_AFTER,
+    )
+
+
+def get_stream_pool():
+    """Pool des pages d'historique lues en flux (créé au premier appel)."""
+    global _stream_pool
+    if _stream_pool is None:
+        with _pool_lock:
+            if _stream_pool is None:
+                _stream_pool = _float_pool(Config.MYSQL_STREAM_POOL_SIZE)
+    return _stream_pool
+
+
+def get_export_pool():
+    """Pool des exports (lectures longues), séparé de celui de l'historique."""
+    global _export_pool
+    if _export_pool is None:
+        with _pool_lock:
+            if _export_pool is None:
+                _export_pool = _float_pool(Config.MYSQL_EXPORT_POOL_SIZE)
+    return _export_pool
+
+
+def stream_query(query, params=(), batch_size=None, pool=None):
+    """
+    Lit le résultat de `query` par paquets (fetchmany) sur un curseur non
+    bufferisé : les lignes restent côté serveur / socket jusqu'à leur
+    lecture, la mémoire ne dépend que de batch_size.
+    Produit d'abord le tuple des noms de colonnes, puis des listes de tuples.
+    Si le générateur est abandonné en cours de route (client déconnecté), la
+    connexion est fermée plutôt que de lire le reste du résultat.
+    `pool` : get_stream_pool() par défaut, get_export_pool() pour les exports.
+    """
+    batch_size = batch_size or Config.STREAM_FETCH_SIZE
+    conn = (pool or get_stream_pool()).get_connection()
+    exhausted = False
+    try:
+        cursor = conn.cursor()
+        # Un client lent ne doit pas faire couper la connexion pendant l'envoi
+        cursor.execute("SET SESSION net_write_timeout = %s", (Config.MYSQL_STREAM_WRITE_TIMEOUT,))
+        cursor.execute(query, tuple(params))
+        yield tuple(cursor.column_names)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+        exhausted = True
+        cursor.close()
+    finally:
+        if exhausted:
+            conn.close()
+        else:
+            conn.discard()
@@ -0,0 +1,184 @@
+import csv
+import importlib.util
+import io
+import json
+import time
+import zlib
+from datetime import date
+
+from config import Config
+
+# ---------------------------------------------------------------------------
+# Export en flux (CSV, NDJSON, Parquet)
+# Entrée : noms de colonnes + types, et un itérable de paquets de tuples
+# (services.db_pool.stream_query). Sortie : un itérable d'octets à passer
+# tel quel à une Response Flask. Un paquet lu = un morceau écrit : la
+# mémoire ne dépend que de la taille des paquets (et des groupes de lignes
+# Parquet), jamais du nombre total de lignes.
+# ---------------------------------------------------------------------------
+
+EXPORT_FORMATS = {
+    # format -> (type MIME, extension)
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+class ExportFormatError(ValueError):
+    pass
+
+
+def parquet_available():
+    # Export Parquet optionnel (requirements-optional.txt) : pyarrow n'est
+    # importé qu'au premier export, pas au démarrage de chaque worker
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def _iso(value):
+    if isinstance(value, date):
+        return value.isoformat(sep=' ') if hasattr(value, 'hour') else value.isoformat()
+    return str(value)
+
+
+def _iter_csv(columns, batches):
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator='\n')
+    writer.writerow(columns)
+    for batch in batches:
+        writer.writerows(batch)
+        yield buf.getvalue().encode('utf-8')
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode('utf-8')
+
+
+def _iter_ndjson(columns, batches):
+    encode = json.JSONEncoder(default=_iso, ensure_ascii=False, separators=(',', ':')).encode
+    for batch in batches:
+        yield ''.join(encode(dict(zip(columns, row))) + '\n' for row in batch).encode('utf-8')
+
+
+class _ChunkSink:
+    """Fichier en écriture seule pour ParquetWriter ; drain() rend ce qui a été écrit."""
+
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        chunks, self._chunks = self._chunks, []
+        return b''.join(chunks)
+
+
+def _arrow_types(pa):
+    return {
+        'int': pa.int64(),
+        'float': pa.float64(),
+        'str': pa.string(),
+        'bool': pa.bool_(),
+        'datetime': pa.timestamp('s'),
+    }
+
+
+def _iter_parquet(columns, types, batches, row_group_size):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportFormatError("pyarrow n'est pas installé : export Parquet indisponible")
+    arrow_types = _arrow_types(pa)
+    schema = pa.schema([(name, arrow_types[types[name]]) for name in columns])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='snappy')
+
+    bool_columns = {i for i, name in enumerate(columns) if types[name] == 'bool'}
+
+    def write(rows):
+        values = list(zip(*rows))
+        for i in bool_columns:  # TINYINT(1) lu en 0 / 1
+            values[i] = [None if v is None else bool(v) for v in values[i]]
+        writer.write_table(pa.Table.from_arrays(
+            [pa.array(values[i], type=field.type) for i, field in enumerate(schema)],
+            schema=schema
+        ))
+
+    first = sink.drain()  # en-tête "PAR1" : la réponse démarre tout de suite
+    if first:
+        yield first
+    pending = []
+    for batch in batches:
+        pending.extend(batch)
+        if len(pending) >= row_group_size:
+            write(pending)
+            pending = []
+            yield sink.drain()
+    if pending:
+        write(pending)
+    writer.close()
+    yield sink.drain()
+
+
+def iter_export(fmt, columns, types, batches, row_group_size=None):
+    """
+    (colonnes, types {colonne: int|float|str|bool|datetime}, paquets de
+    tuples) -> octets au format demandé. Ferme `batches` en sortie, même si
+    le client abandonne le téléchargement.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ExportFormatError(f"Format d'export inconnu : {fmt}")
+    if fmt == 'csv':
+        body = _iter_csv(columns, batches)
+    elif fmt == 'ndjson':
+        body = _iter_ndjson(columns, batches)
+    else:
+        body = _iter_parquet(columns, types, batches, row_group_size or Config.EXPORT_PARQUET_ROW_GROUP)
+    try:
+        for chunk in body:
+            if chunk:
+                yield chunk
+    finally:
+        close = getattr(batches, 'close', None)
+        if close is not None:
+            close()
+
+
+def gzip_stream(chunks, level=6, flush_interval=1.0):
+    """
+    Compression gzip à la volée. Le compresseur garde des données en tampon :
+    un Z_SYNC_FLUSH au premier morceau puis au plus toutes les flush_interval
+    secondes garantit que le client reçoit des octets sans attendre la fin.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31 = en-tête gzip
+    last_flush = None
+    try:
+        for chunk in chunks:
+            out = compressor.compress(chunk)
+            now = time.monotonic()
+            if last_flush is None or now - last_flush >= flush_interval:
+                out += compressor.flush(zlib.Z_SYNC_FLUSH)
+                last_flush = now
+            if out:
+                yield out
+        yield compressor.flush()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
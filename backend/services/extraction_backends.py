@@ -0,0 +1,204 @@
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+
+from config import Config
+
+# ---------------------------------------------------------------------------
+# Backends d'extraction (l'appel "modèle" de GeminiModel.extract_from_pdf)
+# - gemini : API Google Gemini (SDK importé seulement si ce backend est choisi)
+# - text   : lecture locale de la couche texte, entièrement hors ligne
+# - replay : réponses enregistrées rejouées avec une latence fixe, pour
+#            tester en charge tout le pipeline d'upload sans l'API
+# Tous exposent generate(prompt, pdf_part) -> texte brut de la réponse
+# (JSON, éventuellement entouré de ```), comme response.text de Gemini,
+# et generate_stream() qui produit ce même texte par morceaux. Le dict
+# `usage` optionnel reçoit prompt_tokens / output_tokens quand le backend
+# les connaît.
+# Choix par Config.EXTRACTION_BACKEND.
+# ---------------------------------------------------------------------------
+
+
+def pdf_part_hash(pdf_part):
+    """SHA-256 des octets d'une partie PDF inline (clé des enregistrements)."""
+    data = pdf_part.get('data', b'') if isinstance(pdf_part, dict) else b''
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+
+class ExtractionBackend:
+    name = 'base'
+    rate_limited = True  # appel au modèle : quota partagé (seau à jetons) et gemini_usage
+    reports_confidence = False  # confiances calculées (document, lignes) à conserver telles quelles
+
+    @property
+    def version(self):
+        """Identifiant du modèle, utilisé dans la clé du cache d'extraction."""
+        return self.name
+
+    def generate(self, prompt, pdf_part, usage=None):
+        raise NotImplementedError
+
+    def generate_stream(self, prompt, pdf_part, usage=None):
+        """Texte de la réponse par morceaux (un seul par défaut)."""
+        yield self.generate(prompt, pdf_part, usage=usage)
+
+    def upload_file(self, file_path):
+        """Envoi d'un gros fichier hors requête ; None si non supporté (envoi inline)."""
+        return None
+
+    def delete_file(self, remote):
+        pass
+
+
+class GeminiBackend(ExtractionBackend):
+    name = 'gemini'
+
+    def __init__(self, api_key, model_name, record_dir=None):
+        try:
+            import google.generativeai as genai
+        except ImportError:
+            raise RuntimeError("google-generativeai n'est pas installé : backend 'gemini' indisponible")
+        self._genai = genai
+        genai.configure(api_key=api_key)
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+        self.record_dir = record_dir
+        if record_dir:
+            os.makedirs(record_dir, exist_ok=True)
+
+    @property
+    def version(self):
+        return self.model_name
+
+    def generate(self, prompt, pdf_part, usage=None):
+        response = self.model.generate_content([prompt, pdf_part])
+        self._usage(response, usage)
+        text = response.text
+        self._record(pdf_part, text)
+        return text
+
+    def generate_stream(self, prompt, pdf_part, usage=None):
+        parts = []
+        for chunk in self.model.generate_content([prompt, pdf_part], stream=True):
+            self._usage(chunk, usage)  # le dernier morceau porte les totaux
+            try:
+                text = chunk.text
+            except ValueError:  # morceau sans texte (métadonnées de fin, filtre)
+                continue
+            parts.append(text)
+            yield text
+        self._record(pdf_part, ''.join(parts))
+
+    @staticmethod
+    def _usage(response, usage):
+        # usage_metadata n'existe pas dans les anciennes versions du SDK
+        meta = getattr(response, 'usage_metadata', None)
+        if usage is None or meta is None:
+            return
+        usage['prompt_tokens'] = getattr(meta, 'prompt_token_count', 0) or 0
+        usage['output_tokens'] = getattr(meta, 'candidates_token_count', 0) or 0
+
+    def _record(self, pdf_part, text):
+        if self.record_dir and isinstance(pdf_part, dict):
+            # Enregistrement pour le backend replay
+            with open(os.path.join(self.record_dir, f"{pdf_part_hash(pdf_part)}.txt"), 'w', encoding='utf-8') as f:
+                f.write(text)
+
+    def upload_file(self, file_path):
+        upload = getattr(self._genai, 'upload_file', None)
+        if upload is None:  # SDK antérieur à la File API
+            return None
+        return upload(file_path, mime_type="application/pdf")
+
+    def delete_file(self, remote):
+        delete = getattr(self._genai, 'delete_file', None)
+        if delete is None:
+            return
+        try:
+            delete(remote.name)
+        except Exception:
+            pass  # les fichiers distants expirent d'eux-mêmes (48 h)
+
+
+class TextLayerBackend(ExtractionBackend):
+    """Analyse locale uniquement : jamais d'appel réseau, même si la confiance est faible."""
+    name = 'text-layer'
+    rate_limited = False
+    reports_confidence = True
+
+    def generate(self, prompt, pdf_part, usage=None):
+        from pypdf import PdfReader
+        from services.text_layer import extract_text_layer
+        return json.dumps(extract_text_layer(PdfReader(io.BytesIO(pdf_part['data']))))
+
+
+class ReplayBackend(ExtractionBackend):
+    """
+    Rejoue <sha256 du PDF>.txt depuis replay_dir (enregistré par GeminiBackend
+    avec EXTRACTION_RECORD_DIR), sinon default.txt, après latency secondes.
+    Déterministe : même PDF -> même réponse, même délai. Hors quota : un
+    test de charge mesure tout le traitement sauf l'appel au modèle.
+    """
+    name = 'replay'
+    rate_limited = False
+
+    def __init__(self, replay_dir, latency=0.0):
+        self.replay_dir = replay_dir
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _recorded(self, pdf_part):
+        with self._lock:
+            self.calls += 1
+        for name in (f"{pdf_part_hash(pdf_part)}.txt", 'default.txt'):
+            path = os.path.join(self.replay_dir, name)
+            if os.path.exists(path):
+                with open(path, encoding='utf-8') as f:
+                    return f.read()
+        raise FileNotFoundError(f"Aucune réponse enregistrée dans {self.replay_dir}")
+
+    def generate(self, prompt, pdf_part, usage=None):
+        text = self._recorded(pdf_part)
+        if self.latency:
+            time.sleep(self.latency)
+        return text
+
+    def generate_stream(self, prompt, pdf_part, usage=None, pieces=10):
+        # Latence répartie sur les morceaux, comme un modèle qui écrit au fil de l'eau
+        text = self._recorded(pdf_part)
+        size = max(1, -(-len(text) // pieces))
+        for start in range(0, len(text), size):
+            if self.latency:
+                time.sleep(self.latency / pieces)
+            yield text[start:start + size]
+
+
+def create_backend(name=None):
+    name = name or Config.EXTRACTION_BACKEND
+    if name == 'gemini':
+        return GeminiBackend(Config.GEMINI_API_KEY, Config.GEMINI_MODEL, record_dir=Config.EXTRACTION_RECORD_DIR)
+    if name == 'text':
+        return TextLayerBackend()
+    if name == 'replay':
+        return ReplayBackend(Config.EXTRACTION_REPLAY_DIR, latency=Config.EXTRACTION_REPLAY_LATENCY_MS / 1000.0)
+    raise ValueError(f"Backend d'extraction inconnu : {name}")
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_extraction_backend():
+    """Retourne le backend unique du processus (créé au premier appel)."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
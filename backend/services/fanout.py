@@ -0,0 +1,95 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from config import Config
+
+# ---------------------------------------------------------------------------
+# Exécution concurrente bornée
+# - un pool de threads partagé par le processus (taille Config.FANOUT_WORKERS)
+#   réservé aux appels d'E/S courts (API EU, base)
+# - un pool distinct pour les extractions Gemini par page (taille
+#   Config.GEMINI_MAX_CONCURRENCY) : ces tâches attendent le quota pendant
+#   des minutes et ne doivent pas occuper le pool partagé
+# - une limite de requêtes simultanées par hôte distant
+# - run_ordered() : résultats dans l'ordre d'entrée, avec une échéance
+#   globale au-delà de laquelle les éléments restants sont rendus en partiel
+# ---------------------------------------------------------------------------
+
+_executor = None
+_executor_lock = threading.Lock()
+
+_gemini_executor = None
+
+_host_slots = {}
+_host_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=Config.FANOUT_WORKERS,
+                    thread_name_prefix='fanout'
+                )
+    return _executor
+
+
+def get_gemini_executor():
+    global _gemini_executor
+    if _gemini_executor is None:
+        with _executor_lock:
+            if _gemini_executor is None:
+                _gemini_executor = ThreadPoolExecutor(
+                    max_workers=max(1, Config.GEMINI_MAX_CONCURRENCY),
+                    thread_name_prefix='gemini'
+                )
+    return _gemini_executor
+
+
+@contextmanager
+def host_slot(url):
+    """Limite le nombre d'appels simultanés vers un même hôte."""
+    host = urlsplit(url).netloc
+    with _host_lock:
+        sem = _host_slots.get(host)
+        if sem is None:
+            sem = _host_slots[host] = threading.BoundedSemaphore(Config.MAX_CONCURRENCY_PER_HOST)
+    with sem:
+        yield
+
+
+def run_ordered(func, items, deadline=None, on_timeout=None, on_error=None, executor=None):
+    """
+    Applique func à chaque élément en parallèle et retourne
+    (résultats dans l'ordre d'entrée, nombre d'éléments non terminés).
+
+    deadline : instant time.monotonic() limite ; les éléments non terminés
+    sont remplacés par on_timeout(item) (None par défaut).
+    on_error : on_error(item, exc) pour un élément qui a levé une exception.
+    executor : pool à utiliser (pool partagé par défaut).
+    """
+    executor = executor or get_executor()
+    futures = [executor.submit(func, item) for item in items]
+    timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+    wait(futures, timeout=timeout)
+
+    results = []
+    pending = 0
+    for item, future in zip(items, futures):
+        if not future.done():
+            future.cancel()
+            pending += 1
+            results.append(on_timeout(item) if on_timeout else None)
+            continue
+        try:
+            results.append(future.result())
+        except Exception as e:
+            if on_error is None:
+                raise
+            results.append(on_error(item, e))
+    return results, pending
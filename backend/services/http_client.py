@@ -0,0 +1,110 @@
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from config import Config
+from services.fanout import host_slot
+
+# ---------------------------------------------------------------------------
+# Client HTTP de l'API EU Pesticides
+# - session requests partagée (keep-alive : une poignée de main TLS par
+#   connexion du pool au lieu d'une par appel)
+# - timeout par endpoint, nouvelles tentatives avec backoff exponentiel
+#   "full jitter" sur 429/5xx et erreurs réseau (Retry-After respecté)
+# - budget total par appel : tentatives et attentes comprises, un appel ne
+#   dépasse jamais `budget` secondes
+# ---------------------------------------------------------------------------
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class EUApiClient:
+    def __init__(self, headers=None, timeouts=None, default_timeout=30, retries=3,
+                 backoff=0.5, backoff_max=8.0, pool_size=20, budget=None):
+        self.headers = headers or {}
+        self.timeouts = timeouts or {}
+        self.default_timeout = default_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.pool_size = pool_size
+        self.budget = budget
+
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def timeout_for(self, url):
+        """Timeout de l'endpoint (dernier segment du chemin), sinon le défaut."""
+        endpoint = urlsplit(url).path.rstrip('/').rsplit('/', 1)[-1]
+        return self.timeouts.get(endpoint, self.default_timeout)
+
+    def _delay(self, attempt, retry_after=None):
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff * (2 ** attempt)))
+
+    def get(self, url, params=None, headers=None):
+        """
+        GET avec nouvelles tentatives, dans la limite du budget total.
+        Retourne la dernière réponse reçue (éventuellement en erreur) ; lève
+        l'exception requests si aucune tentative n'a abouti.
+        """
+        timeout = self.timeout_for(url)
+        deadline = None if self.budget is None else time.monotonic() + self.budget
+        for attempt in range(self.retries + 1):
+            if deadline is not None:
+                # Chaque tentative est bornée par le temps restant du budget
+                timeout = min(timeout, max(deadline - time.monotonic(), 0.001))
+            last = attempt == self.retries
+            try:
+                with host_slot(url):
+                    resp = self.session.get(url, params=params, headers=headers, timeout=timeout)
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+                delay = self._delay(attempt)
+                if last or not self._has_time(deadline, delay):
+                    raise
+                time.sleep(delay)
+                continue
+            if resp.status_code not in RETRY_STATUSES or last:
+                return resp
+            delay = self._delay(attempt, resp.headers.get('Retry-After'))
+            if not self._has_time(deadline, delay):
+                return resp
+            time.sleep(delay)
+
+    @staticmethod
+    def _has_time(deadline, delay):
+        """Reste-t-il du budget pour attendre `delay` puis retenter ?"""
+        return deadline is None or time.monotonic() + delay < deadline
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_eu_client():
+    """Retourne le client unique du processus (créé au premier appel)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = EUApiClient(
+                    headers={"Accept": "application/json"},
+                    timeouts=Config.EU_API_TIMEOUTS,
+                    default_timeout=Config.EU_API_TIMEOUT,
+                    retries=Config.EU_API_RETRIES,
+                    backoff=Config.EU_API_BACKOFF,
+                    backoff_max=Config.EU_API_BACKOFF_MAX,
+                    pool_size=Config.EU_API_POOL_SIZE,
+                    budget=Config.EU_API_BUDGET,
+                )
+    return _client
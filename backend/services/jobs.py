@@ -0,0 +1,239 @@
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+
+# ---------------------------------------------------------------------------
+# File de traitements en arrière-plan (threads locaux au processus)
+# - submit() rend la main immédiatement ; un nombre fixe de workers dépile
+# - chaque job est réessayé avec backoff exponentiel jusqu'à max_attempts
+# - équité : une file par propriétaire (utilisateur), servies à tour de rôle,
+#   pour qu'un lot de 200 PDF d'un client ne bloque pas les autres
+# - les changements d'état réveillent les abonnés (flux SSE) via une Condition
+# L'état durable (ocr_uploads.processing_status) reste en base : les jobs
+# en mémoire ne servent qu'au suivi fin et au résultat immédiat.
+# ---------------------------------------------------------------------------
+
+PENDING = 'pending'
+PROCESSING = 'processing'
+COMPLETED = 'completed'
+FAILED = 'failed'
+TERMINAL = (COMPLETED, FAILED)
+
+
+class QueueFullError(Exception):
+    pass
+
+
+_current = threading.local()
+
+
+def current_job():
+    """Job en cours d'exécution dans ce thread worker (None ailleurs)."""
+    return getattr(_current, 'job', None)
+
+
+class FairQueue:
+    """
+    File bornée servie en round-robin entre propriétaires : on prend le
+    premier job du propriétaire suivant, puis celui-ci repasse en fin de tour.
+    Même interface que queue.Queue pour ce dont JobQueue a besoin.
+    """
+
+    def __init__(self, maxsize=0):
+        self.maxsize = maxsize
+        self._queues = OrderedDict()  # owner -> deque de jobs
+        self._size = 0
+        self._not_empty = threading.Condition()
+
+    def put_nowait(self, item, owner=None):
+        with self._not_empty:
+            if self.maxsize and self._size >= self.maxsize:
+                raise queue.Full
+            self._queues.setdefault(owner, deque()).append(item)
+            self._size += 1
+            self._not_empty.notify()
+
+    def get(self):
+        with self._not_empty:
+            while not self._size:
+                self._not_empty.wait()
+            owner, items = next(iter(self._queues.items()))
+            item = items.popleft()
+            del self._queues[owner]
+            if items:
+                self._queues[owner] = items  # fin du tour
+            self._size -= 1
+            return item
+
+    def task_done(self):
+        pass
+
+    def qsize(self):
+        with self._not_empty:
+            return self._size
+
+    def owners(self):
+        with self._not_empty:
+            return {str(owner): len(items) for owner, items in self._queues.items()}
+
+
+class Job:
+    def __init__(self, key, args, kwargs, owner=None):
+        self.key = key
+        self.owner = owner
+        self.args = args
+        self.kwargs = kwargs
+        self.status = PENDING
+        self.attempts = 0
+        self.error = None
+        self.result = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.progress = {}
+        self.version = 0
+        self._changed = threading.Condition()
+
+    def _set(self, **fields):
+        with self._changed:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self.version += 1
+            self._changed.notify_all()
+
+    def update_progress(self, **fields):
+        """Avancement publié par le handler (réveille les abonnés SSE)."""
+        with self._changed:
+            self.progress.update(fields)
+            self.version += 1
+            self._changed.notify_all()
+
+    def wait_for_change(self, version, timeout=None):
+        """Bloque jusqu'à ce que version change (ou timeout) ; retourne la version courante."""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout=timeout)
+            return self.version
+
+    def to_dict(self):
+        return {
+            'status': self.status,
+            'attempts': self.attempts,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class JobQueue:
+    def __init__(self, handler, workers=4, max_attempts=3, backoff=2.0, max_pending=1000,
+                 keep_finished=500, name='jobs', on_failure=None):
+        self.handler = handler
+        self.on_failure = on_failure
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.keep_finished = keep_finished
+        self.name = name
+
+        self._queue = FairQueue(maxsize=max_pending)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def submit(self, key, *args, owner=None, **kwargs):
+        """
+        Ajoute un job ; lève QueueFullError si la file est pleine.
+        owner (ex. user_id) : les propriétaires sont servis à tour de rôle.
+        """
+        job = Job(key, args, kwargs, owner=owner)
+        self._start()
+        with self._lock:
+            self._jobs[key] = job
+            self._prune_locked()
+        try:
+            self._queue.put_nowait(job, owner=owner)
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(key, None)
+            raise QueueFullError(f"File '{self.name}' pleine ({self._queue.maxsize} jobs en attente)")
+        return job
+
+    def get(self, key):
+        with self._lock:
+            return self._jobs.get(key)
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        counts = {}
+        for job in jobs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+
+        # Débit sur les jobs terminés encore en mémoire (sert aux tests de charge)
+        done = [j for j in jobs if j.status == COMPLETED and j.started_at and j.finished_at]
+        throughput = {}
+        if done:
+            durations = sorted(j.finished_at - j.started_at for j in done)
+            span = max(j.finished_at for j in done) - min(j.created_at for j in done)
+            throughput = {
+                'completed': len(done),
+                'duration_avg': round(sum(durations) / len(durations), 4),
+                'duration_p95': round(durations[min(len(durations) - 1, int(len(durations) * 0.95))], 4),
+                'jobs_per_second': round(len(done) / span, 2) if span > 0 else None,
+            }
+        return {'workers': self.workers, 'queued': self._queue.qsize(), 'queued_by_owner': self._queue.owners(),
+                'jobs': counts, 'throughput': throughput}
+
+    # -----------------------------------------------------------------------
+    # Workers
+    # -----------------------------------------------------------------------
+
+    def _start(self):
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._work, name=f"{self.name}-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            _current.job = job
+            try:
+                self._run(job)
+            finally:
+                _current.job = None
+                self._queue.task_done()
+
+    def _run(self, job):
+        job._set(status=PROCESSING, started_at=time.time())
+        while True:
+            job._set(attempts=job.attempts + 1)
+            try:
+                result = self.handler(*job.args, **job.kwargs)
+                job._set(status=COMPLETED, result=result, error=None, finished_at=time.time())
+                return
+            except Exception as e:
+                if job.attempts >= self.max_attempts:
+                    job._set(status=FAILED, error=str(e), finished_at=time.time())
+                    if self.on_failure is not None:
+                        try:
+                            self.on_failure(*job.args, error=str(e), **job.kwargs)
+                        except Exception:
+                            pass
+                    return
+                job._set(error=str(e))
+                time.sleep(self.backoff * (2 ** (job.attempts - 1)))
+
+    def _prune_locked(self):
+        finished = [j for j in self._jobs.values() if j.status in TERMINAL]
+        excess = len(finished) - self.keep_finished
+        if excess > 0:
+            for job in sorted(finished, key=lambda j: j.finished_at or 0)[:excess]:
+                self._jobs.pop(job.key, None)
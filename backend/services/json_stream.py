@@ -0,0 +1,279 @@
+import json
+import re
+import time
+from datetime import date
+
+from werkzeug.http import http_date
+
+# ---------------------------------------------------------------------------
+# Analyse incrémentale et tolérante de la réponse JSON d'extraction
+# La réponse arrive par morceaux (generate_content(stream=True)) :
+#   { "metadata": {...}, "results": [ {...}, {...}, ... ] }
+# Chaque ligne de "results" est émise dès que son objet est fermé, sans
+# attendre la fin du document. Si la réponse est tronquée (limite de
+# tokens) ou entourée de prose / ```json, toutes les lignes complètes
+# sont quand même récupérées. Le document est le premier objet d'un bloc
+# ``` s'il y en a un, sinon le premier objet portant metadata / results.
+# ---------------------------------------------------------------------------
+
+_STRING_RE = re.compile(r'"(?:[^"\\]|\\.)*"', re.DOTALL)
+_TRAILING_COMMA_RE = re.compile(r',\s*([}\]])')
+_BARE_CONSTANTS_RE = re.compile(r'\b(NaN|-?Infinity|None)\b')
+
+
+def _repair(segment):
+    segment = _TRAILING_COMMA_RE.sub(r'\1', segment)
+    return _BARE_CONSTANTS_RE.sub('null', segment)
+
+
+def loads_lenient(text):
+    """
+    json.loads, puis une seconde chance (virgules finales, NaN, None).
+    Les corrections ne portent que sur le texte hors chaînes : une valeur
+    comme "None détecté" ou "NaN" dans une note reste intacte.
+    """
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        parts = []
+        pos = 0
+        for match in _STRING_RE.finditer(text):
+            parts.append(_repair(text[pos:match.start()]))
+            parts.append(match.group(0))
+            pos = match.end()
+        parts.append(_repair(text[pos:]))
+        return json.loads(''.join(parts))
+
+
+class IncrementalExtractionParser:
+    def __init__(self, on_row=None):
+        self.on_row = on_row
+        self.metadata = None
+        self.rows = []
+
+        self._chunks = []       # texte reçu, joint une seule fois dans close()
+        self._pos = 0           # caractères déjà analysés (position absolue)
+        self._window = ''       # texte à partir de _window_start, gardé tant
+        self._window_start = 0  # qu'un objet ou une clé est en cours de lecture
+        self._fenced = False    # bloc ``` ouvert avant le document
+        self._reset()
+
+        self._started_at = time.monotonic()
+        self.stats = {
+            'chunks': 0,
+            'chars': 0,
+            'rows': 0,
+            'rows_rejected': 0,
+            'prefix_skipped': 0,
+            'truncated': False,
+            'complete': False,
+            'time_to_first_row': None,
+        }
+
+    def _reset(self):
+        """Reprend la recherche du document (objet de la prose abandonné)."""
+        self._start = None      # début du document (premier '{' retenu)
+        self._end = None
+        self._capture = None    # début de l'objet metadata / ligne en cours
+        self._key_start = None  # début de la chaîne en cours au niveau 1
+        self._stack = []        # '{' / '['
+        self._in_string = False
+        self._escape = False
+        self._last_key = None   # dernière chaîne vue au niveau 1 (= clé)
+        self._keys = set()      # clés du niveau 1
+        self._value_key = {}    # profondeur -> clé du conteneur ouvert au niveau 1
+        self._open_at = {}      # profondeur -> position d'ouverture
+        self._closed = False
+
+    def _slice(self, start, end):
+        return self._window[start - self._window_start:end - self._window_start]
+
+    # -----------------------------------------------------------------------
+    # Alimentation
+    # -----------------------------------------------------------------------
+
+    def feed(self, chunk):
+        """
+        Ajoute un morceau de texte ; retourne les lignes complétées par ce
+        morceau. Seul le nouveau morceau est analysé, et seul le texte de
+        l'objet en cours est conservé pour le découper : coût linéaire sur
+        toute la réponse.
+        """
+        if not chunk:
+            return []
+        self.stats['chunks'] += 1
+        self.stats['chars'] += len(chunk)
+        self._chunks.append(chunk)
+        base = self._pos
+        self._window += chunk
+
+        emitted = []
+        for offset, c in enumerate(chunk):
+            if self._closed:
+                break
+            i = base + offset
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._key_start is not None:
+                        self._last_key = self._slice(self._key_start + 1, i)
+                        self._keys.add(self._last_key)
+                        self._key_start = None
+            elif c == '`':
+                # Bloc ```json : le document est le premier objet à
+                # l'intérieur ; un '{' ouvert dans la prose avant est abandonné
+                if not self._fenced:
+                    self._fenced = True
+                    self._reset()
+            elif self._start is None:
+                if c == '{':
+                    self._start = i
+                    self.stats['prefix_skipped'] = i
+                    self._open(i, '{')
+            elif c == '"':
+                self._in_string = True
+                if len(self._stack) == 1:
+                    self._key_start = i
+            elif c in '{[':
+                self._open(i, c)
+            elif c in '}]':
+                row = self._close(i)
+                if row is not None:
+                    emitted.append(row)
+        self._pos = base + len(chunk)
+        self._trim()
+        return emitted
+
+    def _trim(self):
+        # Texte plus utile : rien en cours de lecture
+        keep = min((p for p in (self._capture, self._key_start) if p is not None), default=self._pos)
+        if keep > self._window_start:
+            self._window = self._window[keep - self._window_start:]
+            self._window_start = keep
+
+    def _open(self, i, c):
+        self._stack.append(c)
+        depth = len(self._stack)
+        self._open_at[depth] = i
+        if depth == 2:
+            self._value_key[depth] = self._last_key
+        if c == '{' and ((depth == 2 and self._last_key == 'metadata')
+                         or (depth == 3 and self._value_key.get(2) == 'results')):
+            self._capture = i
+
+    def _close(self, i):
+        depth = len(self._stack)
+        if not depth:
+            return None
+        self._stack.pop()
+        if depth == 1:
+            if not self._keys & {'metadata', 'results'}:
+                self._reset()  # "{...}" dans la prose : pas le document
+                return None
+            self._closed = True
+            self._end = i + 1
+            return None
+
+        key = self._value_key.get(2)
+        start = self._open_at[depth]
+        if start != self._capture:
+            return None
+        self._capture = None
+        if depth == 2 and key == 'metadata':
+            try:
+                self.metadata = loads_lenient(self._slice(start, i + 1))
+            except json.JSONDecodeError:
+                self.metadata = None
+        elif depth == 3 and key == 'results':
+            try:
+                row = loads_lenient(self._slice(start, i + 1))
+            except json.JSONDecodeError:
+                self.stats['rows_rejected'] += 1
+                return None
+            self.rows.append(row)
+            self.stats['rows'] += 1
+            if self.stats['time_to_first_row'] is None:
+                self.stats['time_to_first_row'] = round(time.monotonic() - self._started_at, 4)
+            if self.on_row is not None:
+                self.on_row(row)
+            return row
+        return None
+
+    # -----------------------------------------------------------------------
+    # Fin du flux
+    # -----------------------------------------------------------------------
+
+    def close(self):
+        """
+        Document final { metadata, results, ... } : le JSON complet s'il est
+        valide, sinon ce qui a pu être récupéré (stats['truncated'] = True).
+        Lève json.JSONDecodeError si rien n'est exploitable.
+        """
+        text = ''.join(self._chunks)
+        self.stats['elapsed'] = round(time.monotonic() - self._started_at, 4)
+
+        if self._closed:
+            try:
+                document = loads_lenient(text[self._start:self._end])
+                self.stats['complete'] = True
+                return document
+            except json.JSONDecodeError:
+                pass
+
+        if self.metadata is None and not self.rows:
+            raise json.JSONDecodeError("Aucun objet JSON exploitable dans la réponse", text, self._start or 0)
+
+        self.stats['truncated'] = True
+        return {'metadata': self.metadata or {}, 'results': list(self.rows)}
+
+
+# ---------------------------------------------------------------------------
+# Écriture incrémentale
+# Réponse JSON produite au fil de la lecture des lignes, par morceaux d'au
+# moins flush_size caractères : jamais de liste complète ni de document
+# entier en mémoire.
+# ---------------------------------------------------------------------------
+
+def _json_default(value):
+    # Même rendu que jsonify de Flask (dates HTTP, Decimal en texte)
+    if isinstance(value, date):
+        return http_date(value)
+    return str(value)
+
+
+def iter_json_object(fields, flush_size=65536):
+    """
+    Dict (ordonné) -> morceaux de texte JSON. Une valeur itérable (hors
+    dict / list / str) est écrite comme un tableau élément par élément ; une
+    valeur appelable est évaluée à son tour, après les champs précédents
+    (ex. curseur de page suivante connu seulement à la fin du tableau).
+    """
+    encode = json.JSONEncoder(default=_json_default, ensure_ascii=False, separators=(',', ':')).encode
+    buf = []
+    size = 0
+    buf.append('{')
+    for i, (key, value) in enumerate(fields.items()):
+        buf.append(('' if i == 0 else ',') + encode(key) + ':')
+        if callable(value):
+            value = value()
+        if isinstance(value, (dict, list, tuple, str, bytes)) or not hasattr(value, '__iter__'):
+            buf.append(encode(value))
+            continue
+        buf.append('[')
+        first = True
+        for item in value:
+            part = encode(item)
+            buf.append(part if first else ',' + part)
+            first = False
+            size += len(part) + 1
+            if size >= flush_size:
+                yield ''.join(buf)
+                buf = []
+                size = 0
+        buf.append(']')
+    buf.append('}')
+    yield ''.join(buf)
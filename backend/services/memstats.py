@@ -0,0 +1,59 @@
+import sys
+
+try:
+    import resource
+except ImportError:  # Windows (XAMPP) : pas de getrusage
+    resource = None
+
+# ---------------------------------------------------------------------------
+# Mémoire résidente du processus (RSS)
+# Lue dans /proc/self/statm sous Linux ; ailleurs seul le pic
+# (getrusage) est disponible, et rien sous Windows (mesures à None).
+# ---------------------------------------------------------------------------
+
+try:
+    _PAGE_SIZE = resource.getpagesize()
+except Exception:
+    _PAGE_SIZE = 4096
+
+
+def rss_bytes():
+    """RSS courant en octets (None si indisponible)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss_bytes():
+    """Pic de RSS du processus depuis son démarrage, en octets (None si indisponible)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss est en Ko sous Linux, en octets sous macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class RssTracker:
+    """
+    Mesure autour d'un traitement : RSS au début, à la fin, et pic du
+    processus (le pic est global : avec des uploads concurrents il majore
+    la consommation d'un upload isolé).
+    """
+
+    def __init__(self):
+        self.start = rss_bytes()
+        self.peak_start = peak_rss_bytes()
+
+    def report(self):
+        end = rss_bytes()
+        peak = peak_rss_bytes()
+        mb = lambda v: round(v / (1024 * 1024), 2) if v is not None else None
+        return {
+            'rss_start_mb': mb(self.start),
+            'rss_end_mb': mb(end),
+            'rss_delta_mb': mb(end - self.start) if end is not None and self.start is not None else None,
+            'peak_rss_mb': mb(peak),
+            'peak_rss_grew_mb': mb(peak - self.peak_start) if peak is not None and self.peak_start is not None else None,
+        }
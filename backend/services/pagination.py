@@ -0,0 +1,104 @@
+import base64
+import json
+from datetime import datetime
+
+from config import Config
+from services.db_pool import stream_query
+
+# ---------------------------------------------------------------------------
+# Pagination par clé (keyset) pour les historiques utilisateur
+# Les pages sont triées par (date DESC, id DESC) ; le curseur opaque encode
+# la dernière paire (date, id) renvoyée. La page suivante reprend par
+#   WHERE user_id = ? AND (date < ? OR (date = ? AND id < ?))
+# ce qui descend directement dans l'index (user_id, date) au lieu de trier
+# ou de sauter OFFSET lignes, quelle que soit la profondeur de la page.
+# ---------------------------------------------------------------------------
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def clamp_limit(limit, default=None, maximum=None):
+    """Taille de page demandée -> [1, maximum (Config.HISTORY_PAGE_MAX par défaut)]."""
+    if limit is None:
+        limit = default or Config.HISTORY_PAGE_DEFAULT
+    return max(1, min(int(limit), maximum or Config.HISTORY_PAGE_MAX))
+
+
+def encode_cursor(sort_value, row_id):
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat(sep=' ')
+    raw = json.dumps([sort_value, row_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Curseur -> (date, id) ; InvalidCursorError si le curseur est illisible."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        sort_value, row_id = json.loads(raw)
+        return datetime.fromisoformat(sort_value), int(row_id)
+    except (ValueError, TypeError):
+        raise InvalidCursorError('Curseur de pagination invalide')
+
+
+def keyset_page(cursor, query, params, limit, sort_key, id_key='id'):
+    """
+    Exécute `query` (qui doit se terminer par LIMIT %s) avec limit + 1 lignes
+    pour savoir s'il reste une page ; retourne (lignes, curseur suivant ou None).
+    """
+    cursor.execute(query, tuple(params) + (limit + 1,))
+    rows = cursor.fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last[sort_key], last[id_key])
+    return rows, next_cursor
+
+
+def keyset_clause(sort_column, id_column, after):
+    """Condition SQL et paramètres pour reprendre après le curseur (ou rien)."""
+    if after is None:
+        return '', ()
+    sort_value, row_id = after
+    # Forme développée plutôt que (a, b) < (x, y) : utilisée en range par
+    # MySQL comme par MariaDB
+    return (f" AND ({sort_column} < %s OR ({sort_column} = %s AND {id_column} < %s))",
+            (sort_value, sort_value, row_id))
+
+
+class KeysetStream:
+    """
+    Page d'historique lue en flux (services.db_pool.stream_query) : itérable
+    de dicts, sans fetchall ni conversion après coup. La requête part dès la
+    construction (les erreurs SQL remontent avant le début de la réponse) ;
+    next_cursor est connu une fois l'itération terminée.
+    """
+
+    def __init__(self, query, params, limit, sort_key, id_key='id'):
+        self.limit = limit
+        self.next_cursor = None
+        self._batches = stream_query(query, tuple(params) + (limit + 1,))
+        self.columns = next(self._batches)
+        self._sort_index = self.columns.index(sort_key)
+        self._id_index = self.columns.index(id_key)
+
+    def __iter__(self):
+        columns = self.columns
+        count = 0
+        last = None
+        for batch in self._batches:
+            for row in batch:
+                if count == self.limit:
+                    # ligne limit + 1 : il reste une page (lue jusqu'au bout
+                    # pour rendre la connexion au pool plutôt que la fermer)
+                    self.next_cursor = encode_cursor(last[self._sort_index], last[self._id_index])
+                    continue
+                count += 1
+                last = row
+                yield dict(zip(columns, row))
+
+    def close(self):
+        self._batches.close()
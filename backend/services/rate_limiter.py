@@ -0,0 +1,112 @@
+import os
+import sqlite3
+import threading
+import time
+
+from config import Config
+
+# ---------------------------------------------------------------------------
+# Seau à jetons partagé entre processus (SQLite)
+# Tous les workers (gunicorn, scripts) du même hôte lisent et débitent le
+# même seau dans une transaction BEGIN IMMEDIATE : le débit global vers
+# Gemini reste sous le quota, quel que soit le nombre de processus.
+# ---------------------------------------------------------------------------
+
+
+class RateLimitTimeout(Exception):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, path, name, rate_per_minute, burst=None):
+        self.path = path
+        self.name = name
+        self.rate = rate_per_minute / 60.0  # jetons par seconde
+        self.burst = float(burst or max(1, rate_per_minute))
+
+        self._lock = threading.Lock()
+        self._stats = {'acquired': 0, 'waited': 0, 'wait_time_total': 0.0, 'timeouts': 0}
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS token_buckets (
+                   name       TEXT PRIMARY KEY,
+                   tokens     REAL NOT NULL,
+                   updated_at REAL NOT NULL
+               )"""
+        )
+
+    def _try_take(self, cost):
+        """Prend `cost` jetons si possible ; sinon retourne l'attente estimée (s)."""
+        with self._lock:
+            db = self._db
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = db.execute(
+                    "SELECT tokens, updated_at FROM token_buckets WHERE name=?", (self.name,)
+                ).fetchone()
+                tokens = self.burst if row is None else min(self.burst, row[0] + (now - row[1]) * self.rate)
+                if tokens >= cost:
+                    tokens -= cost
+                    wait = 0.0
+                else:
+                    wait = (cost - tokens) / self.rate if self.rate > 0 else float('inf')
+                db.execute(
+                    "INSERT OR REPLACE INTO token_buckets (name, tokens, updated_at) VALUES (?, ?, ?)",
+                    (self.name, tokens, now)
+                )
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+        return wait
+
+    def acquire(self, cost=1, timeout=None):
+        """
+        Bloque jusqu'à obtenir `cost` jetons ; retourne le temps attendu (s).
+        Lève RateLimitTimeout au-delà de `timeout` secondes.
+        """
+        start = time.monotonic()
+        while True:
+            wait = self._try_take(cost)
+            if wait == 0.0:
+                waited = time.monotonic() - start
+                with self._lock:
+                    self._stats['acquired'] += 1
+                    if waited > 0:
+                        self._stats['waited'] += 1
+                        self._stats['wait_time_total'] += waited
+                return waited
+            if timeout is not None and time.monotonic() - start + wait > timeout:
+                with self._lock:
+                    self._stats['timeouts'] += 1
+                raise RateLimitTimeout(f"Quota '{self.name}' : pas de jeton disponible avant {timeout}s")
+            # petit aléa pour que les processus en attente ne se réveillent pas ensemble
+            time.sleep(min(wait, 1.0) + 0.01 * (os.getpid() % 7))
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['rate_per_minute'] = round(self.rate * 60, 3)
+        stats['burst'] = self.burst
+        return stats
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_gemini_bucket():
+    """Seau du quota Gemini (unique par processus, état partagé via SQLite)."""
+    with _buckets_lock:
+        bucket = _buckets.get('gemini')
+        if bucket is None:
+            bucket = _buckets['gemini'] = TokenBucket(
+                Config.RATE_LIMIT_PATH, 'gemini',
+                rate_per_minute=Config.GEMINI_RATE_PER_MINUTE,
+                burst=Config.GEMINI_RATE_BURST,
+            )
+        return bucket
@@ -0,0 +1,312 @@
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+from config import Config
+from services.http_client import get_eu_client
+from services.residue_index import ResidueIndex
+
+# ---------------------------------------------------------------------------
+# Chargement du catalogue complet des résidus
+# - pages récupérées en parallèle quand l'API pagine par $skip
+# - chaque page est réessayée individuellement par le client HTTP (une page
+#   en erreur ne fait plus perdre les pages déjà téléchargées)
+# - le catalogue complet est sauvegardé dans un snapshot gzip local pour
+#   qu'un redémarrage à chaud le recharge en quelques millisecondes
+# - ResidueCatalogue garde en mémoire un catalogue (et son index) par langue,
+#   avec TTL et chargement "single-flight" : les appels concurrents attendent
+#   un seul téléchargement au lieu d'en lancer chacun un ; seules les langues
+#   autorisées sont chargées, et un échec n'est pas retenté avant retry_after
+# ---------------------------------------------------------------------------
+
+
+class CatalogueLoadError(Exception):
+    pass
+
+
+class UnsupportedLanguageError(CatalogueLoadError):
+    pass
+
+
+class ResidueCatalogueLoader:
+    def __init__(self, base_url, version, headers, snapshot_dir=None,
+                 page_size=1000, workers=4, client=None):
+        self.api_configs = [
+            {"url": f"{base_url}/pesticide-residues", "version": version},
+            {"url": f"{base_url}/pesticide_residues", "version": "v1.0"},
+        ]
+        self.headers = headers
+        self.snapshot_dir = snapshot_dir or Config.CATALOGUE_SNAPSHOT_DIR
+        self.page_size = page_size
+        self.workers = workers
+        self.client = client or get_eu_client()
+
+    # -----------------------------------------------------------------------
+    # Snapshot local
+    # -----------------------------------------------------------------------
+
+    def snapshot_path(self, language):
+        return os.path.join(self.snapshot_dir, f"residues_{language.upper()}.json.gz")
+
+    def load_snapshot(self, language):
+        """Retourne (résidus, date de sauvegarde) ou (None, None)."""
+        path = self.snapshot_path(language)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                snap = json.load(f)
+            return snap['residues'], snap['saved_at']
+        except (OSError, ValueError, KeyError):
+            return None, None
+
+    def save_snapshot(self, language, residues):
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        path = self.snapshot_path(language)
+        tmp = path + '.tmp'
+        with gzip.open(tmp, 'wt', encoding='utf-8', compresslevel=6) as f:
+            json.dump({'saved_at': time.time(), 'residues': residues}, f, separators=(',', ':'))
+        os.replace(tmp, path)
+
+    # -----------------------------------------------------------------------
+    # Téléchargement
+    # -----------------------------------------------------------------------
+
+    def load(self, language="EN", use_snapshot=True, max_age=None):
+        """Snapshot local si présent (et plus récent que max_age), sinon téléchargement
+        complet (puis snapshot). use_snapshot=False force le téléchargement ; le snapshot
+        reste le repli en cas d'échec."""
+        snapshot, saved_at = self.load_snapshot(language)
+        fresh = max_age is None or (saved_at is not None and time.time() - saved_at <= max_age)
+        if use_snapshot and snapshot and fresh:
+            return snapshot
+        try:
+            residues = self.download(language)
+        except CatalogueLoadError:
+            # API indisponible : un snapshot ancien vaut mieux que rien
+            if snapshot:
+                return snapshot
+            raise
+        self.save_snapshot(language, residues)
+        return residues
+
+    def download(self, language="EN"):
+        """Télécharge tout le catalogue ; lève CatalogueLoadError si aucune source ne répond."""
+        errors = []
+        for cfg in self.api_configs:
+            try:
+                residues = self._download_from(cfg, language)
+            except CatalogueLoadError as e:
+                errors.append(str(e))
+                continue
+            if residues:
+                return residues
+        raise CatalogueLoadError("; ".join(errors) or "Catalogue vide")
+
+    def _download_from(self, cfg, language):
+        params = {"language": language, "format": "json", "api-version": cfg["version"]}
+        residues = []
+        for items in self.iter_pages(cfg["url"], params):
+            residues.extend(items)
+        return residues
+
+    def iter_pages(self, url, params):
+        """
+        Parcourt toutes les pages d'un endpoint, dans l'ordre.
+        Les pages sont prérécupérées en parallèle quand l'API pagine par $skip ;
+        lève CatalogueLoadError si une page échoue malgré les nouvelles tentatives.
+        """
+        params = dict(params, **{"$top": self.page_size})
+        items, next_link = self._fetch_page(url, params)
+        yield items
+        if not next_link or not items:
+            return
+
+        skip_param = self._skip_param(next_link)
+        if skip_param is None:
+            # Pagination par jeton opaque : il faut suivre les liens un par un
+            while next_link:
+                items, next_link = self._fetch_page(next_link, {})
+                yield items
+            return
+
+        page = len(items)
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='catalogue') as pool:
+            start = 1
+            while True:
+                # Fenêtre de pages spéculatives, arrêtée à la première page incomplète
+                window = range(start, start + self.workers)
+                futures = [
+                    pool.submit(self._fetch_page, url, dict(params, **{skip_param: n * page}))
+                    for n in window
+                ]
+                for future in futures:
+                    page_items, _ = future.result()
+                    yield page_items
+                    if len(page_items) < page:
+                        for f in futures:
+                            f.cancel()
+                        return
+                start += self.workers
+
+    def _fetch_page(self, url, params):
+        """Une page (le client réessaie 429/5xx et erreurs réseau) : (items, lien suivant)."""
+        try:
+            resp = self.client.get(url, params=params, headers=self.headers)
+            if resp.status_code != 200:
+                raise CatalogueLoadError(f"{url}: HTTP {resp.status_code}")
+            data = resp.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            raise CatalogueLoadError(f"{url}: {e}")
+        if isinstance(data, list):
+            return data, None
+        items = data.get("value") or data.get("items") or data.get("results") or []
+        return items, data.get("@odata.nextLink") or data.get("nextLink")
+
+    @staticmethod
+    def _skip_param(next_link):
+        query = parse_qs(urlsplit(next_link).query)
+        for name in ("$skip", "skip"):
+            if name in query:
+                return name
+        return None
+
+
+class CatalogueEntry:
+    def __init__(self, language, residues):
+        self.language = language
+        self.residues = residues
+        self.index = ResidueIndex(residues)
+        self.loaded_at = time.time()
+        self.approx_bytes = _approx_size(residues)
+
+
+class _Flight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.entry = None
+        self.error = None
+
+
+class ResidueCatalogue:
+    def __init__(self, loader, ttl=86400, languages=None, retry_after=60):
+        self.loader = loader
+        self.ttl = ttl
+        # None = toutes les langues ; sinon une entrée et un téléchargement
+        # au plus par langue de la liste, quoi que contienne la requête
+        self.languages = frozenset(l.upper() for l in languages) if languages else None
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._inflight = {}
+        self._failures = {}  # langue -> (instant de l'échec, erreur)
+
+    def check_language(self, language):
+        """Code langue normalisé ; UnsupportedLanguageError s'il n'est pas autorisé."""
+        lang = str(language or '').strip().upper()
+        if not lang or (self.languages is not None and lang not in self.languages):
+            raise UnsupportedLanguageError(f"Langue non prise en charge : {language!r}")
+        return lang
+
+    def get(self, language="EN"):
+        """Catalogue d'une langue ; lève CatalogueLoadError si rien n'est disponible."""
+        lang = self.check_language(language)
+        entry = self._entries.get(lang)
+        if entry is None:
+            self._raise_recent_failure(lang)
+            return self._load(lang, force=False)
+        if time.time() - entry.loaded_at > self.ttl and lang not in self._inflight \
+                and not self._recent_failure(lang):
+            # Périmé : on sert l'ancien pendant qu'un seul thread recharge
+            threading.Thread(target=self._refresh_quietly, args=(lang,), daemon=True).start()
+        return entry
+
+    def refresh(self, language="EN"):
+        """Force un nouveau téléchargement (endpoint admin), même juste après un échec."""
+        return self._load(self.check_language(language), force=True)
+
+    def _recent_failure(self, lang):
+        failure = self._failures.get(lang)
+        if failure and time.monotonic() - failure[0] < self.retry_after:
+            return failure
+        return None
+
+    def _raise_recent_failure(self, lang):
+        # Panne de l'API : les requêtes suivantes échouent tout de suite au
+        # lieu d'attendre chacune un téléchargement et ses nouvelles tentatives
+        failure = self._recent_failure(lang)
+        if failure:
+            raise CatalogueLoadError(f"{failure[1]} (nouvel essai dans {self.retry_after}s au plus)")
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            entries = list(self._entries.values())
+            loading = sorted(self._inflight)
+        languages = {
+            e.language: {
+                'residues': len(e.residues),
+                'approx_bytes': e.approx_bytes,
+                'loaded_at': e.loaded_at,
+                'age_seconds': round(now - e.loaded_at, 1),
+                'expired': now - e.loaded_at > self.ttl
+            }
+            for e in entries
+        }
+        return {
+            'languages': languages,
+            'loading': loading,
+            'total_approx_bytes': sum(e.approx_bytes for e in entries),
+            'failed': sorted(lang for lang in list(self._failures) if self._recent_failure(lang)),
+            'ttl': self.ttl
+        }
+
+    def _refresh_quietly(self, lang):
+        try:
+            self._load(lang, force=True)
+        except Exception:
+            pass
+
+    def _load(self, lang, force):
+        with self._lock:
+            flight = self._inflight.get(lang)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[lang] = _Flight()
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.entry
+
+        try:
+            residues = self.loader.load(lang, use_snapshot=not force, max_age=self.ttl)
+            flight.entry = CatalogueEntry(lang, residues)
+            with self._lock:
+                self._entries[lang] = flight.entry
+                self._failures.pop(lang, None)
+            return flight.entry
+        except Exception as e:
+            flight.error = e
+            with self._lock:
+                self._failures[lang] = (time.monotonic(), e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(lang, None)
+            flight.event.set()
+
+
+def _approx_size(residues):
+    """Estimation de l'empreinte mémoire du catalogue (octets)."""
+    total = sys.getsizeof(residues)
+    for item in residues:
+        total += sys.getsizeof(item)
+        for k, v in item.items():
+            total += sys.getsizeof(k) + sys.getsizeof(v)
+    return total
@@ -0,0 +1,152 @@
+import bisect
+from collections import defaultdict
+
+# ---------------------------------------------------------------------------
+# Index des noms de résidus (construit une fois au chargement du catalogue)
+# - table de hachage pour la correspondance exacte
+# - tableau trié + bisect pour la recherche par préfixe
+# - index de trigrammes pour les sous-chaînes et la tolérance aux fautes
+# search() retourne des candidats classés avec un score entre 0 et 1 ;
+# best() n'accepte que les correspondances exactes, préfixes ou sous-chaînes.
+# ---------------------------------------------------------------------------
+
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.8
+SUBSTRING_SCORE = 0.6
+FUZZY_SCORE = 0.55
+FUZZY_MIN_SIMILARITY = 0.45
+
+
+def normalize_name(name):
+    return (name or '').lower().strip()
+
+
+def residue_name(item):
+    return item.get("pesticide_residue_name") or item.get("PESTICIDE_RESIDUE_NAME") or ""
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class ResidueIndex:
+    def __init__(self, residues):
+        self.residues = residues
+        self.names = [normalize_name(residue_name(item)) for item in residues]
+
+        self._exact = {}
+        for idx, name in enumerate(self.names):
+            if name:
+                self._exact.setdefault(name, []).append(idx)
+
+        self._sorted = sorted((name, idx) for idx, name in enumerate(self.names) if name)
+        self._sorted_names = [name for name, _ in self._sorted]
+
+        # Trigrammes des noms bordés d'espaces : les débuts/fins de mots comptent
+        self._grams = defaultdict(set)
+        self._gram_counts = []
+        for idx, name in enumerate(self.names):
+            grams = _trigrams(f"  {name} ")
+            self._gram_counts.append(len(grams))
+            for g in grams:
+                self._grams[g].add(idx)
+
+    def __len__(self):
+        return len(self.residues)
+
+    # -----------------------------------------------------------------------
+    # Recherche
+    # -----------------------------------------------------------------------
+
+    def search(self, query, limit=10, min_score=0.0):
+        """
+        Candidats classés : [{ 'residue', 'name', 'score', 'match' }, ...]
+        match ∈ exact | prefix | substring | fuzzy
+        """
+        q = normalize_name(query)
+        if not q:
+            return []
+
+        scored = {}
+
+        def offer(idx, score, match):
+            if idx not in scored or score > scored[idx][0]:
+                scored[idx] = (score, match)
+
+        for idx in self._exact.get(q, []):
+            offer(idx, EXACT_SCORE, 'exact')
+
+        for idx in self._prefix_matches(q):
+            if idx not in scored:
+                offer(idx, PREFIX_SCORE + 0.19 * len(q) / len(self.names[idx]), 'prefix')
+
+        for idx in self._substring_matches(q):
+            if idx not in scored:
+                offer(idx, SUBSTRING_SCORE + 0.19 * len(q) / len(self.names[idx]), 'substring')
+
+        for idx, similarity in self._fuzzy_matches(q):
+            offer(idx, FUZZY_SCORE * similarity, 'fuzzy')
+
+        ranked = sorted(scored.items(), key=lambda kv: (-kv[1][0], kv[0]))
+        out = []
+        for idx, (score, match) in ranked:
+            if score < min_score:
+                break
+            out.append({
+                'residue': self.residues[idx],
+                'name': residue_name(self.residues[idx]),
+                'score': round(score, 4),
+                'match': match
+            })
+            if len(out) >= limit:
+                break
+        return out
+
+    def best(self, query):
+        """
+        Meilleur candidat (ou None) — exact, puis préfixe, puis sous-chaîne.
+        Jamais une correspondance approchée : "Deltamethrin" ressemble à
+        "Permethrin" mais n'a pas la même LMR. Les candidats approchés ne sont
+        proposés que par search() (find_residue_candidates), pour choix manuel.
+        """
+        hits = self.search(query, limit=1)
+        if not hits or hits[0]['match'] == 'fuzzy':
+            return None
+        return hits[0]['residue']
+
+    # -----------------------------------------------------------------------
+    # Helpers
+    # -----------------------------------------------------------------------
+
+    def _prefix_matches(self, q):
+        start = bisect.bisect_left(self._sorted_names, q)
+        for pos in range(start, len(self._sorted)):
+            name, idx = self._sorted[pos]
+            if not name.startswith(q):
+                break
+            yield idx
+
+    def _substring_matches(self, q):
+        grams = _trigrams(q)
+        if not grams:
+            # Requête trop courte pour l'index : parcours direct
+            return [idx for idx, name in enumerate(self.names) if q in name]
+        postings = sorted((self._grams.get(g, set()) for g in grams), key=len)
+        candidates = set(postings[0])
+        for p in postings[1:]:
+            candidates &= p
+            if not candidates:
+                return []
+        return [idx for idx in candidates if q in self.names[idx]]
+
+    def _fuzzy_matches(self, q):
+        grams = _trigrams(f"  {q} ")
+        shared = defaultdict(int)
+        for g in grams:
+            for idx in self._grams.get(g, ()):
+                shared[idx] += 1
+        for idx, n in shared.items():
+            # Coefficient de Dice sur les trigrammes
+            similarity = 2.0 * n / (len(grams) + self._gram_counts[idx])
+            if similarity >= FUZZY_MIN_SIMILARITY:
+                yield idx, similarity
@@ -0,0 +1,198 @@
+import re
+
+from services.units import cell_unit, parse_value
+
+# ---------------------------------------------------------------------------
+# Extraction locale depuis la couche texte d'un PDF
+# Les bulletins générés numériquement (LaTeX, Word, LIMS...) contiennent le
+# texte : en-tête "Libellé : valeur" puis un tableau Substance / Résultat /
+# LOQ / LMR / Unité. On le lit directement (quelques ms, hors ligne) et on
+# retourne le même format que GeminiModel._normalize_extraction, avec une
+# confiance qui décide si Gemini doit quand même être appelé.
+# ---------------------------------------------------------------------------
+
+UNIT = r'(?:mg\s*/\s*kg|[µμu]g\s*/\s*kg|mg\s*kg-1|ppm|ppb)'
+VALUE = (
+    r'(?:<\s*(?:LOQ|LQ|LOD|LD)\b'
+    r'|<\s*\d+(?:[.,]\d+)?'
+    r'|n\.?\s?d\.?(?=\s|$)'
+    r'|non\s+d[ée]tect[ée]e?'
+    r'|not\s+detected'
+    r'|\d+(?:[.,]\d+)?\*?)'
+)
+
+_ROW_RE = re.compile(
+    rf'^(?P<name>.+?)\s+(?P<values>{VALUE}(?:\s+{VALUE})*)(?:\s+(?P<unit>{UNIT}))?\s*$',
+    re.IGNORECASE
+)
+_VALUE_RE = re.compile(VALUE, re.IGNORECASE)
+_UNIT_RE = re.compile(UNIT, re.IGNORECASE)
+_NUMBER_RE = re.compile(r'\d+(?:[.,]\d+)?')
+_LETTERS_RE = re.compile(r'[A-Za-zÀ-ÿ]')
+
+_HEADER_RE = re.compile(r'\b(substances?|r[ée]sidus?|pesticides?|mati[èe]res?\s+actives?|analytes?|compounds?)\b', re.IGNORECASE)
+_COLUMNS = (
+    ('detected', re.compile(r'r[ée]sultat|result|d[ée]tect|teneur|valeur|value|concentration', re.IGNORECASE)),
+    ('loq', re.compile(r'\b(LOQ|LQ|limite de quantification)\b', re.IGNORECASE)),
+    ('mrl', re.compile(r'\b(LMR|MRL)\b', re.IGNORECASE)),
+)
+
+_METADATA = (
+    ('product_name', re.compile(r'^(produit|product|[ée]chantillon|sample|denr[ée]e|commodity)\b[^:]*:\s*(?P<v>.+)$', re.IGNORECASE)),
+    ('batch_id', re.compile(r'^(n[°o]\s*(de\s+)?)?(lot|batch)\b[^:]*:\s*(?P<v>.+)$', re.IGNORECASE)),
+    ('sampling_date', re.compile(r'^(date\s+(de\s+|d.)?(pr[ée]l[èe]vement|[ée]chantillonnage|sampling)|sampling\s+date)[^:]*:\s*(?P<v>.+)$', re.IGNORECASE)),
+    ('country_of_origin', re.compile(r"^(pays\s+d.\s*origine|origine|country\s+of\s+origin|origin)\b[^:]*:\s*(?P<v>.+)$", re.IGNORECASE)),
+    ('lab_name', re.compile(r'^(laboratoire|laboratory|lab)\b[^:]*:\s*(?P<v>.+)$', re.IGNORECASE)),
+)
+_DATE_RE = re.compile(r'\b(\d{1,2})[/.\-](\d{1,2})[/.\-](\d{2,4})\b')
+
+ROW_CONFIDENCE = 0.95
+WEAK_ROW_CONFIDENCE = 0.75
+
+
+def _parse_value(token):
+    """
+    Jeton de cellule -> (valeur ou None, inférieur à la LOQ, limite '<x'
+    éventuelle, ParsedValue pour l'unité propre à la cellule).
+    """
+    parsed = parse_value(token)
+    if parsed is None or parsed.qualifier == 'nd':
+        return None, True, None, parsed  # nd, non détecté, not detected
+    if parsed.below:
+        return None, True, parsed.value, parsed
+    return parsed.value, False, None, parsed
+
+
+def _is_header(line):
+    return ':' not in line and bool(_HEADER_RE.search(line)) and any(p.search(line) for _, p in _COLUMNS)
+
+
+def _column_order(header):
+    """Ordre des colonnes numériques d'après la position des libellés de l'en-tête."""
+    found = []
+    for name, pattern in _COLUMNS:
+        match = pattern.search(header)
+        if match:
+            found.append((match.start(), name))
+    order = [name for _, name in sorted(found)]
+    if 'detected' not in order:
+        order.insert(0, 'detected')
+    return order
+
+
+def _parse_metadata(lines):
+    metadata = {key: None for key, _ in _METADATA}
+    for line in lines:
+        for key, pattern in _METADATA:
+            if metadata[key] is None:
+                match = pattern.match(line)
+                if match:
+                    value = match.group('v').strip()
+                    if key == 'sampling_date':
+                        date = _DATE_RE.search(value)
+                        if date:
+                            day, month, year = date.groups()
+                            if len(year) == 2:
+                                year = '20' + year
+                            value = f"{int(day):02d}/{int(month):02d}/{year}"
+                    metadata[key] = value or None
+                    break
+    return metadata
+
+
+def _parse_row(line, order, default_unit):
+    match = _ROW_RE.match(line)
+    if not match:
+        return None
+    name = match.group('name').strip().strip('.:;')
+    if ':' in name or not _LETTERS_RE.search(name):
+        return None
+    tokens = _VALUE_RE.findall(match.group('values'))
+    if len(tokens) < 2:
+        return None
+
+    cells = dict(zip(order, tokens))
+    detected_value, below_loq, limit, parsed = _parse_value(cells.get('detected', tokens[0]))
+    loq = parse_value(cells['loq']) if 'loq' in cells and _NUMBER_RE.match(cells['loq'].strip()) else None
+
+    # Unité de la ligne, sinon de l'en-tête ; une cellule qui porte sa propre
+    # unité la garde, et une contradiction est signalée plutôt que devinée
+    declared = match.group('unit') or default_unit
+    unit, unit_error = cell_unit(parsed, declared)
+    unit = unit or re.sub(r'\s+', '', declared)
+    if loq is not None:
+        loq_value = loq.value
+        loq_unit, loq_error = cell_unit(loq, declared)
+        loq_unit = loq_unit or unit
+        unit_error = unit_error or loq_error
+    else:
+        loq_value, loq_unit = limit, unit  # "< 0.01" : la limite affichée tient lieu de LOQ
+
+    row = {
+        'substance': name,
+        'detected_value': detected_value,
+        'loq_value': loq_value,
+        'unit': unit,
+        'loq_unit': loq_unit if loq_value is not None else None,
+        'below_loq': below_loq,
+        'confidence': ROW_CONFIDENCE if loq_value is not None else WEAK_ROW_CONFIDENCE
+    }
+    if unit_error:
+        row.update({'unit_error': unit_error, 'confidence': 0.0})
+    return row
+
+
+def parse_bulletin_text(text):
+    """
+    Texte brut d'un bulletin -> { metadata, results, confidence }.
+    confidence = 0.4 x part des métadonnées trouvées + 0.6 x qualité du
+    tableau (confiance moyenne des lignes x part des lignes chiffrées
+    effectivement lues) ; 0 si aucun tableau n'a été reconnu.
+    """
+    lines = [re.sub(r'\s+', ' ', line).strip() for line in (text or '').splitlines()]
+    lines = [line for line in lines if line]
+    metadata = _parse_metadata(lines)
+
+    results = []
+    rejected = 0
+    order = None
+    default_unit = None
+    for line in lines:
+        if order is None:
+            if _is_header(line):
+                order = _column_order(line)
+                unit = _UNIT_RE.search(line)
+                default_unit = unit.group(0) if unit else None
+            continue
+
+        row = _parse_row(line, order, default_unit)
+        if row is not None:
+            results.append(row)
+        elif _is_header(line):
+            order = _column_order(line)  # en-tête répété (tableau sur plusieurs pages)
+        elif _NUMBER_RE.search(line) and results and not _DATE_RE.search(line) and ':' not in line:
+            rejected += 1  # ligne chiffrée du tableau non reconnue
+        elif results:
+            order = None  # fin du tableau
+
+    if not results:
+        return {'metadata': metadata, 'results': [], 'confidence': 0.0}
+
+    meta_score = sum(1 for v in metadata.values() if v) / len(metadata)
+    row_score = sum(r['confidence'] for r in results) / len(results)
+    table_score = row_score * len(results) / (len(results) + rejected)
+    confidence = round(meta_score * 0.4 + table_score * 0.6, 3)
+    return {
+        'metadata': metadata,
+        'results': results,
+        'confidence': min(1.0, max(0.0, confidence))
+    }
+
+
+def extract_text_layer(reader):
+    """PdfReader -> même format que parse_bulletin_text (confiance 0 sans couche texte)."""
+    try:
+        text = '\n'.join(page.extract_text() or '' for page in reader.pages)
+    except Exception:
+        text = ''
+    return parse_bulletin_text(text)
@@ -0,0 +1,312 @@
+import re
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+# ---------------------------------------------------------------------------
+# Normalisation des unités et des valeurs de bulletins / LMR
+# - Unités : alias (µg/kg, ug/kg, mg kg-1, mg.kg⁻¹, ppm, ppb...) ramenés à
+#   une forme canonique puis à un facteur vers mg/kg. Une unité inconnue lève
+#   UnknownUnitError : jamais de facteur 1.0 par défaut (erreurs x1000).
+# - Valeurs : "0.05", "0,05", "0.01*" (LMR fixée à la LOQ), "<0.005",
+#   "> 2", "nd", "< LOQ", "0.05 mg/kg"... Chemin rapide (float() sur le
+#   nombre, unité cherchée dans une table précalculée), puis regex
+#   précompilée pour le reste ; résultat typé ParsedValue.
+# - API par lot (parse_values, normalize_results) pour des tableaux entiers :
+#   chaque cellule est convertie avec sa propre unité (cell_unit).
+# ---------------------------------------------------------------------------
+
+
+class UnknownUnitError(ValueError):
+    pass
+
+
+# Facteur de conversion vers mg/kg, par unité canonique
+UNIT_FACTORS = {
+    'mg/kg': 1.0,
+    'µg/g': 1.0,
+    'g/kg': 1000.0,
+    'µg/kg': 0.001,
+    'ng/g': 0.001,
+    'ng/kg': 0.000001,
+    '%': 10000.0,
+}
+
+# Alias (forme compacte : minuscules, sans espaces) -> unité canonique
+UNIT_ALIASES = {
+    'ppm': 'mg/kg',
+    'ppb': 'µg/kg',
+    'ppt': 'ng/kg',
+}
+
+_MICRO_RE = re.compile(r'^(?:u|μ|mc|micro)(?=g)')
+# "mg kg-1", "mg.kg^-1", "mg·kg⁻¹" -> "mg/kg"
+_PER_RE = re.compile(r'^([a-zµ]+?)[.·*]?(kg|g)(?:\^?-1|⁻¹)$')
+_SPACE_RE = re.compile(r'\s+')
+
+# Qualificatif optionnel, nombre (virgule ou point décimal), astérisque, unité
+_VALUE_RE = re.compile(
+    r'\s*(<=|>=|≤|≥|<|>)?\s*'
+    r'([+-]?\d*[.,]?\d+(?:[eE][+-]?\d+)?)'
+    r'\s*(\*)?\s*([^\d\s].*?)?\s*'
+)
+# "< LOQ", "<LD", "nd", "n.d.", "non détecté", "not detected"
+_NOT_DETECTED_RE = re.compile(
+    r'^\s*(?:[<≤]\s*(?:loq|lq|lod|ld|lod/loq)|n\.?\s?d\.?|non[\s-]+d[ée]tect[ée]e?s?|not\s+detected|absent)\s*$',
+    re.IGNORECASE
+)
+_MISSING = frozenset(('', '—', '–', '-', 'n/a', 'na', 'null', 'none'))
+_QUALIFIERS = {'≤': '<=', '≥': '>='}
+_QUALIFIER_CHARS = frozenset('<>≤≥')
+_NUMBER_START = frozenset('0123456789.+-')
+
+
+class ParsedValue(NamedTuple):
+    """
+    value     : nombre lu (None pour "nd" / "< LOQ")
+    qualifier : '=', '<', '<=', '>', '>=' ou 'nd'
+    at_loq    : valeur marquée '*' (LMR fixée à la limite de quantification)
+    unit      : unité canonique si la valeur en portait une, sinon None
+    """
+    value: Optional[float]
+    qualifier: str = '='
+    at_loq: bool = False
+    unit: Optional[str] = None
+
+    @property
+    def below(self):
+        """Sous la limite affichée (ou non détecté)."""
+        return self.qualifier in ('<', '<=', 'nd')
+
+    @property
+    def above(self):
+        return self.qualifier in ('>', '>=')
+
+    @property
+    def detected(self):
+        return self.qualifier != 'nd' and not self.below
+
+
+# ---------------------------------------------------------------------------
+# Unités
+# ---------------------------------------------------------------------------
+
+@lru_cache(maxsize=512)
+def normalize_unit(unit):
+    """Unité brute -> unité canonique de UNIT_FACTORS, ou None si inconnue."""
+    if unit is None:
+        return None
+    key = _SPACE_RE.sub('', str(unit)).lower()
+    if not key:
+        return None
+    key = key.replace('μ', 'µ')
+    key = _MICRO_RE.sub('µ', key)
+    per = _PER_RE.match(key)
+    if per:
+        key = f"{per.group(1)}/{per.group(2)}"
+    key = UNIT_ALIASES.get(key, key)
+    return key if key in UNIT_FACTORS else None
+
+
+# Graphies courantes -> unité canonique (sans passer par normalize_unit)
+_UNIT_LOOKUP = {
+    raw: normalize_unit(raw)
+    for raw in ('mg/kg', 'µg/kg', 'μg/kg', 'ug/kg', 'µg/g', 'ug/g', 'g/kg', 'ng/g', 'ng/kg', '%',
+                'ppm', 'ppb', 'ppt', 'mg kg-1', 'µg kg-1', 'MG/KG', 'mg/Kg', 'PPM', 'PPB')
+}
+
+
+def unit_factor(unit):
+    """Facteur vers mg/kg ; lève UnknownUnitError pour une unité inconnue."""
+    canonical = _UNIT_LOOKUP.get(unit) or normalize_unit(unit)
+    if canonical is None:
+        raise UnknownUnitError(f"Unité inconnue : {unit!r}")
+    return UNIT_FACTORS[canonical]
+
+
+def to_mg_kg(value, unit):
+    """Valeur numérique dans `unit` -> mg/kg (UnknownUnitError si unité inconnue)."""
+    return value * unit_factor(unit)
+
+
+# ---------------------------------------------------------------------------
+# Valeurs
+# ---------------------------------------------------------------------------
+
+_NOT_DETECTED = ParsedValue(None, 'nd')
+_new_value = tuple.__new__  # construction sans le __new__ Python du NamedTuple
+
+
+def parse_value(raw):
+    """
+    Cellule brute -> ParsedValue, ou None si vide / illisible.
+    Les nombres Python passent directement, sans regex.
+    """
+    if raw.__class__ is str:
+        return _parse_text(raw)
+    if raw is None or isinstance(raw, bool):
+        return None
+    if isinstance(raw, (int, float)):
+        return _new_value(ParsedValue, (float(raw), '=', False, None)) if raw == raw else None  # NaN -> None
+    return _parse_text(str(raw))
+
+
+def _parse_text(text):
+    # Chemin rapide ("0.05", "<0.005", "0.01*", "> 2", "0.3 mg/kg") : float()
+    # sur le nombre, unité cherchée dans _UNIT_LOOKUP ; la regex ne sert
+    # qu'aux autres formes ("0,05", "nd", "< LOQ", "0.3mg/kg"...)
+    body = text.strip()
+    q = '='
+    if body[:1] in _QUALIFIER_CHARS:
+        if body[1:2] == '=' and body[0] in '<>':
+            q, body = body[:2], body[2:].lstrip()
+        else:
+            q, body = _QUALIFIERS.get(body[0], body[0]), body[1:].lstrip()
+    if body[:1] in _NUMBER_START:
+        unit = None
+        if ' ' in body:
+            body, _, unit = body.partition(' ')
+            unit = _UNIT_LOOKUP.get(unit.lstrip(), '')
+        star = body[-1:] == '*'
+        if star:
+            body = body[:-1]
+        if unit != '':
+            try:
+                value = float(body)
+            except ValueError:
+                value = None
+            if value is not None and value - value == 0 and '_' not in body:  # exclut nan, inf, "1_000"
+                return _new_value(ParsedValue, (value, q, star, unit))
+
+    match = _VALUE_RE.fullmatch(text)
+    if match is None:
+        return _NOT_DETECTED if _NOT_DETECTED_RE.match(text) else None
+
+    q, num, star, unit = match.groups()
+    canonical = None
+    if unit is not None:
+        canonical = normalize_unit(unit)
+        if canonical is None:
+            return None  # "0.05 mg/xx" : une unité illisible rend la valeur illisible
+    if ',' in num:
+        num = num.replace(',', '.')
+    return _new_value(ParsedValue, (float(num), _QUALIFIERS.get(q, q) if q else '=', star is not None, canonical))
+
+
+def parse_number(raw, _units=_UNIT_LOOKUP, _float=float):
+    """
+    Nombre seul d'une cellule, lecture tolérante (qualificatifs et '*'
+    ignorés : "<0.005" -> 0.005, "0.01*" -> 0.01 ; "nd" -> None), comme
+    ParsedValue.value mais sans construire le ParsedValue : float() direct
+    et table d'unités, analyse complète seulement en repli.
+    """
+    if raw.__class__ is str:
+        num, _, unit = raw.strip().lstrip('<>≤≥= ').partition(' ')
+        if not unit or unit.lstrip() in _units:
+            try:
+                value = _float(num.rstrip('*'))
+                if value - value == 0 and '_' not in num:  # exclut nan, inf, "1_000"
+                    return value
+            except ValueError:
+                pass
+    parsed = parse_value(raw)
+    return parsed.value if parsed is not None else None
+
+
+def is_missing(raw):
+    return raw is None or (isinstance(raw, str) and raw.strip().lower() in _MISSING)
+
+
+def parse_values(values):
+    """Colonne de cellules -> liste de ParsedValue / None, mêmes positions."""
+    # Les bulletins répètent beaucoup les mêmes cellules ("nd", "<0.01") :
+    # chaque texte distinct n'est analysé qu'une fois par colonne
+    seen = {}
+    out = []
+    for raw in values:
+        if raw.__class__ is str:
+            parsed = seen.get(raw, seen)
+            if parsed is seen:
+                parsed = seen[raw] = _parse_text(raw)
+        else:
+            parsed = parse_value(raw)
+        out.append(parsed)
+    return out
+
+
+def cell_unit(parsed, declared=None, default_unit='mg/kg'):
+    """
+    Unité d'une cellule -> (unité canonique ou None, erreur ou None).
+    L'unité écrite dans la cellule ("50 µg/kg") s'applique à cette cellule ;
+    la colonne (`declared`) sert quand la cellule n'en porte pas, puis
+    `default_unit` si la colonne n'en déclare aucune. Une cellule et une
+    colonne qui se contredisent, ou une unité inconnue, donnent une erreur :
+    jamais de choix arbitraire entre deux facteurs.
+    """
+    own = parsed.unit if parsed is not None else None
+    if declared:
+        canonical = normalize_unit(declared)
+        if canonical is None:
+            return None, f"Unité inconnue : {declared!r}"
+        if own is not None and own != canonical:
+            return None, f"Unité de la cellule ({own}) différente de celle de la colonne ({canonical})"
+        return canonical, None
+    return own or normalize_unit(default_unit), None
+
+
+def normalize_results(rows, default_unit='mg/kg'):
+    """
+    Lignes d'extraction { substance, detected_value, loq_value, unit,
+    loq_unit, ... } -> copies avec les valeurs typées et converties :
+      detected_value / loq_value (float ou None), unit / loq_unit
+      (canoniques), detected_value_mg_kg, loq_value_mg_kg, below_loq,
+      above_range, at_loq, unit_error (texte) quand une unité est inconnue
+      ou contredit celle de la colonne : les valeurs en mg/kg restent alors
+      à None (ligne non scorée) plutôt que d'être converties avec un facteur
+      faux.
+    Valeur détectée et LOQ sont converties chacune avec sa propre unité.
+    Une valeur "<x" sans LOQ fournit la LOQ (x, dans l'unité de x) ; une
+    valeur non détectée vaut 0 mg/kg.
+    """
+    detected_col = parse_values([r.get('detected_value') for r in rows])
+    loq_col = parse_values([r.get('loq_value') for r in rows])
+
+    out = []
+    for row, detected, loq in zip(rows, detected_col, loq_col):
+        item = dict(row)
+        declared = row.get('unit')
+        detected_unit, detected_error = cell_unit(detected, declared, default_unit)
+
+        below = bool(row.get('below_loq')) or (detected is not None and detected.below)
+        detected_value = None if detected is None or below else detected.value
+        if loq is not None:
+            loq_value = loq.value
+            loq_unit, loq_error = cell_unit(loq, row.get('loq_unit') or declared, default_unit)
+        elif detected is not None and detected.below:
+            # "< 0.01" : la limite affichée tient lieu de LOQ, dans son unité
+            loq_value, loq_unit, loq_error = detected.value, detected_unit, detected_error
+        else:
+            loq_value, loq_unit, loq_error = None, None, None
+
+        item.update({
+            'detected_value': detected_value,
+            'loq_value': loq_value,
+            'unit': detected_unit or declared or default_unit,
+            'loq_unit': None if loq_value is None else loq_unit or row.get('loq_unit') or declared or default_unit,
+            'below_loq': below,
+            'above_range': detected is not None and detected.above,
+            'at_loq': detected is not None and detected.at_loq,
+        })
+        error = row.get('unit_error') or detected_error or loq_error
+        if error:
+            item.update({'detected_value_mg_kg': None, 'loq_value_mg_kg': None, 'unit_error': error})
+        else:
+            factor = UNIT_FACTORS[detected_unit]
+            if detected_value is not None:
+                item['detected_value_mg_kg'] = detected_value * factor
+            elif below or is_missing(row.get('detected_value')):
+                item['detected_value_mg_kg'] = 0.0
+            else:
+                item['detected_value_mg_kg'] = None  # cellule illisible
+            item['loq_value_mg_kg'] = None if loq_value is None else loq_value * UNIT_FACTORS[loq_unit]
+        out.append(item)
+    return out
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Les modules du backend s'importent depuis le répertoire backend (comme app.py)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
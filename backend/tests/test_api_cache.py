@@ -0,0 +1,88 @@
+import threading
+from time import sleep as real_sleep, time as real_time
+
+from services import api_cache
+from services.api_cache import ApiCache
+
+
+class _Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _cache(tmp_path, monkeypatch, clock):
+    monkeypatch.setattr(api_cache.time, 'time', clock)
+    return ApiCache(str(tmp_path / 'cache.sqlite'), ttl=10, stale_ttl=100)
+
+
+def _wait_revalidation(cache, timeout=2.0):
+    deadline = real_time() + timeout
+    while cache._revalidating and real_time() < deadline:
+        real_sleep(0.01)
+    assert not cache._revalidating
+
+
+def test_fresh_entry_skips_loader(tmp_path, monkeypatch):
+    clock = _Clock()
+    cache = _cache(tmp_path, monkeypatch, clock)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return {'v': 1}, 'u', 200, None
+
+    assert cache.fetch('mrl', {'id': 1}, loader)[0] == {'v': 1}
+    clock.now += 5
+    assert cache.fetch('mrl', {'id': 1}, loader)[0] == {'v': 1}
+    assert len(calls) == 1
+    assert cache.stats()['hits'] == 1
+
+
+def test_stale_entry_served_then_revalidated(tmp_path, monkeypatch):
+    clock = _Clock()
+    cache = _cache(tmp_path, monkeypatch, clock)
+    cache.fetch('mrl', {'id': 1}, lambda: ({'v': 1}, 'u', 200, None))
+
+    clock.now += 50  # au-delà du TTL, dans la fenêtre stale
+    release = threading.Event()
+
+    def slow_loader():
+        release.wait(2)
+        return {'v': 2}, 'u', 200, None
+
+    # La valeur périmée est rendue sans attendre l'API
+    data, url, status, error = cache.fetch('mrl', {'id': 1}, slow_loader)
+    assert (data, status, error) == ({'v': 1}, 200, None)
+    assert cache.stats()['stale_hits'] == 1
+
+    # Une seule revalidation en vol pour la même clé
+    cache.fetch('mrl', {'id': 1}, slow_loader)
+    assert cache.stats()['stale_hits'] == 2
+    release.set()
+    _wait_revalidation(cache)
+    assert cache.stats()['revalidations'] == 1
+
+    def unexpected():
+        raise AssertionError("l'entrée rafraîchie doit être fraîche")
+
+    assert cache.fetch('mrl', {'id': 1}, unexpected)[0] == {'v': 2}
+
+
+def test_failed_revalidation_keeps_stale_entry(tmp_path, monkeypatch):
+    clock = _Clock()
+    cache = _cache(tmp_path, monkeypatch, clock)
+    cache.fetch('mrl', {'id': 1}, lambda: ({'v': 1}, 'u', 200, None))
+
+    clock.now += 50
+    assert cache.fetch('mrl', {'id': 1}, lambda: ([], 'u', 503, 'HTTP 503'))[0] == {'v': 1}
+    _wait_revalidation(cache)
+    assert cache.stats()['revalidations'] == 0
+
+    # Hors fenêtre stale et API en erreur : dernière réponse connue
+    clock.now += 500
+    data, _, status, error = cache.fetch('mrl', {'id': 1}, lambda: ([], 'u', 503, 'HTTP 503'))
+    assert (data, status, error) == ({'v': 1}, 200, None)
+    assert cache.stats()['served_stale_on_error'] == 1
@@ -0,0 +1,82 @@
+import random
+from unittest import mock
+
+import pytest
+
+import models.mrl as mrl_module
+from models.mrl import MRLModel
+from services.compliance import batch_to_records, score_compliance_batch
+
+model = MRLModel()
+
+# (détecté, LMR, LOQ) en mg/kg, aux limites de la règle scalaire
+BOUNDARIES = [
+    (0.05, 0.05, None),      # détecté == LMR
+    (0.0501, 0.05, None),    # juste au-dessus : hard fail
+    (0.0, 0.05, 0.01),       # sous la LOQ (détecté ramené à 0)
+    (0.0, 0.01, 0.01),       # LOQ == LMR
+    (0.0, 0.01, 0.02),       # LOQ au-dessus de la LMR : hard fail
+    (0.0, 0.01, 0.0),        # LOQ nulle = pas de LOQ
+    (0.02, 0.01, 0.05),      # dépassement prioritaire sur la LOQ
+    (0.005, 0.01, None),     # ratio 0.5 : VIGILANCE, pas SAFE
+    (0.002, 0.01, None),     # score 80 : VIGILANCE, pas SAFE
+    (0.0019, 0.01, None),    # score 81 : SAFE
+    (0.006, 0.01, None),     # score 40 : VIGILANCE
+    (0.0061, 0.01, None),    # score 39 : CRITICAL sans hard fail
+    (0.00125, 0.01, None),   # arrondi d'un demi (87.5)
+    (0.123456789, 0.3, 0.001),
+]
+
+
+def _scalar(detected, mrl, loq):
+    return model.calculate_compliance(detected, mrl, loq)
+
+
+def _vectorized(rows):
+    detected, mrl, loq = (list(col) for col in zip(*rows))
+    return batch_to_records(score_compliance_batch(detected, mrl, loq), detected, mrl, loq)
+
+
+@pytest.mark.parametrize('row', BOUNDARIES)
+def test_vectorized_matches_scalar_at_boundaries(row):
+    assert _vectorized([row]) == [_scalar(*row)]
+
+
+def test_vectorized_matches_scalar_on_random_rows():
+    rng = random.Random(20240)
+    rows = []
+    for _ in range(5000):
+        mrl = rng.choice((0.01, 0.05, 0.1, 0.5, 2.0, round(rng.uniform(0.001, 5), 4)))
+        detected = rng.choice((0.0, mrl, mrl * rng.uniform(0, 2), round(rng.uniform(0, 3 * mrl), 5)))
+        loq = rng.choice((None, 0.0, mrl, mrl * rng.uniform(0, 2)))
+        rows.append((detected, mrl, loq))
+    assert _vectorized(rows) == [_scalar(*row) for row in rows]
+
+
+def test_batch_save_scores_like_scalar_and_skips_unscorable_rows():
+    analyses = [
+        {'residue_name': 'égal', 'detected_value_mg_kg': 0.05, 'mrl_value': 0.05},
+        {'residue_name': 'sous LOQ', 'detected_value_mg_kg': 0.0, 'loq_value_mg_kg': 0.01, 'mrl_value': 0.05},
+        {'residue_name': 'hard fail', 'detected_value_mg_kg': 0.2, 'mrl_value': 0.1},
+        {'residue_name': 'LMR absente', 'detected_value_mg_kg': 0.01, 'mrl_value': None},
+        {'residue_name': 'unit_error', 'detected_value_mg_kg': None, 'mrl_value': 0.05,
+         'unit_error': 'Unité inconnue'},
+    ]
+    def insert_many(cursor, table, columns, rows, **kwargs):
+        return list(range(len(rows)))
+
+    with mock.patch.object(MRLModel, 'get_connection'), mock.patch.object(mrl_module, 'insert_many', insert_many):
+        result = model.save_analyses_batch(1, analyses)
+
+    assert result['success']
+    by_name = {c['residue_name']: c for c in result['compliance']}
+    for name, detected, mrl, loq in (('égal', 0.05, 0.05, None), ('sous LOQ', 0.0, 0.05, 0.01),
+                                     ('hard fail', 0.2, 0.1, None)):
+        expected = _scalar(detected, mrl, loq)
+        assert by_name[name]['compliance_score'] == expected['score']
+        assert by_name[name]['compliance_label'] == expected['label']
+        assert by_name[name]['hard_fail'] == expected['hard_fail']
+        assert by_name[name]['ratio_to_mrl'] == expected['ratio']
+    for name in ('LMR absente', 'unit_error'):
+        assert by_name[name]['compliance_label'] is None
+        assert not by_name[name]['hard_fail']
@@ -0,0 +1,46 @@
+import time
+
+import requests
+
+from services.http_client import EUApiClient
+
+
+class _Response:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+def test_retries_stop_at_budget(monkeypatch):
+    client = EUApiClient(default_timeout=20, retries=5, backoff=0.2, backoff_max=0.2, budget=0.3)
+    timeouts = []
+
+    def slow_failure(url, params=None, headers=None, timeout=None):
+        timeouts.append(timeout)
+        time.sleep(0.1)
+        raise requests.exceptions.Timeout()
+
+    monkeypatch.setattr(client.session, 'get', slow_failure)
+    started = time.monotonic()
+    try:
+        client.get('https://example.test/api/pesticide-residues')
+    except requests.exceptions.Timeout:
+        pass
+    else:
+        raise AssertionError("Timeout attendu")
+    assert time.monotonic() - started < 0.6
+    assert len(timeouts) < 6
+    assert all(t <= 0.3 for t in timeouts)
+
+
+def test_retry_status_returned_when_budget_is_spent(monkeypatch):
+    client = EUApiClient(retries=3, budget=0.1)
+    calls = []
+
+    def busy(url, params=None, headers=None, timeout=None):
+        calls.append(timeout)
+        return _Response(503, {'Retry-After': '5'})
+
+    monkeypatch.setattr(client.session, 'get', busy)
+    assert client.get('https://example.test/api/x').status_code == 503
+    assert len(calls) == 1
@@ -0,0 +1,45 @@
+import queue
+
+import pytest
+
+from services.jobs import FairQueue
+
+
+def _drain(q):
+    return [q.get() for _ in range(q.qsize())]
+
+
+def test_round_robin_between_owners():
+    q = FairQueue()
+    for i in range(4):
+        q.put_nowait(('a', i), owner='a')
+    q.put_nowait(('b', 0), owner='b')
+    q.put_nowait(('b', 1), owner='b')
+    q.put_nowait(('c', 0), owner='c')
+
+    assert _drain(q) == [
+        ('a', 0), ('b', 0), ('c', 0),
+        ('a', 1), ('b', 1),
+        ('a', 2), ('a', 3),
+    ]
+
+
+def test_owner_rejoins_at_end_of_round():
+    q = FairQueue()
+    q.put_nowait('a0', owner='a')
+    q.put_nowait('b0', owner='b')
+    assert q.get() == 'a0'
+    # 'a' n'avait plus rien : il revient derrière 'b'
+    q.put_nowait('a1', owner='a')
+    q.put_nowait('b1', owner='b')
+    assert _drain(q) == ['b0', 'a1', 'b1']
+    assert q.owners() == {}
+
+
+def test_maxsize_counts_all_owners():
+    q = FairQueue(maxsize=2)
+    q.put_nowait(1, owner='a')
+    q.put_nowait(2, owner='b')
+    with pytest.raises(queue.Full):
+        q.put_nowait(3, owner='c')
+    assert q.owners() == {'a': 1, 'b': 1}
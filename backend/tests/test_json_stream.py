@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from services.json_stream import IncrementalExtractionParser, loads_lenient
+
+
+def test_loads_lenient_repairs_outside_strings():
+    text = '{"substance": "None", "note": "NaN, ]", "detected": NaN, "loq": None, "x": [1, 2,],}'
+    assert loads_lenient(text) == {
+        'substance': 'None', 'note': 'NaN, ]', 'detected': None, 'loq': None, 'x': [1, 2],
+    }
+
+
+def test_loads_lenient_keeps_escaped_quotes():
+    text = '{"note": "dit \\"None\\", NaN", "v": None,}'
+    assert loads_lenient(text) == {'note': 'dit "None", NaN', 'v': None}
+
+
+def test_parser_rows_keep_string_values():
+    parser = IncrementalExtractionParser()
+    rows = parser.feed('{"metadata": {}, "results": [{"substance": "None", "detected": None},')
+    assert rows == [{'substance': 'None', 'detected': None}]
+
+
+DOCUMENT = ('{"metadata": {"lab": "Lab {A}", "note": "voir ```"}, "results": ['
+            '{"substance": "Captan", "detected_value": "0.05"}, '
+            '{"substance": "None", "detected_value": null}]}')
+
+
+def _parse(text, size):
+    parser = IncrementalExtractionParser()
+    rows = []
+    for i in range(0, len(text), size):
+        rows.extend(parser.feed(text[i:i + size]))
+    return parser.close(), rows, parser.stats
+
+
+@pytest.mark.parametrize('size', [1, 3, 7, 64, 10000])
+def test_chunking_does_not_change_the_result(size):
+    document, rows, stats = _parse('Voici :\n' + DOCUMENT, size)
+    assert stats['complete'] and document == json.loads(DOCUMENT)
+    assert rows == document['results']
+
+
+@pytest.mark.parametrize('size', [1, 5, 10000])
+def test_stray_brace_in_prose_before_fence_is_ignored(size):
+    text = 'Résultat {voir tableau 2, page 1 :\n```json\n' + DOCUMENT + '\n```\nFin.'
+    document, rows, stats = _parse(text, size)
+    assert stats['complete'] and document == json.loads(DOCUMENT)
+    assert stats['prefix_skipped'] == text.index('```json') + len('```json\n')
+
+
+def test_closed_object_in_prose_is_not_the_document():
+    document, rows, _ = _parse('Format {ligne: valeur} attendu. ' + DOCUMENT, 4)
+    assert document == json.loads(DOCUMENT) and len(rows) == 2
+
+
+def test_feed_keeps_only_the_open_object():
+    parser = IncrementalExtractionParser()
+    body = ','.join('{"substance": "s%d", "detected_value": "0.01"}' % i for i in range(2000))
+    for c in '{"metadata": {}, "results": [' + body:
+        parser.feed(c)
+    assert len(parser.rows) == 2000
+    assert len(parser._window) < 100
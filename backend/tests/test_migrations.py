@@ -0,0 +1,60 @@
+import importlib.util
+import os
+import re
+
+import pytest
+
+DATABASE_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'database')
+MIGRATIONS_DIR = os.path.join(DATABASE_DIR, 'migrations')
+
+_spec = importlib.util.spec_from_file_location('init_tables', os.path.join(DATABASE_DIR, 'init_tables.py'))
+init_tables = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(init_tables)
+
+# Migration -> objets que ses commandes doivent créer
+EXPECTED = {
+    '001_eu_mirror.sql': {'eu_residues', 'eu_products', 'eu_mrls', 'eu_mirror_sync_state'},
+    '002_ocr_extraction_cache.sql': {'ocr_extraction_cache'},
+    '003_gemini_usage.sql': {'gemini_usage'},
+    '004_pipeline_runs.sql': {'pipeline_runs'},
+    '005_history_indexes.sql': {'idx_mrl_analyses_user_created', 'idx_ocr_uploads_user_date'},
+    '006_eu_mirror_staging.sql': {'eu_residues_staging', 'eu_products_staging', 'eu_mrls_staging'},
+}
+
+_CREATED_RE = re.compile(
+    r'^CREATE\s+(?:TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?|INDEX\s+)(\w+)', re.IGNORECASE
+)
+
+
+def _created(file_name):
+    with open(os.path.join(MIGRATIONS_DIR, file_name), encoding='utf-8') as f:
+        commands = init_tables.split_sql(f.read())
+    names = set()
+    for command in commands:
+        match = _CREATED_RE.match(command)
+        assert match, f"commande inattendue dans {file_name} : {command[:80]!r}"
+        names.add(match.group(1))
+    return names
+
+
+def test_every_migration_is_covered():
+    files = {name for name in os.listdir(MIGRATIONS_DIR) if name.endswith('.sql')}
+    assert set(EXPECTED) == files
+
+
+@pytest.mark.parametrize('file_name', sorted(EXPECTED))
+def test_migration_statements_survive_split(file_name):
+    assert _created(file_name) == EXPECTED[file_name]
+
+
+def test_split_ignores_separators_in_comments_and_strings():
+    sql = (
+        "-- en-tête ; avec point-virgule\n"
+        "CREATE TABLE t (a VARCHAR(5) DEFAULT 'x;--y'); -- fin ; de ligne\n"
+        "-- commentaire avant la commande\n"
+        "CREATE INDEX i ON t (a);"
+    )
+    assert init_tables.split_sql(sql) == [
+        "CREATE TABLE t (a VARCHAR(5) DEFAULT 'x;--y')",
+        "CREATE INDEX i ON t (a)",
+    ]
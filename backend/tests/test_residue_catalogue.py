@@ -0,0 +1,48 @@
+import pytest
+
+from services.residue_catalogue import CatalogueLoadError, ResidueCatalogue, UnsupportedLanguageError
+
+
+class FakeLoader:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = []
+
+    def load(self, language, use_snapshot=True, max_age=None):
+        self.calls.append(language)
+        if self.fail:
+            raise CatalogueLoadError('API indisponible')
+        return [{'pesticide_residue_id': 1, 'pesticide_residue_name': 'Captan'}]
+
+
+def test_unknown_language_is_rejected_without_download():
+    loader = FakeLoader()
+    catalogue = ResidueCatalogue(loader, languages=['EN', 'FR'])
+    with pytest.raises(UnsupportedLanguageError):
+        catalogue.get('../../etc')
+    assert catalogue.get('fr').language == 'FR'
+    assert loader.calls == ['FR']
+
+
+def test_failed_load_is_not_retried_before_retry_after():
+    loader = FakeLoader(fail=True)
+    catalogue = ResidueCatalogue(loader, languages=['EN'], retry_after=60)
+    for _ in range(3):
+        with pytest.raises(CatalogueLoadError):
+            catalogue.get('EN')
+    assert loader.calls == ['EN']
+    assert catalogue.stats()['failed'] == ['EN']
+
+    loader.fail = False
+    assert len(catalogue.refresh('EN').residues) == 1  # refresh admin : pas de délai
+    assert catalogue.stats()['failed'] == []
+
+
+def test_failed_load_is_retried_after_delay():
+    loader = FakeLoader(fail=True)
+    catalogue = ResidueCatalogue(loader, retry_after=0)
+    with pytest.raises(CatalogueLoadError):
+        catalogue.get('EN')
+    loader.fail = False
+    assert catalogue.get('EN').language == 'EN'
+    assert loader.calls == ['EN', 'EN']
@@ -0,0 +1,27 @@
+from services.residue_index import ResidueIndex
+
+RESIDUES = [
+    {'pesticide_residue_id': 1, 'pesticide_residue_name': 'Permethrin'},
+    {'pesticide_residue_id': 2, 'pesticide_residue_name': 'Chlorpropham'},
+    {'pesticide_residue_id': 3, 'pesticide_residue_name': 'Captan'},
+    {'pesticide_residue_id': 4, 'pesticide_residue_name': 'Captan (R)'},
+]
+
+
+def test_best_accepts_exact_prefix_and_substring():
+    index = ResidueIndex(RESIDUES)
+    assert index.best('captan')['pesticide_residue_id'] == 3
+    assert index.best('Chlorprop')['pesticide_residue_id'] == 2
+    assert index.best('ermethri')['pesticide_residue_id'] == 1
+
+
+def test_best_never_resolves_to_a_fuzzy_match():
+    index = ResidueIndex(RESIDUES)
+    assert index.best('Deltamethrin') is None
+    assert index.best('Chlorprophos') is None
+
+
+def test_fuzzy_matches_remain_candidates():
+    index = ResidueIndex(RESIDUES)
+    hits = index.search('Deltamethrin')
+    assert hits and hits[0]['name'] == 'Permethrin' and hits[0]['match'] == 'fuzzy'
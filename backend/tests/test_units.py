@@ -0,0 +1,153 @@
+import pytest
+
+from services.units import (
+    UnknownUnitError, cell_unit, normalize_results, normalize_unit, parse_number, parse_value, to_mg_kg
+)
+from services.text_layer import parse_bulletin_text
+
+
+@pytest.mark.parametrize('raw, canonical', [
+    ('mg/kg', 'mg/kg'), ('ppm', 'mg/kg'), ('ug/kg', 'µg/kg'), ('μg/kg', 'µg/kg'),
+    ('mg kg-1', 'mg/kg'), ('mgkg-1', 'mg/kg'), ('ppb', 'µg/kg'), ('mg/l', None),
+])
+def test_normalize_unit(raw, canonical):
+    assert normalize_unit(raw) == canonical
+
+
+def test_unknown_unit_is_never_converted_with_default_factor():
+    with pytest.raises(UnknownUnitError):
+        to_mg_kg(1.0, 'mg/l')
+
+
+def test_parse_value_keeps_cell_unit():
+    parsed = parse_value('50 µg/kg')
+    assert parsed.value == 50.0 and parsed.unit == 'µg/kg'
+    assert parse_value('<0.005').below and parse_value('0.01*').at_loq
+    assert parse_value('nd').qualifier == 'nd'
+
+
+@pytest.mark.parametrize('raw', [
+    '0.05', ' 0.05 ', '0,05', '0.01*', '<0.005', '< 0.01', '<= 0.01', '≤0.01', '> 2', '1e-3',
+    '0.3 mg/kg', '50 µg/kg', '50 ug/kg', '0.3 mg/xx', 'nd', '< LOQ', '—', '', 'nan', 'inf',
+    '1_000', 0.02, 3, None,
+])
+def test_fast_paths_match_full_parser(raw):
+    parsed = parse_value(raw)
+    assert parse_number(raw) == (parsed.value if parsed is not None else None)
+
+
+def test_parse_value_fast_path_rejects_non_numbers():
+    assert parse_value('nan') is None and parse_value('1_000') is None
+    assert parse_value('0.3 mg/xx') is None
+
+
+def test_cell_unit():
+    micro = parse_value('50 µg/kg')
+    assert cell_unit(micro) == ('µg/kg', None)
+    assert cell_unit(micro, 'ppb') == ('µg/kg', None)
+    assert cell_unit(parse_value('0.05'), 'µg/kg') == ('µg/kg', None)
+    assert cell_unit(parse_value('0.05')) == ('mg/kg', None)
+    unit, error = cell_unit(micro, 'mg/kg')
+    assert unit is None and 'µg/kg' in error
+    unit, error = cell_unit(parse_value('0.05'), 'mg/l')
+    assert unit is None and 'inconnue' in error
+
+
+def test_detected_value_uses_its_own_unit():
+    row, = normalize_results([{'substance': 'x', 'detected_value': '50 µg/kg', 'loq_value': None}])
+    assert row['unit'] == 'µg/kg'
+    assert row['detected_value_mg_kg'] == pytest.approx(0.05)
+    assert 'unit_error' not in row
+
+
+def test_loq_uses_its_own_unit():
+    row, = normalize_results([{'substance': 'x', 'detected_value': '0.02', 'loq_value': '10 µg/kg'}])
+    assert row['detected_value_mg_kg'] == pytest.approx(0.02)
+    assert row['loq_unit'] == 'µg/kg'
+    assert row['loq_value_mg_kg'] == pytest.approx(0.01)
+
+
+def test_loq_unit_column():
+    row, = normalize_results([{'substance': 'x', 'detected_value': 0.02, 'unit': 'mg/kg',
+                               'loq_value': 10.0, 'loq_unit': 'µg/kg'}])
+    assert row['loq_value_mg_kg'] == pytest.approx(0.01)
+
+
+def test_below_loq_limit_keeps_its_unit():
+    row, = normalize_results([{'substance': 'x', 'detected_value': '<10 µg/kg', 'loq_value': None}])
+    assert row['below_loq'] and row['detected_value_mg_kg'] == 0.0
+    assert row['loq_value_mg_kg'] == pytest.approx(0.01)
+
+
+@pytest.mark.parametrize('row', [
+    {'detected_value': '50 µg/kg', 'loq_value': None, 'unit': 'mg/kg'},
+    {'detected_value': '0.02', 'loq_value': '10 µg/kg', 'unit': 'mg/kg'},
+    {'detected_value': '0.02', 'loq_value': None, 'unit': 'mg/l'},
+    {'detected_value': 0.02, 'loq_value': None, 'unit': 'mg/kg', 'unit_error': 'déjà signalée'},
+])
+def test_unit_conflicts_are_not_scored(row):
+    item, = normalize_results([dict(row, substance='x')])
+    assert item['unit_error']
+    assert item['detected_value_mg_kg'] is None and item['loq_value_mg_kg'] is None
+
+
+def test_gemini_normalizer_flags_conflicting_cell():
+    from models.gemini import GeminiModel
+    normalize = GeminiModel._normalize_extraction
+    out = normalize(None, {'results': [
+        {'substance': 'a', 'detected_value': '50 µg/kg'},
+        {'substance': 'b', 'detected_value': '50 µg/kg', 'unit': 'mg/kg'},
+        {'substance': 'c', 'detected_value': '0.02', 'loq_value': '10 µg/kg', 'unit': 'mg/kg'},
+    ]})
+    a, b, c = out['results']
+    assert a['unit'] == 'µg/kg' and a['detected_value'] == 50.0 and 'unit_error' not in a
+    assert b['unit_error'] and b['confidence'] < 0.95
+    assert c['unit_error']
+    scored = normalize_results([a])[0]
+    assert scored['detected_value_mg_kg'] == pytest.approx(0.05)
+    assert all(r['detected_value_mg_kg'] is None for r in normalize_results([b, c]))
+
+
+def test_text_layer_keeps_units():
+    text = '\n'.join([
+        'Produit : Oranges',
+        'Substance Résultat LOQ Unité',
+        'Captan 0.05 0.01 mg/kg',
+        'Imazalil 20 10 µg/kg',
+    ])
+    captan, imazalil = parse_bulletin_text(text)['results']
+    assert captan['unit'] == 'mg/kg' and captan['loq_unit'] == 'mg/kg'
+    assert imazalil['unit'] == 'µg/kg' and imazalil['loq_unit'] == 'µg/kg'
+    converted = normalize_results([imazalil])[0]
+    assert converted['detected_value_mg_kg'] == pytest.approx(0.02)
+    assert converted['loq_value_mg_kg'] == pytest.approx(0.01)
+
+
+def test_text_layer_fields_survive_normalization():
+    from models.gemini import GeminiModel
+    text = '\n'.join([
+        'Produit : Oranges',
+        'Lot : L-42',
+        'Substance Résultat LOQ Unité',
+        'Captan 0.05 0.01 mg/kg',
+        'Imazalil 20 10 µg/kg',
+        'Boscalid 0.1 nd',
+    ])
+    local = parse_bulletin_text(text)
+    # Ligne signalée comme le fait _parse_row (unité contradictoire)
+    local['results'][1].update({'unit_error': 'Unité de la cellule différente', 'confidence': 0.0})
+    assert len({r['confidence'] for r in local['results']}) == 3
+    model = GeminiModel.__new__(GeminiModel)
+    out = model._normalize_extraction(local, keep_confidence=True)
+    assert out['confidence'] == local['confidence']
+    for before, after in zip(local['results'], out['results']):
+        assert after['confidence'] == before['confidence']
+        assert after.get('unit_error') == before.get('unit_error')
+    # Réponse du modèle : confiance fixée par le normaliseur, jamais reprise
+    gemini = model._normalize_extraction({'results': [{'substance': 'x', 'detected_value': 0.1, 'confidence': 1.0}],
+                                          'confidence': 1.0})
+    assert gemini['results'][0]['confidence'] == 0.95 and gemini['confidence'] < 1.0
+    # Fusion des pages : les lignes déjà normalisées gardent leur signalement
+    merged = model.merge_page_extractions([out])
+    assert [r.get('unit_error') for r in merged['results']] == [r.get('unit_error') for r in out['results']]
+    assert [r['confidence'] for r in merged['results']] == [r['confidence'] for r in out['results']]
@@ -0,0 +1,92 @@
+"""
+Vérifie avec EXPLAIN que les requêtes d'historique paginées utilisent les
+index (user_id, date) de la migration 005, sans tri (filesort).
+
+Exécuter depuis le répertoire backend:
+    python ../database/check_indexes.py [user_id]
+
+Code de sortie 1 si un index est absent ou si une requête ne l'utilise pas.
+Sur une table presque vide, l'optimiseur peut préférer un parcours complet :
+à lancer sur une base contenant un historique réaliste.
+"""
+import sys
+import os
+from datetime import datetime
+
+# Ajouter le répertoire backend au path
+backend_dir = os.path.join(os.path.dirname(__file__), '..', 'backend')
+sys.path.insert(0, backend_dir)
+
+import mysql.connector
+from config import Config
+from models.mrl import MRLModel
+from models.gemini import GeminiModel
+
+CHECKS = (
+    ('mrl_analyses', 'idx_mrl_analyses_user_created', MRLModel.history_query),
+    ('ocr_uploads', 'idx_ocr_uploads_user_date', GeminiModel.uploads_query),
+)
+
+
+def explain(cursor, query, params, limit=50):
+    cursor.execute("EXPLAIN " + query, tuple(params) + (limit + 1,))
+    return cursor.fetchall()
+
+
+def index_exists(cursor, table, index):
+    cursor.execute(f"SHOW INDEX FROM {table} WHERE Key_name = %s", (index,))
+    return bool(cursor.fetchall())
+
+
+def check(cursor, table, index, build_query, user_id):
+    if not index_exists(cursor, table, index):
+        print(f"✗ {table} : index {index} absent (migration 005 non appliquée)")
+        return False
+    ok = True
+    # Première page, puis une page reprise après un curseur
+    for label, after in (('page 1', None), ('curseur', (datetime.now(), 2 ** 31 - 1))):
+        query, params = build_query(user_id, after)
+        plan = explain(cursor, query, params)
+        row = next((r for r in plan if r.get('table') == table), plan[0])
+        key = row.get('key')
+        extra = row.get('Extra') or ''
+        used = key == index and 'filesort' not in extra.lower()
+        ok = ok and used
+        print(f"{'✓' if used else '✗'} {table} ({label}) : key={key} type={row.get('type')} "
+              f"rows={row.get('rows')} extra={extra or '-'}")
+    return ok
+
+
+def main():
+    user_id = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    try:
+        conn = mysql.connector.connect(
+            host=Config.MYSQL_HOST,
+            user=Config.MYSQL_USER,
+            password=Config.MYSQL_PASSWORD,
+            database=Config.MYSQL_DATABASE
+        )
+        cursor = conn.cursor(dictionary=True)
+        print(f"✓ Connecté à la base de données '{Config.MYSQL_DATABASE}' (user_id={user_id})")
+
+        ok = True
+        for table, index, build_query in CHECKS:
+            # Statistiques à jour pour que le plan reflète les données réelles
+            cursor.execute(f"ANALYZE TABLE {table}")
+            cursor.fetchall()
+            ok = check(cursor, table, index, build_query, user_id) and ok
+
+        cursor.close()
+        conn.close()
+    except mysql.connector.Error as err:
+        print(f"✗ Erreur MySQL: {err}")
+        sys.exit(1)
+
+    if not ok:
+        print("✗ Index non utilisé : appliquer database/migrations/005_history_indexes.sql")
+        sys.exit(1)
+    print("✓ Les historiques paginés utilisent leurs index")
+
+
+if __name__ == '__main__':
+    main()
@@ -15,12 +15,48 @@ sys.path.insert(0, backend_dir)
 import mysql.connector
 from config import Config
 
+def split_sql(sql_content):
+    """
+    Découpe un script SQL en commandes. Les commentaires '--' (ligne entière
+    ou fin de ligne) sont retirés avant le découpage sur ';' : un ';' dans un
+    commentaire ne coupe plus une commande, et une commande précédée d'un
+    commentaire n'est plus ignorée. Les ';' et '--' entre quotes sont conservés.
+    """
+    commands = []
+    current = []
+    quote = None
+    i = 0
+    n = len(sql_content)
+    while i < n:
+        c = sql_content[i]
+        if quote:
+            current.append(c)
+            if c == '\\' and i + 1 < n:
+                current.append(sql_content[i + 1])
+                i += 1
+            elif c == quote:
+                quote = None
+        elif c in ("'", '"', '`'):
+            quote = c
+            current.append(c)
+        elif c == '-' and sql_content.startswith('--', i):
+            # Commentaire jusqu'à la fin de la ligne
+            end = sql_content.find('\n', i)
+            i = n if end == -1 else end
+            continue
+        elif c == ';':
+            commands.append(''.join(current).strip())
+            current = []
+        else:
+            current.append(c)
+        i += 1
+    commands.append(''.join(current).strip())
+    return [cmd for cmd in commands if cmd]
+
 def execute_sql_file(cursor, file_path):
     """Exécute un fichier SQL"""
     with open(file_path, 'r', encoding='utf-8') as f:
-        sql_content = f.read()
-        # Séparer les commandes par ';'
-        commands = [cmd.strip() for cmd in sql_content.split(';') if cmd.strip() and not cmd.strip().startswith('--')]
+        commands = split_sql(f.read())
         
         for command in commands:
             if command:
@@ -28,8 +64,8 @@ def execute_sql_file(cursor, file_path):
                     cursor.execute(command)
                     print(f"✓ Exécuté: {command[:50]}...")
                 except mysql.connector.Error as err:
-                    # Ignorer les erreurs "table already exists"
-                    if "already exists" not in str(err).lower():
+                    # Ignorer les erreurs "table already exists" / index déjà créé
+                    if "already exists" not in str(err).lower() and "duplicate key name" not in str(err).lower():
                         print(f"⚠ Erreur: {err}")
                         print(f"  Commande: {command[:100]}...")
 
@@ -61,6 +97,14 @@ def main():
         # Exécuter le fichier SQL
         execute_sql_file(cursor, sql_file)
         
+        # Puis les migrations, dans l'ordre de leur numéro
+        migrations_dir = os.path.join(script_dir, 'migrations')
+        if os.path.isdir(migrations_dir):
+            for name in sorted(os.listdir(migrations_dir)):
+                if name.endswith('.sql'):
+                    print(f"\nMigration: {name}")
+                    execute_sql_file(cursor, os.path.join(migrations_dir, name))
+        
         # Commit des changements
         conn.commit()
         print("-" * 60)
@@ -0,0 +1,54 @@
+-- Miroir local de la base EU Pesticides (résidus, produits, LMR)
+-- Alimenté par database/sync_eu_mirror.py ; MRLModel le consulte avant l'API.
+
+CREATE TABLE IF NOT EXISTS eu_residues (
+    residue_id INT NOT NULL,
+    language VARCHAR(5) NOT NULL DEFAULT 'EN',
+    residue_name VARCHAR(500) NOT NULL,
+    record_hash CHAR(40) NOT NULL,
+    raw_json LONGTEXT NOT NULL,
+    synced_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (residue_id, language),
+    KEY idx_eu_residues_name (language, residue_name(191))
+);
+
+CREATE TABLE IF NOT EXISTS eu_products (
+    product_id INT NOT NULL,
+    language VARCHAR(5) NOT NULL DEFAULT 'EN',
+    product_code VARCHAR(50),
+    product_name VARCHAR(500),
+    record_hash CHAR(40) NOT NULL,
+    raw_json LONGTEXT NOT NULL,
+    synced_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (product_id, language),
+    KEY idx_eu_products_code (language, product_code)
+);
+
+-- Les enregistrements LMR n'ont pas d'identifiant stable : l'empreinte du
+-- contenu sert de clé (un enregistrement modifié = nouvelle empreinte).
+CREATE TABLE IF NOT EXISTS eu_mrls (
+    record_hash CHAR(40) NOT NULL,
+    residue_id INT NOT NULL,
+    product_id INT,
+    applicability VARCHAR(10),
+    mrl_value VARCHAR(50),
+    raw_json LONGTEXT NOT NULL,
+    synced_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (record_hash),
+    KEY idx_eu_mrls_residue_product (residue_id, product_id)
+);
+
+CREATE TABLE IF NOT EXISTS eu_mirror_sync_state (
+    entity VARCHAR(20) NOT NULL,
+    language VARCHAR(5) NOT NULL DEFAULT '',
+    status VARCHAR(20) NOT NULL,
+    records INT NOT NULL DEFAULT 0,
+    inserted INT NOT NULL DEFAULT 0,
+    updated INT NOT NULL DEFAULT 0,
+    deleted INT NOT NULL DEFAULT 0,
+    error TEXT,
+    started_at DATETIME,
+    finished_at DATETIME,
+    last_success_at DATETIME,
+    PRIMARY KEY (entity, language)
+);
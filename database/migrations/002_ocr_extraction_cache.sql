@@ -0,0 +1,19 @@
+-- Cache des extractions PDF par contenu (SHA-256 du fichier)
+-- La clé combine l'empreinte du PDF, celle du prompt et le modèle Gemini :
+-- changer le prompt ou le modèle invalide naturellement les anciennes entrées.
+
+CREATE TABLE IF NOT EXISTS ocr_extraction_cache (
+    cache_key CHAR(64) NOT NULL,
+    content_hash CHAR(64) NOT NULL,
+    prompt_hash CHAR(64) NOT NULL,
+    model_version VARCHAR(100) NOT NULL,
+    source_upload_id INT NOT NULL,
+    extracted_json LONGTEXT NOT NULL,
+    confidence DECIMAL(5,4),
+    results_count INT NOT NULL DEFAULT 0,
+    hit_count INT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_hit_at TIMESTAMP NULL,
+    PRIMARY KEY (cache_key),
+    KEY idx_ocr_cache_content (content_hash)
+);
@@ -0,0 +1,22 @@
+-- Consommation du modèle d'extraction : une ligne par appel (réussi ou non)
+-- Alimentée par GeminiModel._generate_json ; agrégée par /api/admin/extraction/usage.
+
+CREATE TABLE IF NOT EXISTS gemini_usage (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    upload_id INT NULL,
+    user_id INT NULL,
+    backend VARCHAR(30) NOT NULL,
+    model VARCHAR(100) NOT NULL,
+    prompt_tokens INT NOT NULL DEFAULT 0,
+    output_tokens INT NOT NULL DEFAULT 0,
+    tokens_estimated BOOLEAN NOT NULL DEFAULT FALSE,
+    latency_ms INT NOT NULL DEFAULT 0,
+    wait_ms INT NOT NULL DEFAULT 0,
+    rows_extracted INT NOT NULL DEFAULT 0,
+    truncated BOOLEAN NOT NULL DEFAULT FALSE,
+    status VARCHAR(20) NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    KEY idx_gemini_usage_created (created_at),
+    KEY idx_gemini_usage_upload (upload_id),
+    KEY idx_gemini_usage_user (user_id, created_at)
+);
@@ -0,0 +1,27 @@
+-- Exécutions du pipeline "bulletin -> verdict" (extraction, résolution des
+-- résidus, LMR, conformité, sauvegarde) avec la durée de chaque étape.
+
+CREATE TABLE IF NOT EXISTS pipeline_runs (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    upload_id INT NOT NULL,
+    product_code VARCHAR(50),
+    product_id_eu INT NULL,
+    lot_number VARCHAR(100),
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    verdict VARCHAR(20) NULL,
+    substances_count INT NOT NULL DEFAULT 0,
+    analyses_count INT NOT NULL DEFAULT 0,
+    extract_ms INT NULL,
+    resolve_ms INT NULL,
+    mrl_ms INT NULL,
+    persist_ms INT NULL,
+    total_ms INT NULL,
+    overlap_ms INT NULL,
+    timings_json TEXT NULL,
+    error TEXT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP NULL,
+    KEY idx_pipeline_runs_user (user_id, created_at),
+    KEY idx_pipeline_runs_upload (upload_id)
+);
@@ -0,0 +1,10 @@
+-- Index des historiques utilisateur (pagination par clé, voir
+-- backend/services/pagination.py) : filtre user_id + tri par date
+-- descendante lus directement dans l'index, sans tri ni parcours complet.
+-- InnoDB ajoute la clé primaire (id) à chaque index secondaire, ce qui
+-- couvre aussi le départage (date, id) du curseur.
+-- Vérification : python ../database/check_indexes.py
+
+CREATE INDEX idx_mrl_analyses_user_created ON mrl_analyses (user_id, created_at);
+
+CREATE INDEX idx_ocr_uploads_user_date ON ocr_uploads (user_id, upload_date);
@@ -0,0 +1,8 @@
+-- Tables de préparation de la synchronisation du miroir EU (voir 001)
+-- EUMirrorModel y charge les enregistrements nouveaux ou modifiés, puis les
+-- publie dans les tables lues en une seule transaction. Créées aussi au
+-- besoin par la synchronisation.
+
+CREATE TABLE IF NOT EXISTS eu_residues_staging LIKE eu_residues;
+CREATE TABLE IF NOT EXISTS eu_products_staging LIKE eu_products;
+CREATE TABLE IF NOT EXISTS eu_mrls_staging LIKE eu_mrls;
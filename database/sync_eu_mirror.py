@@ -0,0 +1,44 @@
+"""
+Synchronisation incrémentale du miroir local de la base EU Pesticides
+(tables eu_residues, eu_products, eu_mrls - voir migrations/001_eu_mirror.sql)
+
+Exécuter depuis le répertoire backend (par exemple via cron, chaque nuit):
+    python ../database/sync_eu_mirror.py [residues products mrls] [--language EN]
+"""
+import sys
+import os
+
+# Ajouter le répertoire backend au path
+backend_dir = os.path.join(os.path.dirname(__file__), '..', 'backend')
+sys.path.insert(0, backend_dir)
+
+from models.mrl import MRLModel
+
+def main(argv):
+    language = 'EN'
+    if '--language' in argv:
+        i = argv.index('--language')
+        language = argv[i + 1]
+        argv = argv[:i] + argv[i + 2:]
+    entities = argv or None
+
+    mirror = MRLModel().mirror
+    print(f"Synchronisation du miroir EU ({', '.join(entities or mirror.ENTITIES)}, langue {language})...")
+    print("-" * 60)
+    result = mirror.sync(entities, language)
+
+    if 'entities' not in result:
+        print(f"✗ {result.get('error')}")
+        return 1
+
+    for entity, report in result['entities'].items():
+        if report['status'] == 'success':
+            print(f"✓ {entity}: {report['records']} enregistrements, "
+                  f"+{report['inserted']} ~{report['updated']} -{report['deleted']}")
+        else:
+            print(f"✗ {entity}: {report.get('error')}")
+    print("-" * 60)
+    return 0 if result['success'] else 1
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -37,21 +37,41 @@ export const mrlAPI = {
         api.post('/mrl/residues/multi-search', { substances, product_code: productCode, language }),
     downloadReport: (data) => api.post('/mrl/analyses/report', data, { responseType: 'blob' }),
     saveAnalysis: (data) => api.post('/mrl/analyses', data),
-    getAnalyses: (limit = 50) => api.get(`/mrl/analyses?limit=${limit}`),
+    getAnalyses: (limit = 50, cursor) => api.get('/mrl/analyses', { params: { limit, cursor } }),
     getProductsList: () => api.get('/mrl/products/list'),
 };
 
+// Durée max du suivi d'une extraction en arrière-plan (au-delà : erreur)
+const UPLOAD_POLL_TIMEOUT_MS = 10 * 60 * 1000;
+
 export const ocrAPI = {
-    uploadPDF: (file) => {
+    uploadPDF: async (file) => {
         const formData = new FormData();
         formData.append('file', file);
-        return api.post('/ocr/upload', formData, {
+        const response = await api.post('/ocr/upload', formData, {
             headers: {
                 'Content-Type': 'multipart/form-data',
             },
         });
+        // 202 : l'extraction tourne en arrière-plan, on suit son statut
+        if (response.status !== 202) return response;
+        const uploadId = response.data.upload_id;
+        // Suivi borné : un job perdu (redémarrage du serveur) ne bloque pas la page
+        const deadline = Date.now() + UPLOAD_POLL_TIMEOUT_MS;
+        while (Date.now() < deadline) {
+            await new Promise((resolve) => setTimeout(resolve, 1500));
+            const status = await api.get(`/ocr/uploads/${uploadId}/status`);
+            if (status.data.status === 'completed') return status;
+            if (status.data.status === 'failed') {
+                const err = new Error(status.data.error || 'Erreur lors du traitement');
+                err.response = status;
+                throw err;
+            }
+        }
+        throw new Error("Délai dépassé pendant l'extraction : réessayez plus tard");
     },
-    getUploads: (limit = 20) => api.get(`/ocr/uploads?limit=${limit}`),
+    getUploadStatus: (uploadId) => api.get(`/ocr/uploads/${uploadId}/status`),
+    getUploads: (limit = 20, cursor) => api.get('/ocr/uploads', { params: { limit, cursor } }),
     getExtractedData: (uploadId) => api.get(`/ocr/extracted/${uploadId}`),
 };
 
@@ -145,7 +145,7 @@ export default function Dashboard({ activeTab: propActiveTab }) {
             detected_value: row.below_loq ? '0' : (row.detected_value?.toString() || ''),
             detected_unit: row.unit || 'mg/kg',
             loq_value: row.loq_value?.toString() || '',
-            loq_unit: row.unit || 'mg/kg',
+            loq_unit: row.loq_unit || row.unit || 'mg/kg',
         }));
         // Reset previous search results so user starts fresh
         setResidueResults([]);
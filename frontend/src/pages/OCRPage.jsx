@@ -108,7 +108,7 @@ export default function OCRPage() {
             detected_value: row.detected_value ?? '',
             detected_unit: row.unit || row.detected_unit || 'mg/kg',
             loq_value: row.loq_value ?? '',
-            loq_unit: row.unit || row.loq_unit || 'mg/kg',
+            loq_unit: row.loq_unit || row.unit || 'mg/kg',
             below_loq: row.below_loq || false,
         };
         localStorage.setItem('ocr_extracted_data', JSON.stringify(data));